@@ -0,0 +1,326 @@
+"""Benchmark the local, CPU-bound file paths of the library on deterministic synthetic data
+
+Each case builds its input at the chosen scales, then records the median and fastest wall time of several runs, the throughput
+in MB and rows per second and the peak memory traced by tracemalloc, measured on a separate run as tracing slows the
+code down. Results can be saved as a JSON baseline per release and later runs compared against it, which flags every
+case that got slower or bigger by more than a threshold.
+
+Run from the repository root with the CONFIGFILE environment variable set, for example
+python -m benchmarks.cpu_paths --scales small medium --save-baseline
+python -m benchmarks.cpu_paths --scales small medium --compare benchmarks/baselines/cpu_1.7.0.json
+
+Cases that cannot be prepared (i.e. a missing dependency) are reported as skipped. The pgp cases need
+--pgp-profile, the profile's keys are replaced by a key generated for the run so results do not depend on them
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from src import __version__
+
+MB = 1024 * 1024
+SCALES = {
+    'small': 1000,  # rows
+    'medium': 50000,
+    'large': 500000
+}
+MERGE_FILES = 10
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+HEADER = ['id', 'customer', 'date', 'amount', 'quantity', 'status', 'region', 'comment']
+STATUSES = ['Processed', 'Pending', 'Rejected', 'On hold']
+REGIONS = ['North', 'South', 'East', 'West']
+
+
+def synthetic_rows(rows: int, seed: int = 0, start: int = 0) -> list:
+    """Return 'rows' rows of deterministic csv-like data, unique in the first column"""
+    rng = random.Random(seed + start)
+    data = []
+    for i in range(start, start + rows):
+        data.append([
+            f'{i:09d}',
+            f'Customer {rng.randrange(10000):05d}',
+            f'2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}',
+            f'{rng.uniform(0, 100000):.2f}',
+            str(rng.randrange(1, 1000)),
+            rng.choice(STATUSES),
+            rng.choice(REGIONS),
+            'note with "quotes", and a comma' if rng.random() < 0.05 else f'text {rng.getrandbits(32):08x}'
+        ])
+    return data
+
+
+def write_csv(filename: str, rows: int, seed: int = 0, delim: str = ',', start: int = 0) -> int:
+    """Write a header and 'rows' synthetic rows to 'filename' and return its size in bytes"""
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=delim)
+        writer.writerow(HEADER)
+        writer.writerows(synthetic_rows(rows, seed, start))
+    return os.path.getsize(filename)
+
+
+def remove(*filenames: str):
+    for filename in filenames:
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+
+def case_csv_to_excel(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.office import convert
+
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    output = os.path.join(directory, 'source.xlsx')
+    converter = convert(args.config_file)
+    return {'run': lambda: converter.csv_to_excel(source, ','), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_excel_to_csv(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.office import convert
+
+    converter = convert(args.config_file)
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    workbook = converter.csv_to_excel(source, ',')
+    remove(source)
+    output = os.path.join(directory, 'source.csv')
+    return {'run': lambda: converter.excel_to_csv(workbook, ','), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_extract_columns(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.office import convert
+
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    output = os.path.join(directory, 'source_filtered.csv')
+    converter = convert(args.config_file)
+    return {'run': lambda: converter.extract_columns(source, ['id', 'amount', 'status']), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_change_delimiter(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.office import convert
+
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    output = os.path.join(directory, 'source_delimiter.csv')
+    converter = convert(args.config_file)
+    return {'run': lambda: converter.change_delimiter(source, ',', '|'), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_mergecsvfiles(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.fileproc import manipulate
+
+    per_file = max(rows // MERGE_FILES, 1)
+    size = sum(
+        write_csv(os.path.join(directory, f'part_{i:02d}.csv'), per_file, args.seed, start=i * per_file) for i in range(MERGE_FILES)
+    )
+    output = os.path.join(directory, 'merged.out')
+    merger = manipulate(args.config_file)
+    return {'run': lambda: merger.mergecsvfiles(directory, 'part_*.csv', 'merged.out', True, ','), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_csv_to_json(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.misc import csv_to_json
+
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    return {'run': lambda: csv_to_json(source), 'reset': lambda: None, 'bytes': size}
+
+
+def case_reformat_json(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    from src.jsonstuff import reformat_json
+
+    source = os.path.join(directory, 'source.json')
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump([dict(zip(HEADER, row)) for row in synthetic_rows(rows, args.seed)], f, separators=(',', ':'))
+    output = os.path.join(directory, 'source_reformat.json')
+    return {'run': lambda: reformat_json(directory, 'source.json'), 'reset': lambda: remove(output), 'bytes': os.path.getsize(source)}
+
+
+def _pgp_client(args: argparse.Namespace):
+    """Build the pgp client of --pgp-profile with a key generated for the run"""
+    import pgpy
+    from pgpy.constants import CompressionAlgorithm, HashAlgorithm, KeyFlags, PubKeyAlgorithm, SymmetricKeyAlgorithm
+
+    from src.pgp import pgp
+
+    if not args.pgp_profile:
+        raise RuntimeError('--pgp-profile is required for the pgp cases')
+    key = pgpy.PGPKey.new(PubKeyAlgorithm.RSAEncryptOrSign, 2048)
+    key.add_uid(
+        pgpy.PGPUID.new('Benchmark'),
+        usage={KeyFlags.EncryptCommunications, KeyFlags.EncryptStorage},
+        hashes=[HashAlgorithm.SHA256],
+        ciphers=[SymmetricKeyAlgorithm.AES256],
+        compression=[CompressionAlgorithm.Uncompressed]
+    )
+    passphrase = 'benchmark'
+    key.protect(passphrase, SymmetricKeyAlgorithm.AES256, HashAlgorithm.SHA256)
+    client = pgp(args.pgp_profile, args.config_file)
+    client.public_key, client.private_key, client.passphrase = str(key.pubkey), str(key), passphrase
+    return client
+
+
+def case_pgp_encrypt(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    client = _pgp_client(args)
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    output = f'{source}.{client.extension}'
+    return {'run': lambda: client.encrypt(directory, 'source.csv', archive=False), 'reset': lambda: remove(output), 'bytes': size}
+
+
+def case_pgp_decrypt(directory: str, rows: int, args: argparse.Namespace) -> dict:
+    client = _pgp_client(args)
+    source = os.path.join(directory, 'source.csv')
+    size = write_csv(source, rows, args.seed)
+    encrypted = client.encrypt(directory, 'source.csv', archive=False)[0]
+    remove(source)
+    pattern = os.path.basename(encrypted)
+    return {'run': lambda: client.decrypt(directory, pattern, archive=False), 'reset': lambda: remove(source), 'bytes': size}
+
+
+CASES = {
+    'office.csv_to_excel': case_csv_to_excel,
+    'office.excel_to_csv': case_excel_to_csv,
+    'office.extract_columns': case_extract_columns,
+    'office.change_delimiter': case_change_delimiter,
+    'fileproc.mergecsvfiles': case_mergecsvfiles,
+    'misc.csv_to_json': case_csv_to_json,
+    'jsonstuff.reformat_json': case_reformat_json,
+    'pgp.encrypt': case_pgp_encrypt,
+    'pgp.decrypt': case_pgp_decrypt
+}
+
+
+def measure(case: dict, repeat: int) -> dict:
+    """Run a prepared case 'repeat' times for wall time and once more under tracemalloc for peak memory"""
+    times = []
+    for _ in range(repeat):
+        case['reset']()
+        start = time.perf_counter()
+        case['run']()
+        times.append(time.perf_counter() - start)
+
+    case['reset']()
+    tracemalloc.start()
+    try:
+        case['run']()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    case['reset']()
+    return {'seconds': statistics.median(times), 'min_seconds': min(times), 'peak_memory_mb': peak / MB}
+
+
+def run_case(name: str, scale: str, args: argparse.Namespace) -> dict:
+    """Prepare and measure one case at one scale in its own directory, a case failing to prepare is skipped"""
+    rows = SCALES[scale]
+    result = {'case': name, 'scale': scale, 'rows': rows}
+    directory = tempfile.mkdtemp(prefix='cpu_paths_', dir=args.work_dir)
+    try:
+        try:
+            case = CASES[name](directory, rows, args)
+        except Exception as e:
+            result['skipped'] = f'{e.__class__.__name__}: {e}'
+            return result
+        measured = measure(case, args.repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result.update({
+        'bytes': case['bytes'],
+        'seconds': round(measured['seconds'], 4),
+        'min_seconds': round(measured['min_seconds'], 4),
+        'mb_per_second': round(case['bytes'] / MB / measured['seconds'], 2) if measured['seconds'] > 0 else None,
+        'rows_per_second': round(rows / measured['seconds']) if measured['seconds'] > 0 else None,
+        'peak_memory_mb': round(measured['peak_memory_mb'], 2)
+    })
+    return result
+
+
+def compare(results: list, baseline_file: str, threshold: float) -> list:
+    """Return the cases slower or using more memory than in 'baseline_file' by more than 'threshold' (0.1 = 10%)"""
+    with open(baseline_file, 'r') as f:
+        baseline = {(r['case'], r['scale']): r for r in json.load(f)['results'] if 'skipped' not in r}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['case'], result['scale']))
+        if previous is None or 'skipped' in result:
+            continue
+        for metric in ('min_seconds', 'peak_memory_mb'):  # the fastest run is the least noisy
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(
+                    f"{result['case']} ({result['scale']}) {metric} {previous[metric]} -> {result[metric]} "
+                    f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report wall time, throughput and peak memory of the CPU-bound paths')
+    parser.add_argument('--cases', nargs='*', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--scales', nargs='*', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config-file', help='Library configuration file, the CONFIGFILE environment variable if not provided')
+    parser.add_argument('--pgp-profile', help='Existing PGP profile used for the pgp cases')
+    parser.add_argument('--work-dir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='Full path of a json file to save the results to')
+    parser.add_argument(
+        '--save-baseline', nargs='?', const=os.path.join(BASELINE_DIR, f'cpu_{__version__}.json'),
+        help='Save the results as a baseline, to benchmarks/baselines/cpu_<version>.json if no path is provided'
+    )
+    parser.add_argument('--compare', help='Baseline json file to compare the results against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Allowed slowdown before a case is a regression')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # the library warns about files it has already converted, expected here
+    warnings.simplefilter('ignore')  # deprecation warnings of dependencies would bury the table
+
+    results = []
+    print(f"{'case':<26} {'scale':<7} {'rows':>8} {'seconds':>9} {'MB/s':>8} {'rows/s':>10} {'peak MB':>9}")
+    for name in args.cases:
+        for scale in args.scales:
+            result = run_case(name, scale, args)
+            results.append(result)
+            if 'skipped' in result:
+                print(f"{name:<26} {scale:<7} {result['rows']:>8} skipped: {result['skipped']}")
+            else:
+                print(
+                    f"{name:<26} {scale:<7} {result['rows']:>8} {result['seconds']:>9} {str(result['mb_per_second']):>8} "
+                    f"{str(result['rows_per_second']):>10} {result['peak_memory_mb']:>9}"
+                )
+
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': results
+    }
+    for filename in (args.output, args.save_baseline):
+        if filename:
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+            with open(filename, 'w') as f:
+                json.dump(report, f, indent=4)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if len(regressions) > 0:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Measure how long importing each library module takes in a fresh interpreter and which heavy dependencies it loads
+
+Every import runs in a new Python process so nothing is cached between measurements. The median wall time of several
+runs is reported with the heavy third party modules found in sys.modules afterwards, which should be none as they are
+loaded on first use, and the slowest imports by their own time according to python -X importtime.
+
+Run from the repository root, for example
+python -m benchmarks.import_time
+python -m benchmarks.import_time --modules misc jsonstuff sftp --repeat 10 --check
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from src import __version__
+
+PACKAGE = 'src'  # the automation package as laid out in the repository
+MODULES = ['', 'cli', 'cmd', 'db', 'fileproc', 'ftp', 'jsonstuff', 'metrics', 'misc', 'office', 'pgp', 'scheduler', 'secrets', 'sftp', 'transfer']
+HEAVY = ['pandas', 'numpy', 'paramiko', 'pgpy', 'pykeepass', 'pyodbc', 'win32com', 'xlsxwriter', 'openpyxl']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': sorted(m for m in {heavy!r} if m in sys.modules)}}))
+'''
+
+
+def module_name(module: str) -> str:
+    return f'{PACKAGE}.{module}' if module else PACKAGE
+
+
+def measure(module: str, repeat: int) -> dict:
+    """Import 'module' in 'repeat' fresh interpreters and return the median and fastest time and the heavy modules loaded"""
+    name = module_name(module)
+    times, heavy, error = [], [], None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=name, heavy=HEAVY)], cwd=ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit code {proc.returncode}'
+            break
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(probe['seconds'])
+        heavy = probe['heavy']
+    return {
+        'module': name,
+        'median_ms': round(statistics.median(times) * 1000, 1) if times else None,
+        'min_ms': round(min(times) * 1000, 1) if times else None,
+        'heavy_modules': heavy,
+        'slowest_imports': slowest_imports(name) if error is None else [],
+        'error': error
+    }
+
+
+def slowest_imports(name: str, count: int = 3) -> list:
+    """Return the 'count' imports with the largest own time when importing 'name', from python -X importtime"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {name}'], cwd=ROOT, capture_output=True, text=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, _, imported = line[len('import time:'):].split('|')
+        entries.append((int(own), imported.strip()))
+    return [{'module': m, 'ms': round(us / 1000, 1)} for us, m in sorted(entries, reverse=True)[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the import time of each library module in a fresh interpreter')
+    parser.add_argument('--modules', nargs='*', choices=MODULES, default=MODULES, help='Modules to import, "" for the package itself')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Full path of a json file to save the results to')
+    parser.add_argument('--check', action='store_true', help='Exit with an error if any module loads a heavy dependency at import')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'module':<16} {'median ms':>10} {'min ms':>8}  heavy modules / slowest imports")
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        results.append(result)
+        if result['error']:
+            print(f"{result['module']:<16} failed: {result['error']}")
+            continue
+        slowest = ', '.join(f"{s['module']} {s['ms']}" for s in result['slowest_imports'])
+        print(
+            f"{result['module']:<16} {result['median_ms']:>10} {result['min_ms']:>8}  "
+            f"{', '.join(result['heavy_modules']) or '-'} / {slowest}"
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {'version': __version__, 'python': platform.python_version(), 'platform': platform.platform(), 'repeat': args.repeat, 'results': results},
+                f,
+                indent=4
+            )
+
+    if args.check:
+        offenders = [r['module'] for r in results if r['heavy_modules'] or r['error']]
+        if offenders:
+            print(f"HEAVY IMPORTS {', '.join(offenders)}")
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
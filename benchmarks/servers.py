@@ -0,0 +1,483 @@
+"""In-process SFTP and FTP/FTPS servers and a TCP proxy injecting latency, bandwidth limits and dropped connections
+
+The servers serve a local directory to a single user and are meant for benchmarks, they are not hardened for any other
+use. The FTP server needs pyftpdlib, FTPS also needs pyOpenSSL
+"""
+import datetime as dt
+import logging
+import os
+import queue
+import random
+import socket
+import tempfile
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+from src.scheduler import token_bucket
+
+LOCALHOST = '127.0.0.1'
+BACKEND_HOST = '127.0.0.2'  # address the FTP server listens on behind a proxy, so passive ports are free on LOCALHOST
+CHUNK_SIZE = 65536
+PASSIVE_PORTS = 32  # passive data ports proxied for an impaired FTP server
+SFTP_LOG_CHANNEL = 'benchmarks.sftp_server'
+
+
+class impairment:
+    """Network conditions applied by impaired_proxy
+
+    Attributes
+    ----------
+    latency : float
+        Seconds added to every chunk in each direction, so a round trip takes twice as long
+    bandwidth : float
+        Most bytes per second carried in each direction by all connections of the proxy together, None for no limit
+    drop_rate : float
+        Probability that a connection is cut, at a random point within its first 'drop_window' bytes
+    drop_window : int
+        Number of bytes within which a dropped connection is cut
+    seed : int
+        Seed of the random choice of dropped connections, so runs can be repeated
+
+    """
+    def __init__(self, latency: float = 0, bandwidth: float = None, drop_rate: float = 0, drop_window: int = 1048576, seed: int = 0):
+        self.latency = max(float(latency or 0), 0.0)
+        self.bandwidth = bandwidth if isinstance(bandwidth, (int, float)) and bandwidth > 0 else None
+        self.drop_rate = min(max(float(drop_rate or 0), 0.0), 1.0)
+        self.drop_window = max(int(drop_window), 1)
+        self.seed = seed
+
+    @property
+    def active(self) -> bool:
+        """Whether any condition is injected"""
+        return self.latency > 0 or self.bandwidth is not None or self.drop_rate > 0
+
+
+class impaired_proxy:
+    """Threaded TCP proxy forwarding a local port to a target, applying an impairment to every connection
+
+    Each direction of a connection is carried by a reader thread, which stamps every chunk with the time it may be
+    delivered, and a writer thread, which waits for that time and for the bandwidth limit before sending it on. Chunks
+    keep flowing while earlier ones are delayed, so latency does not cap throughput the way a sleep per send would
+
+    Attributes
+    ----------
+    port : int
+        Port the proxy listens on
+    connections : int
+        Number of connections accepted so far
+    dropped : int
+        Number of connections cut by the proxy
+
+    """
+    def __init__(self, target_host: str, target_port: int, conditions: impairment, host: str = LOCALHOST, port: int = 0, seed: int = None):
+        self.target = (target_host, target_port)
+        self.conditions = conditions
+        self.connections = 0
+        self.dropped = 0
+        self._random = random.Random(conditions.seed if seed is None else seed)
+        self._buckets = [token_bucket(conditions.bandwidth) for _ in range(2)] if conditions.bandwidth else [None, None]
+        self._lock = threading.Lock()
+        self._closed = False
+        self._listener = socket.create_server((host, port))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(self.target)
+            except OSError as e:
+                logging.warning(f'proxy could not reach {self.target[0]}:{self.target[1]}|{e}')
+                client.close()
+                continue
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self.connections += 1
+                cut_at = self._random.randrange(self.conditions.drop_window) if self._random.random() < self.conditions.drop_rate else None
+            budget = [cut_at]  # bytes left before the connection is cut, shared by both directions
+            for source, destination, bucket in ((client, upstream, self._buckets[0]), (upstream, client, self._buckets[1])):
+                self._pump(source, destination, bucket, budget, (client, upstream))
+
+    def _pump(self, source: socket.socket, destination: socket.socket, bucket: token_bucket, budget: list, pair: tuple):
+        """Start the reader and writer threads carrying one direction of a connection"""
+        chunks = queue.Queue()
+
+        def cut():
+            for s in pair:
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                s.close()
+
+        def read():
+            while True:
+                try:
+                    data = source.recv(CHUNK_SIZE)
+                except OSError:
+                    data = b''
+                chunks.put((time.monotonic() + self.conditions.latency, data))
+                if not data:
+                    return
+
+        def write():
+            while True:
+                due, data = chunks.get()
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if not data:
+                    try:
+                        destination.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        pass
+                    return
+                with self._lock:
+                    if budget[0] is not None:
+                        budget[0] -= len(data)
+                        if budget[0] < 0:
+                            budget[0] = None
+                            self.dropped += 1
+                            cut()
+                            return
+                if bucket is not None:
+                    bucket.consume(len(data))
+                try:
+                    destination.sendall(data)
+                except OSError:
+                    cut()
+                    return
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=write, daemon=True).start()
+
+
+class _server_interface(paramiko.ServerInterface):
+    """Accepts a single username and password and the sftp subsystem"""
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+
+    def get_allowed_auths(self, username: str) -> str:
+        return 'password'
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class _sftp_handle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class _sftp_interface(SFTPServerInterface):
+    """Serves the directory 'root' as '/'"""
+    root = None
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.root, self.canonicalize(path).lstrip('/'))
+
+    def canonicalize(self, path: str) -> str:
+        path = path.replace('\\', '/')
+        return os.path.normpath('/' + path).replace('\\', '/').replace('//', '/')
+
+    def list_folder(self, path: str):
+        try:
+            folder = self._local(path)
+            attrs = []
+            for entry in os.scandir(folder):
+                attr = SFTPAttributes.from_stat(entry.stat())
+                attr.filename = entry.name
+                attrs.append(attr)
+            return attrs
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path: str):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path: str):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path: str, flags: int, attr: SFTPAttributes):
+        try:
+            fd = os.open(self._local(path), flags | getattr(os, 'O_BINARY', 0), 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _sftp_handle(flags)
+        handle.filename = self._local(path)
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path: str):
+        return self._call(os.remove, self._local(path))
+
+    def rename(self, oldpath: str, newpath: str):
+        if os.path.exists(self._local(newpath)):
+            return paramiko.SFTP_FAILURE
+        return self._call(os.rename, self._local(oldpath), self._local(newpath))
+
+    def posix_rename(self, oldpath: str, newpath: str):
+        return self._call(os.replace, self._local(oldpath), self._local(newpath))
+
+    def mkdir(self, path: str, attr: SFTPAttributes):
+        return self._call(os.mkdir, self._local(path))
+
+    def rmdir(self, path: str):
+        return self._call(os.rmdir, self._local(path))
+
+    def chattr(self, path: str, attr: SFTPAttributes):
+        return paramiko.SFTP_OK
+
+    @staticmethod
+    def _call(func, *args) -> int:
+        try:
+            func(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class sftp_server:
+    """In-process SFTP server on a paramiko transport per connection, optionally behind an impaired_proxy
+
+    Attributes
+    ----------
+    root : str
+        Local directory served as '/'
+    username : str
+        Username accepted by the server
+    password : str
+        Password accepted by the server
+    host : str
+        Address clients connect to
+    port : int
+        Port clients connect to, the proxy's if 'conditions' are active
+
+    """
+    def __init__(self, root: str, username: str = 'benchmark', password: str = 'benchmark', conditions: impairment = None):
+        self.root = os.path.abspath(root)
+        self.username = username
+        self.password = password
+        self.host = LOCALHOST
+        self._key = paramiko.RSAKey.generate(2048)
+        self._interface = type('sftp_interface', (_sftp_interface,), {'root': self.root})
+        self._transports = []
+        self._closed = False
+        logging.getLogger(SFTP_LOG_CHANNEL).setLevel(logging.CRITICAL)  # clients closing their connections are reported as errors
+        self._listener = socket.create_server((LOCALHOST, 0))
+        self.port = self._listener.getsockname()[1]
+        self.proxy = None
+        if conditions is not None and conditions.active:
+            self.proxy = impaired_proxy(LOCALHOST, self.port, conditions)
+            self.port = self.proxy.port
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        if self.proxy is not None:
+            self.proxy.close()
+        for t in self._transports:
+            t.close()
+
+    @property
+    def dropped(self) -> int:
+        """Number of connections cut by the proxy"""
+        return 0 if self.proxy is None else self.proxy.dropped
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.set_log_channel(SFTP_LOG_CHANNEL)
+            transport.add_server_key(self._key)
+            transport.set_subsystem_handler('sftp', SFTPServer, self._interface)
+            try:
+                transport.start_server(server=_server_interface(self.username, self.password))
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                logging.warning(f'sftp server handshake failed|{e}')
+                continue
+            self._transports.append(transport)
+
+
+def _self_signed_certificate(directory: str) -> str:
+    """Write a self-signed certificate and its key for LOCALHOST to a pem file in 'directory' and return its path"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, LOCALHOST)])
+    now = dt.datetime.now(dt.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - dt.timedelta(days=1))
+        .not_valid_after(now + dt.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    certfile = os.path.join(directory, 'ftps_benchmark.pem')
+    with open(certfile, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()))
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    return certfile
+
+
+class ftp_server:
+    """In-process FTP or FTPS server running pyftpdlib on its own thread, optionally behind impaired_proxy objects
+
+    With active conditions the server listens on BACKEND_HOST and a proxy on LOCALHOST forwards the control port and
+    each passive data port, which works because ftplib connects to the passive port on the control connection's host
+    and ignores the address in the PASV reply. FTPS is proxied unchanged as the proxy never reads the traffic
+
+    Attributes
+    ----------
+    root : str
+        Local directory served as '/'
+    username : str
+        Username accepted by the server
+    password : str
+        Password accepted by the server
+    tls : bool
+        Whether the server requires explicit TLS (FTPS) on the control and data connections
+    host : str
+        Address clients connect to
+    port : int
+        Port clients connect to, the proxy's if 'conditions' are active
+
+    """
+    def __init__(
+        self,
+        root: str,
+        username: str = 'benchmark',
+        password: str = 'benchmark',
+        tls: bool = False,
+        conditions: impairment = None
+    ):
+        self.root = os.path.abspath(root)
+        self.username = username
+        self.password = password
+        self.tls = tls
+        self.host = LOCALHOST
+        self._tempdir = tempfile.TemporaryDirectory()
+        impaired = conditions is not None and conditions.active
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(username, password, self.root, perm='elradfmwMT')
+        base = FTPHandler
+        if tls:
+            from pyftpdlib.handlers import TLS_FTPHandler  # only defined when pyOpenSSL is installed
+            base = TLS_FTPHandler
+        handler = type('ftp_handler', (base,), {'authorizer': authorizer})
+        if tls:
+            handler.certfile = _self_signed_certificate(self._tempdir.name)
+            handler.tls_control_required = True
+            handler.tls_data_required = True
+
+        ftp_log = logging.getLogger('pyftpdlib')
+        ftp_log.setLevel(logging.WARNING)
+        if not ftp_log.handlers:
+            ftp_log.addHandler(logging.NullHandler())  # otherwise pyftpdlib sets up its own logging to stderr at INFO
+
+        self.proxies = []
+        if impaired:
+            passive_ports = self._free_ports(PASSIVE_PORTS)
+            handler.passive_ports = passive_ports
+            self._server = ThreadedFTPServer((BACKEND_HOST, 0), handler)
+            backend_port = self._server.address[1]
+            self.proxies = [impaired_proxy(BACKEND_HOST, backend_port, conditions)]
+            self.proxies += [
+                impaired_proxy(BACKEND_HOST, p, conditions, port=p, seed=conditions.seed + i + 1) for i, p in enumerate(passive_ports)
+            ]
+            self.port = self.proxies[0].port
+        else:
+            self._server = ThreadedFTPServer((LOCALHOST, 0), handler)
+            self.port = self._server.address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'handle_exit': False}, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def close(self):
+        self._server.close_all()
+        for proxy in self.proxies:
+            proxy.close()
+        self._tempdir.cleanup()
+
+    @property
+    def dropped(self) -> int:
+        """Number of control and data connections cut by the proxies"""
+        return sum(proxy.dropped for proxy in self.proxies)
+
+    @staticmethod
+    def _free_ports(count: int) -> list:
+        """Return 'count' ports free on LOCALHOST, the passive ports the proxies will listen on"""
+        sockets = [socket.create_server((LOCALHOST, 0)) for _ in range(count)]
+        ports = [s.getsockname()[1] for s in sockets]
+        for s in sockets:
+            s.close()
+        return ports
@@ -0,0 +1,111 @@
+"""Benchmark SFTP throughput for combinations of transport tuning settings
+
+Run from the repository root against a local SSH server, for example
+python -m benchmarks.sftp_tuning --username me --password secret --window-sizes 2097152 16777216 --compression both
+"""
+import argparse
+import datetime as dt
+import io
+import itertools
+import json
+import logging
+import os
+import posixpath
+import time
+
+import paramiko
+
+from src.sftp import transport_options
+
+MB = 1024 * 1024
+
+
+def synthetic_data(size_mb: int, kind: str) -> bytes:
+    """Return 'size_mb' megabytes of random or repetitive csv-like test data"""
+    if kind == 'random':
+        return os.urandom(size_mb * MB)
+    line = b'1001,ACME Corporation,2024-01-31,12345.67,Processed\r\n'
+    return (line * (size_mb * MB // len(line) + 1))[:size_mb * MB]
+
+
+def run_case(args: argparse.Namespace, data: bytes, window_size: int, max_packet_size: int, cipher: str, compression: bool) -> dict:
+    """Upload and download 'data' once with one combination of settings and return the measured throughput"""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(
+        hostname=args.host,
+        port=args.port,
+        username=args.username,
+        password=args.password,
+        look_for_keys=False,
+        allow_agent=False,
+        **transport_options(window_size, max_packet_size, [cipher] if cipher else None, compression)
+    )
+    remote_file = posixpath.join(args.remote_dir, f"sftp_tuning_{dt.datetime.now().strftime('%Y%m%d%H%M%S%f')}.dat")
+    try:
+        negotiated = ssh.get_transport().remote_cipher
+        with ssh.open_sftp() as ftp:
+            start = time.perf_counter()
+            ftp.putfo(io.BytesIO(data), remote_file, file_size=len(data), confirm=False)
+            upload_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            received = io.BytesIO()
+            ftp.getfo(remote_file, received, prefetch=True)
+            download_seconds = time.perf_counter() - start
+            ftp.remove(remote_file)
+    finally:
+        ssh.close()
+
+    if received.getbuffer().nbytes != len(data):
+        logging.warning(f'downloaded {received.getbuffer().nbytes} of {len(data)} bytes for {remote_file}')
+    size_mb = len(data) / MB
+    return {
+        'window_size': window_size,
+        'max_packet_size': max_packet_size,
+        'cipher': negotiated,
+        'compression': compression,
+        'upload_mbps': round(size_mb / upload_seconds, 2),
+        'download_mbps': round(size_mb / download_seconds, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report SFTP MB/s for each combination of transport tuning settings')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', default=os.getenv('SFTP_BENCHMARK_PASSWORD'))
+    parser.add_argument('--remote-dir', default='/tmp')
+    parser.add_argument('--size-mb', type=int, default=32)
+    parser.add_argument('--data', choices=['random', 'text'], default='random')
+    parser.add_argument('--window-sizes', type=int, nargs='*', default=[None])
+    parser.add_argument('--packet-sizes', type=int, nargs='*', default=[None])
+    parser.add_argument('--ciphers', nargs='*', default=[None])
+    parser.add_argument('--compression', choices=['off', 'on', 'both'], default='off')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help='Full path of a json file to save the results to')
+    args = parser.parse_args()
+
+    data = synthetic_data(args.size_mb, args.data)
+    compression = {'off': [False], 'on': [True], 'both': [False, True]}[args.compression]
+    results = []
+    print(f"{'window':>10} {'packet':>8} {'cipher':<24} {'zlib':<5} {'up MB/s':>9} {'down MB/s':>9}")
+    for window_size, max_packet_size, cipher, compress in itertools.product(
+        args.window_sizes, args.packet_sizes, args.ciphers, compression
+    ):
+        for _ in range(args.repeat):
+            result = run_case(args, data, window_size, max_packet_size, cipher, compress)
+            results.append(result)
+            print(
+                f"{str(window_size or 'default'):>10} {str(max_packet_size or 'default'):>8} {result['cipher']:<24} "
+                f"{str(compress):<5} {result['upload_mbps']:>9} {result['download_mbps']:>9}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'size_mb': args.size_mb, 'data': args.data, 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Load test sftp and ftp transfers against in-process servers, reporting MB/s and files/s
+
+The servers run in this process and the clients are the library's own sftp.sftp and ftp.ftp objects. They are built
+from an existing profile, so its tuning settings apply, then pointed at the local server before connecting. Latency,
+bandwidth and dropped connections are injected by a proxy in front of the server.
+
+Run from the repository root with the CONFIGFILE environment variable set, for example
+python -m benchmarks.transfer_load --protocol sftp --profile "Test Normal" --file-set small --latency-ms 20 --concurrency 1 8
+
+The "large" file set writes 10 files of 5 GB and needs about three times that much free space in the work directory,
+the generated files are kept and reused by later runs
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from src.ftp import ftp
+from src.sftp import sftp
+from .servers import ftp_server, impairment, sftp_server
+
+MB = 1024 * 1024
+FILE_SETS = {
+    'small': (10000, 1024),  # count, size in bytes
+    'large': (10, 5 * 1024 * MB)
+}
+OPERATIONS = ['list', 'download', 'upload']
+BLOCK_SIZE = MB
+
+
+def generate_file_set(directory: str, count: int, size: int, seed: int = 0) -> list:
+    """Write 'count' files of 'size' bytes of deterministic random data to 'directory' and return their names
+
+    Files already present with the right size are kept, so large sets are only written once. Data larger than a block
+    repeats a 1 MB random block, which stays incompressible for zlib as its window is far smaller than the block
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    block = rng.randbytes(min(size, BLOCK_SIZE))
+    names = []
+    for i in range(count):
+        name = f'load_{i:05d}.dat'
+        names.append(name)
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.path.getsize(path) == size:
+            continue
+        with open(path, 'wb') as f:
+            if size <= BLOCK_SIZE:
+                f.write(rng.randbytes(size))
+                continue
+            written = 0
+            while written < size:
+                chunk = block[:size - written]
+                f.write(chunk)
+                written += len(chunk)
+    return names
+
+
+def make_client(protocol: str, profile: str, server, config_file: str = None):
+    """Build a lazy client from 'profile' and point it at 'server' before it connects"""
+    if protocol == 'sftp':
+        client = sftp(profile, track_progress=False, config_file=config_file, connect_insecure=True, lazy=True)
+        client.login_type = 'NORMAL'
+        client.allow_exec = False  # the benchmark server has no exec channel
+    else:
+        client = ftp(profile, track_progress=False, config_file=config_file, use_tls=protocol == 'ftps', lazy=True)
+    client.host = server.host
+    client.port = server.port
+    client.usr = server.username
+    client.pwd = server.password
+    client.suppress_in = client.suppress_out = ['']
+    return client
+
+
+def run_operation(args: argparse.Namespace, server, operation: str, concurrency: int | str, expected: int, size: int, root: str) -> dict:
+    """Run one operation with a new client and return the measured rates"""
+    received = os.path.join(args.work_dir, 'received')
+    uploaded = os.path.join(root, 'upload')
+    for directory in (received, uploaded):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    client = make_client(args.protocol, args.profile, server, args.config_file)
+    files, error, start = [], None, None
+    dropped = server.dropped
+    try:
+        getattr(client, 'ssh' if args.protocol == 'sftp' else 'ftp')  # connect outside of the timing
+        start = time.perf_counter()
+        if operation == 'list':
+            files = client.listsftpdir('/download') if args.protocol == 'sftp' else client.listftpdir('/download')
+        elif operation == 'download':
+            files = client.download('/download', received, delete_ftp=False, concurrency=concurrency)
+        else:
+            files = client.upload('/upload', os.path.join(root, 'download'), concurrency=concurrency)
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        seconds = 0 if start is None else time.perf_counter() - start
+        error = f'{e.__class__.__name__}: {e}'
+    finally:
+        client.close()
+
+    nbytes, incomplete = 0, 0
+    if operation != 'list':
+        target = received if operation == 'download' else uploaded
+        sizes = [os.path.getsize(os.path.join(target, f)) if os.path.isfile(os.path.join(target, f)) else 0 for f in files]
+        nbytes = sum(sizes)
+        incomplete = len([s for s in sizes if s != size])  # reported as transferred but cut short
+    return {
+        'operation': operation,
+        'concurrency': concurrency,
+        'files': len(files),
+        'failed': expected - len(files),
+        'incomplete': incomplete,
+        'bytes': nbytes,
+        'seconds': round(seconds, 3),
+        'mb_per_second': None if operation == 'list' else round(nbytes / MB / seconds, 2) if seconds > 0 else None,
+        'files_per_second': round(len(files) / seconds, 1) if seconds > 0 else None,
+        'dropped_connections': server.dropped - dropped,
+        'error': error
+    }
+
+
+def concurrency_value(value: str) -> int | str:
+    return value if value == 'auto' else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report MB/s and files/s of sftp and ftp transfers against local servers')
+    parser.add_argument('--protocol', choices=['sftp', 'ftp', 'ftps'], default='sftp')
+    parser.add_argument('--profile', required=True, help='Existing profile whose settings are used, pointed at the local server')
+    parser.add_argument('--config-file', help='Library configuration file, the CONFIGFILE environment variable if not provided')
+    parser.add_argument('--file-set', choices=list(FILE_SETS) + ['custom'], default='small')
+    parser.add_argument('--count', type=int, help='Number of files for the custom file set')
+    parser.add_argument('--size', type=int, help='Bytes per file for the custom file set')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--operations', nargs='*', choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument('--concurrency', type=concurrency_value, nargs='*', default=[1])
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added in each direction')
+    parser.add_argument('--bandwidth-mbps', type=float, help='Limit in MB per second in each direction')
+    parser.add_argument('--drop-rate', type=float, default=0, help='Probability a connection is cut within its first MB')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'automation_transfer_load'))
+    parser.add_argument('--output', help='Full path of a json file to save the results to')
+    args = parser.parse_args()
+
+    count, size = (args.count, args.size) if args.file_set == 'custom' else FILE_SETS[args.file_set]
+    if not count or not size:
+        parser.error('--count and --size are required for the custom file set')
+    root = os.path.join(args.work_dir, f'server_{count}x{size}')
+    generate_file_set(os.path.join(root, 'download'), count, size, args.seed)
+
+    conditions = impairment(
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mbps * MB if args.bandwidth_mbps else None,
+        drop_rate=args.drop_rate,
+        seed=args.seed
+    )
+    if args.protocol == 'sftp':
+        server = sftp_server(root, conditions=conditions)
+    else:
+        server = ftp_server(root, tls=args.protocol == 'ftps', conditions=conditions)
+
+    results = []
+    print(f"{'operation':<10} {'conc':>5} {'files':>7} {'failed':>7} {'short':>6} {'dropped':>8} {'seconds':>9} {'MB/s':>9} {'files/s':>9}")
+    with server:
+        for operation in args.operations:
+            for concurrency in args.concurrency if operation != 'list' else [1]:
+                for _ in range(args.repeat):
+                    result = run_operation(args, server, operation, concurrency, count, size, root)
+                    results.append(result)
+                    print(
+                        f"{operation:<10} {str(concurrency):>5} {result['files']:>7} {result['failed']:>7} {result['incomplete']:>6} {result['dropped_connections']:>8} "
+                        f"{result['seconds']:>9} {str(result['mb_per_second'] or '-'):>9} {str(result['files_per_second']):>9}"
+                        + (f"  {result['error']}" if result['error'] else '')
+                    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {
+                    'protocol': args.protocol,
+                    'file_count': count,
+                    'file_size': size,
+                    'latency_ms': args.latency_ms,
+                    'bandwidth_mbps': args.bandwidth_mbps,
+                    'drop_rate': args.drop_rate,
+                    'results': results
+                },
+                f,
+                indent=4
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ setup(
     packages=['automation'],
     package_dir={'automation': 'src'},
     test_suite='test',
+    entry_points={'console_scripts': ['automation=automation.cli:main']},
     install_requires=[
         'pandas>=2.1.3',
         'paramiko>=3.3.1',
@@ -0,0 +1,379 @@
+"""Command-line entry point, installed as the "automation" command and run with python -m automation
+
+Each subcommand imports only the modules it needs, so commands such as jsonstuff start without loading pandas or
+paramiko. Results are written to standard output as one JSON document, or one line per file with --format text, and
+library log messages go to standard error. The exit code is 0 when every file succeeded, 1 when anything failed and 2
+for invalid arguments.
+
+Examples
+--------
+automation sftp download --profile Partner --remote-dir /outbound --local-dir C:/inbound --concurrency auto
+automation pgp decrypt --profile Partner --path C:/inbound "*.pgp" --concurrency 4
+automation office convert csv_to_excel C:/reports/*.csv --concurrency 4 --dry-run
+automation jsonstuff reformat C:/exports --format text
+"""
+import argparse
+import concurrent.futures
+import fnmatch
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from . import __version__, BOOLEANS
+
+
+class cli_constants:
+    """A class for constants necessary for the cli module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    PROG = 'automation'
+    FORMATS = ['json', 'text']
+    TRANSFER_ACTIONS = ['list', 'download', 'upload', 'sync']
+    PGP_ACTIONS = ['encrypt', 'decrypt']
+    CONVERT_METHODS = ['change_delimiter', 'csv_to_excel', 'excel_to_csv', 'extract_columns', 'word_to_pdf']
+    NO_DRY_RUN = [('sftp', 'sync'), ('ftp', 'sync'), ('fileproc', 'monitor')]  # monitor records the time of each review
+    COM_METHODS = ['word_to_pdf']  # drive Word through COM, always run one file at a time
+    EXIT_SUCCESS = 0
+    EXIT_FAILED = 1
+    EXIT_USAGE = 2
+
+
+def _concurrency(value: str) -> int | str:
+    if value == 'auto':
+        return value
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid concurrency '{value}', expected a positive integer or auto")
+    return number
+
+
+def _extra_arg(value: str) -> tuple:
+    """Parse a key=value pair passed on to the library method, the value read as JSON when it is valid JSON"""
+    key, sep, raw = value.partition('=')
+    if sep == '' or key.strip() == '':
+        raise argparse.ArgumentTypeError(f"invalid argument '{value}', expected key=value")
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        parsed = raw
+    return key.strip(), parsed
+
+
+def _expand(patterns: list) -> list:
+    """Expand wildcards in file names, as the Windows shell does not"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files += [f for f in matches if f not in files]
+    return files
+
+
+def _result(name: str, status: str, path: str = None, error: str = None, **fields) -> dict:
+    return {'name': name, 'status': status, 'path': path, 'error': error, **fields}
+
+
+def _file_results(results) -> list:
+    """Convert transfer.file_result objects into dicts"""
+    return [_result(r.name, r.status, r.path, r.error, bytes=r.bytes, seconds=round(r.duration, 3)) for r in results]
+
+
+def _run_each(files: list, concurrency: int | str, work, open_client=None) -> list:
+    """Run 'work(client, file)' for every file on up to 'concurrency' threads, each thread creating its own client
+
+    "auto" uses one thread per processor, as the files are worked on locally rather than over a connection to tune
+    """
+    local = threading.local()
+    concurrency = (os.cpu_count() or 1) if concurrency == 'auto' else concurrency
+
+    def run(f: str) -> dict:
+        try:
+            if open_client is not None and not hasattr(local, 'client'):
+                local.client = open_client()
+            return work(getattr(local, 'client', None), f)
+        except Exception as e:
+            return _result(os.path.basename(f), 'failed', f, f'{e.__class__.__name__}: {e}')
+
+    if concurrency == 1 or len(files) <= 1:
+        return [run(f) for f in files]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=cli_constants.MODULE_NAME) as pool:
+        return list(pool.map(run, files))
+
+
+def _cmd_transfer(args: argparse.Namespace) -> list:
+    if args.command == 'sftp':
+        from .sftp import sftp
+        client = sftp(args.profile, track_progress=False, config_file=args.config_file, lazy=True)
+    else:
+        from .ftp import ftp
+        client = ftp(args.profile, track_progress=False, config_file=args.config_file, use_tls=not args.no_tls, lazy=True)
+    extra = dict(args.arg)
+
+    try:
+        if args.action == 'list':
+            remote_dir = args.remote_dir or client.remote_in
+            names = client.listsftpdir(remote_dir, recursive=args.recursive) if args.command == 'sftp' else client.listftpdir(remote_dir)
+            return [_result(n, 'listed') for n in names]
+
+        if args.dry_run and args.action == 'download':
+            from .transfer import select_files
+            remote_dir = args.remote_dir or client.remote_in
+            listing = client.listsftpdir(remote_dir) if args.command == 'sftp' else client.listftpdir(remote_dir)
+            suppress = args.suppress or client.suppress_in
+            return [_result(n, 'pending') for n in select_files(listing, args.files, suppress, 'download', remote_dir)]
+        if args.dry_run and args.action == 'upload':
+            pending = client.pending_uploads(local_dir=args.local_dir, local_files=args.files, suppress_override=args.suppress)
+            return [_result(n, 'pending') for n in pending]
+
+        if args.action == 'sync':
+            names = client.sync(
+                remote_dir=args.remote_dir, local_dir=args.local_dir, sync_files=args.files, suppress_override=args.suppress, **extra
+            )
+            return [_result(n, 'success') for n in names]
+        files_key = 'remote_files' if args.action == 'download' else 'local_files'
+        kwargs = {
+            'remote_dir': args.remote_dir,
+            'local_dir': args.local_dir,
+            files_key: args.files,
+            'suppress_override': args.suppress,
+            'concurrency': args.concurrency,
+            **extra
+        }
+        return _file_results(getattr(client, f'iter_{args.action}')(**kwargs))
+    finally:
+        client.close()
+
+
+def _cmd_pgp(args: argparse.Namespace) -> list:
+    from .pgp import pgp
+    profile = pgp(args.profile, config_file=args.config_file)
+    archive = not args.no_archive
+    iterate = 'iter_encrypt' if args.action == 'encrypt' else 'iter_decrypt'
+    if len(args.files) == 0 and args.concurrency == 1 and not args.dry_run:
+        return _file_results(getattr(profile, iterate)(path_override=args.path, archive=archive, write_log=args.write_log))
+
+    directory = args.path or (profile.encrypt_path if args.action == 'encrypt' else profile.decrypt_path)
+    if not directory or not os.path.isdir(directory):
+        raise FileNotFoundError(f"path '{directory}' does not exist")
+    listing = sorted(f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)))
+    if len(args.files) > 0:
+        selected = [f for f in listing if any(fnmatch.fnmatch(f, p) for p in args.files)]
+    else:
+        suppress = profile.suppress_encrypt if args.action == 'encrypt' else profile.suppress_decrypt
+        selected = [f for f in listing if not any(fnmatch.fnmatch(f, s) for s in suppress)]
+    if args.dry_run:
+        return [_result(f, 'pending', os.path.join(directory, f)) for f in selected]
+
+    def work(client, f: str) -> dict:
+        results = _file_results(getattr(client, iterate)(path_override=directory, file_override=[f], archive=archive, write_log=args.write_log))
+        return results[0] if len(results) > 0 else _result(f, 'skipped', os.path.join(directory, f))
+
+    # unlocking a private key changes it, so every thread works with its own profile object
+    return _run_each(selected, args.concurrency, work, lambda: pgp(args.profile, config_file=args.config_file))
+
+
+def _cmd_office(args: argparse.Namespace) -> list:
+    files = _expand(args.files)
+    if args.dry_run:
+        return [_result(os.path.basename(f), 'pending' if os.path.isfile(f) else 'failed', f, None if os.path.isfile(f) else 'file does not exist') for f in files]
+    from .office import convert
+    extra = dict(args.arg)
+    concurrency = 1 if args.method in cli_constants.COM_METHODS else args.concurrency
+
+    def work(client, f: str) -> dict:
+        output_file = getattr(client, args.method)(filename=f, **extra)
+        return _result(os.path.basename(f), 'success', output_file)
+
+    return _run_each(files, concurrency, work, lambda: convert(args.config_file))
+
+
+def _cmd_fileproc(args: argparse.Namespace) -> list:
+    if args.action == 'monitor':
+        from .fileproc import monitoring
+        names = monitoring(args.path, args.config_file).modified_files(write_log=args.write_log)
+        return [_result(n, 'modified') for n in names]
+
+    directory = args.merge_dir if args.action == 'merge' else args.source_dir
+    if args.dry_run:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"path '{directory}' does not exist")
+        return [
+            _result(f, 'pending', os.path.join(directory, f))
+            for f in sorted(os.listdir(directory)) if fnmatch.fnmatch(f, args.wildcard) and os.path.isfile(os.path.join(directory, f))
+        ]
+    from .fileproc import manipulate
+    if args.action == 'merge':
+        output_file = manipulate(args.config_file).mergecsvfiles(args.merge_dir, args.wildcard, args.merge_name, header=args.header, delim=args.delim)
+        return [_result(os.path.basename(output_file), 'success', output_file)]
+    copied = manipulate(args.config_file).wildcardcopy(args.source_dir, args.dest_dir, args.wildcard)
+    return [_result(os.path.basename(f), 'success', f) for f in copied]
+
+
+def _cmd_jsonstuff(args: argparse.Namespace) -> list:
+    from .jsonstuff import reformat_json
+    if args.dry_run:
+        if not os.path.isdir(args.path):
+            raise FileNotFoundError(f"path '{args.path}' does not exist")
+        if len(args.files) > 0:
+            selected = args.files
+        else:
+            selected = [f for f in sorted(os.listdir(args.path)) if fnmatch.fnmatch(f, '*.json') and '_reformat' not in f]
+        results = []
+        for f in selected:
+            if not os.path.isfile(os.path.join(args.path, f)):
+                results.append(_result(f, 'failed', os.path.join(args.path, f), 'file does not exist'))
+            elif os.path.isfile(os.path.join(args.path, f'{os.path.splitext(f)[0]}_reformat.json')):
+                results.append(_result(f, 'skipped', os.path.join(args.path, f)))
+            else:
+                results.append(_result(f, 'pending', os.path.join(args.path, f)))
+        return results
+    return [_result(os.path.basename(f), 'success', f) for f in reformat_json(args.path, args.files)]
+
+
+def _cmd_pipeline(args: argparse.Namespace) -> list:
+    from .pipeline import run_pipeline
+    report = run_pipeline(args.definition, args.config_file, dry_run=args.dry_run)
+    if args.dry_run:
+        return [_result(s['name'], 'pending', None, None, stage=s) for s in report['pipeline']['stages']]
+    return report['results']
+
+
+def _parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config-file', help='Library configuration file, the CONFIGFILE environment variable if not provided')
+    common.add_argument('--format', choices=cli_constants.FORMATS, default='json', help='Output format (default json)')
+    common.add_argument('--dry-run', action='store_true', help='Report what would be processed without changing anything')
+    common.add_argument('--concurrency', type=_concurrency, default=1, help='Files processed at the same time, "auto" for tuned transfers')
+    common.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+
+    parser = argparse.ArgumentParser(prog=cli_constants.PROG, description='Run automation library operations from the command line')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for protocol in ('sftp', 'ftp'):
+        p = commands.add_parser(protocol, parents=[common], help=f'Transfer files with an {protocol.upper()} profile')
+        p.add_argument('action', choices=cli_constants.TRANSFER_ACTIONS)
+        p.add_argument('--profile', required=True)
+        p.add_argument('--remote-dir')
+        p.add_argument('--local-dir')
+        p.add_argument('--files', nargs='*', default=[], help='Specific files or wildcards to transfer')
+        p.add_argument('--suppress', nargs='*', default=[], help='Files or wildcards to skip instead of the profile defaults')
+        p.add_argument('--arg', type=_extra_arg, action='append', default=[], help='Other argument of the method as key=value, i.e. delete_ftp=false')
+        if protocol == 'sftp':
+            p.add_argument('--recursive', action='store_true', help='List subdirectories too')
+        else:
+            p.add_argument('--no-tls', action='store_true', help='Connect without TLS')
+        p.set_defaults(handler=_cmd_transfer)
+
+    p = commands.add_parser('pgp', parents=[common], help='Encrypt or decrypt files with a PGP profile')
+    p.add_argument('action', choices=cli_constants.PGP_ACTIONS)
+    p.add_argument('files', nargs='*', default=[], help='Files or wildcards in the directory, the profile rules are used if none')
+    p.add_argument('--profile', required=True)
+    p.add_argument('--path', help='Directory of the files, the profile default if not provided')
+    p.add_argument('--no-archive', action='store_true', help='Leave the original files in place')
+    p.add_argument('--write-log', action='store_true')
+    p.set_defaults(handler=_cmd_pgp)
+
+    p = commands.add_parser('office', help='Convert csv and Office files')
+    office = p.add_subparsers(dest='action', required=True)
+    p = office.add_parser('convert', parents=[common], help='Run an office.convert method on each file')
+    p.add_argument('method', choices=cli_constants.CONVERT_METHODS)
+    p.add_argument('files', nargs='+', help='Files to convert, wildcards are expanded')
+    p.add_argument('--arg', type=_extra_arg, action='append', default=[], help='Other argument of the method as key=value, i.e. new_delim="|"')
+    p.set_defaults(handler=_cmd_office)
+
+    p = commands.add_parser('fileproc', help='Merge, copy or monitor local files')
+    fileproc = p.add_subparsers(dest='action', required=True)
+    p = fileproc.add_parser('merge', parents=[common], help='Merge csv files matching a wildcard into one file')
+    p.add_argument('merge_dir')
+    p.add_argument('wildcard')
+    p.add_argument('merge_name')
+    p.add_argument('--header', action='store_true', help='The files have a header row')
+    p.add_argument('--delim')
+    p.set_defaults(handler=_cmd_fileproc)
+    p = fileproc.add_parser('copy', parents=[common], help='Copy files matching a wildcard')
+    p.add_argument('source_dir')
+    p.add_argument('dest_dir')
+    p.add_argument('wildcard')
+    p.set_defaults(handler=_cmd_fileproc)
+    p = fileproc.add_parser('monitor', parents=[common], help='List files modified since the last review of a directory')
+    p.add_argument('path')
+    p.add_argument('--write-log', action='store_true')
+    p.set_defaults(handler=_cmd_fileproc)
+
+    p = commands.add_parser('jsonstuff', help='Reformat JSON files')
+    jsonstuff = p.add_subparsers(dest='action', required=True)
+    p = jsonstuff.add_parser('reformat', parents=[common], help='Write a readable copy of single-line JSON files')
+    p.add_argument('path')
+    p.add_argument('files', nargs='*', default=[], help='Specific files in the directory, every JSON file if none')
+    p.set_defaults(handler=_cmd_jsonstuff)
+
+    p = commands.add_parser('pipeline', parents=[common], help='Run a YAML pipeline definition')
+    p.add_argument('definition', help='Full path of the pipeline YAML file')
+    p.set_defaults(handler=_cmd_pipeline)
+
+    commands.add_parser('service', add_help=False, help='Run the long-running service, see automation service --help')
+    return parser
+
+
+def _write(report: dict, output_format: str):
+    if output_format == 'json':
+        json.dump(report, sys.stdout, indent=4, default=str)
+        sys.stdout.write('\n')
+        return
+    for r in report['results']:
+        line = f"{r.get('status', ''):<9} {r.get('name', '')}"
+        if r.get('path'):
+            line += f"  {r['path']}"
+        if r.get('error'):
+            line += f"  {r['error']}"
+        sys.stdout.write(line + '\n')
+    summary = f"{report['command']}: {report['status']}, {len(report['results'])} files in {report['seconds']} seconds"
+    if report['error']:
+        summary += f" ({report['error']})"
+    sys.stdout.write(summary + '\n')
+
+
+def main(argv: list = None) -> int:
+    """Run the command in 'argv', the process arguments if not provided, and return the exit code"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if len(argv) > 0 and argv[0] == 'service':
+        from .service import main as service_main
+        service_main(argv[1:])
+        return cli_constants.EXIT_SUCCESS
+
+    parser = _parser()
+    try:
+        args = parser.parse_args(argv)
+        if args.dry_run and (args.command, getattr(args, 'action', None)) in cli_constants.NO_DRY_RUN:
+            parser.error(f'{args.command} {args.action} does not support --dry-run')
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else cli_constants.EXIT_USAGE
+    args.dry_run = args.dry_run if args.dry_run in BOOLEANS else False
+    logging.basicConfig(level=args.log_level, stream=sys.stderr, format='%(levelname)s %(message)s')
+
+    from .secrets import DATABASE_CACHE
+    DATABASE_CACHE.enable()  # profile objects created per thread share the unlocked database
+
+    command = ' '.join(x for x in (args.command, getattr(args, 'action', None)) if x)
+    started = time.perf_counter()
+    report = {'command': command, 'status': 'success', 'dry_run': args.dry_run, 'results': [], 'error': None}
+    try:
+        report['results'] = args.handler(args)
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = f'{e.__class__.__name__}: {e}'
+    if any(r.get('status') == 'failed' for r in report['results']):
+        report['status'] = 'failed'
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    _write(report, args.format)
+    return cli_constants.EXIT_SUCCESS if report['status'] == 'success' else cli_constants.EXIT_FAILED
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,24 @@
+import csv
 import logging
 import os
+import re
 import shlex
 import shutil
 import subprocess
 import time
 
-import pandas as pd
-import pyodbc as sql
-
 from . import BOOLEANS
+from .misc import lazy_module
+
+pd = lazy_module('pandas')
+sql = lazy_module('pyodbc')
+
+
+class db_constants:
+    """A class for constants necessary for the db module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_ ]*$')  # a table, schema or column name that needs no escaping
+    BATCH_SIZE = 10000  # rows sent per executemany call when loading a file
 
 
 class db:
@@ -214,3 +224,80 @@ WHERE job.name = '{job_name}'
         r = subprocess.run(cmd, shell=True, cwd=root_path)
 
         return r.returncode
+
+    def load_csv(self, filename: str, table: str, delim: str = ',', batch_size: int = db_constants.BATCH_SIZE) -> int:
+        """Inserts the rows of a csv file into an existing table
+
+        The header row names the columns, values are sent as parameters in batches and empty values are inserted as
+        NULL. The rows are committed once every batch has been inserted
+
+        Parameters
+        ----------
+        filename : str
+            Full path of the csv file to load
+        table : str
+            Name of the table to insert into, optionally prefixed by its schema, i.e. "stage.PartnerFile"
+        delim : str, optional (default ',')
+            Delimiter of the file
+        batch_size : int, optional (default 10000)
+            Rows sent to the server per call
+
+        Returns
+        -------
+        int : the number of rows inserted
+
+        Raises
+        ------
+        TypeError
+            If no connection exists
+        FileNotFoundError
+            If 'filename' does not exist
+        ValueError
+            If 'table' or a column name is not a plain identifier
+
+        """
+        if not self.conn:
+            err_msg = 'connection does not exist'
+            logging.critical(err_msg)
+            raise TypeError(err_msg)
+        if not os.path.isfile(filename):
+            err_msg = f"file '{filename}' does not exist"
+            logging.critical(err_msg)
+            raise FileNotFoundError(err_msg)
+        batch_size = batch_size if isinstance(batch_size, int) and not isinstance(batch_size, bool) and batch_size > 0 else db_constants.BATCH_SIZE
+
+        with open(filename, mode='r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter=delim)
+            columns = next(reader, [])
+            for name in table.split('.') + columns:
+                if not db_constants.IDENTIFIER.match(name):
+                    err_msg = f"invalid identifier '{name}' loading file '{filename}'"
+                    logging.critical(err_msg)
+                    raise ValueError(err_msg)
+
+            target = '.'.join(f'[{x}]' for x in table.split('.'))
+            qry_text = f"INSERT INTO {target} ({', '.join(f'[{x}]' for x in columns)}) VALUES ({', '.join('?' * len(columns))})"
+            logging.debug(qry_text)
+            csr = self.conn.cursor()
+            csr.fast_executemany = True
+            rows = 0
+            try:
+                batch = []
+                for row in reader:
+                    batch.append([None if x == '' else x for x in row])
+                    if len(batch) == batch_size:
+                        csr.executemany(qry_text, batch)
+                        rows += len(batch)
+                        batch = []
+                if len(batch) > 0:
+                    csr.executemany(qry_text, batch)
+                    rows += len(batch)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                csr.close()
+
+        logging.debug(f"{rows} rows loaded from '{filename}' into {target}")
+        return rows
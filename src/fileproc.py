@@ -8,6 +8,7 @@ import subprocess
 import tempfile
 
 from . import BOOLEANS, NL, VALID_DELIMS
+from .metrics import METRICS
 from .misc import get_config
 
 
@@ -28,6 +29,7 @@ class manipulate:
     def __init__(self, config_file: str = None):
         self.config_file = config_file
 
+    @METRICS.timed('fileproc.mergecsvfiles')
     def mergecsvfiles(self, merge_dir: str, merge_wildcard: str, merge_name: str, header: bool = False, delim: str = None) -> str:
         """Merge all csv files in a directory
 
@@ -116,6 +118,7 @@ class manipulate:
 
         return merged_file
 
+    @METRICS.timed('fileproc.wildcardcopy')
     def wildcardcopy(self, source_dir: str, dest_dir: str, file_wildcard: str) -> list:
         """Copy files using a wilcard from one directory to another
 
@@ -325,6 +328,7 @@ class monitoring:
         self.last_review_time = self._processtime(readwrite='r', dt_string=dt_string)
         self.manual_review = True
 
+    @METRICS.timed('fileproc.modified_files')
     def modified_files(self, write_log: bool = False) -> list:
         """Identify which files have been modified since a preset datetime value
 
@@ -1,14 +1,26 @@
+import concurrent.futures
+import contextlib
 import datetime as dt
-import fnmatch
 import ftplib
+import io
 import logging
 import os
 import posixpath
 import re
+import ssl
+import threading
+import time
 
 from . import NL, BOOLEANS
+from .metrics import METRICS
 from .misc import get_config
 from .secrets import keepass
+from .transfer import (
+    ASYNC_RUNNER, LISTING_CACHE, attribute_filter, block_callback, bundle_format, check_bundle_format, concurrency_tuner,
+    extract_bundle, format_hash_manifest, iterate_results, manifest, local_signature, parallel_transfer, parse_hash_manifest,
+    parse_mlsd_time, progress_callback, progress_tracker, remote_file, remote_signature, result_recorder, select_files, sha256_file,
+    transfer_constants, verify_files, write_bundle
+)
 
 
 class ftp_constants:
@@ -48,15 +60,26 @@ class ftp:
     suppress_out : list
         Specific files or wildcard names to not upload to an FTP
     ftp : ftplib.FTP
-        Object representing the FTP client being connected to
+        Object representing the FTP client being connected to, connected on first use if 'lazy' is True
+    lazy : bool
+        Whether connecting is deferred until the first operation that needs the server
     log_path : str
         Directory in which log files will write to. Defined in the configuration file and will always be root/module_name
     log_name : str
         Name of log file, always module_yyyymmddHHMMSS.log
     log_delim : str
         Delimiter to use in the log file, defined in the configuration file
-    track_progress : bool
-        Indicator whether to print progress messages to stdout every 100 files processed
+    track_progress : bool or callable
+        Indicator whether to log progress of transfers, every 100 files processed and every minute while bytes move, or
+        a callable receiving a transfer.transfer_progress with file and byte counts, MB/s, ETA and errors instead
+    listing_ttl : float
+        Number of seconds a remote directory listing can be reused from the shared listing cache, 0 disables caching
+    throttle : callable
+        Called with the number of bytes moved after every block of a per-file transfer, blocking to limit bandwidth.
+        Set by scheduler.scheduler while it runs a job on this profile, None otherwise
+    on_result : callable
+        Called with a transfer.file_result as each file of a download or upload completes. Set by 'iter_download' and
+        'iter_upload' while they run, None otherwise
 
     """
     def __init__(
@@ -64,7 +87,9 @@ class ftp:
         profile_name: str,
         track_progress: bool = True,
         config_file: str = None,
-        use_tls: bool = True
+        use_tls: bool = True,
+        listing_ttl: float = 0,
+        lazy: bool = False
     ):
         """Inits ftp class
 
@@ -72,12 +97,18 @@ class ftp:
         ----------
         profile_name : str
             Name of FTP profile
-        track_progress: bool, optional (default True)
-            Inidicator if progress should be printed to stdout
+        track_progress: bool or callable, optional (default True)
+            Inidicator if progress should be logged, or a callable to call with a transfer.transfer_progress after
+            every file processed and at most once a second while bytes move
         config_file : str, optional (default None)
             Full path location of library configuration file
         use_tls : bool, optional (default True)
             Whether or not TLS should be used
+        listing_ttl : float, optional (default 0)
+            Number of seconds a remote directory listing can be reused from the shared listing cache, 0 disables caching
+        lazy : bool, optional (default False)
+            Whether connecting should wait until the first operation that needs the server, so a script that finds
+            nothing to transfer never connects. Connection errors are then raised by that operation instead of here
 
         Raises
         ------
@@ -123,20 +154,56 @@ class ftp:
         self.log_path = os.path.join(get_config('logRoot', self.config_file), ftp_constants.MODULE_NAME)
         self.log_name = f"{self.__class__.__name__}_{dt.datetime.now().strftime('%Y%m%d%H%M%S')}_{re.sub(r'[^a-zA-Z0-9]', '', self.name)}.log"
         self.log_delim = get_config('logDelimiter', self.config_file)
-        self.track_progress = track_progress if track_progress in BOOLEANS else True
+        self.track_progress = track_progress if track_progress in BOOLEANS or callable(track_progress) else True
+        self.listing_ttl = listing_ttl if isinstance(listing_ttl, (int, float)) and listing_ttl > 0 else 0
+        self.throttle = None
+        self.on_result = None
+        self.lazy = lazy if lazy in BOOLEANS else False
+        self._ftp = None
+        self._connect_lock = threading.Lock()
 
         self._validate_profile()
 
-        self._connectftp()
+        if not self.lazy:
+            self._connectftp()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self.ftp.close()
+        self.close()
 
     def close(self):
-        self.ftp.close()
+        if self._ftp is not None:
+            self._ftp.close()
+
+    @property
+    def ftp(self) -> ftplib.FTP:
+        """The connected FTP client, connecting first if the connection was deferred"""
+        if self._ftp is None:
+            with self._connect_lock:
+                if self._ftp is None:
+                    self._connectftp()
+        return self._ftp
+
+    @ftp.setter
+    def ftp(self, client: ftplib.FTP):
+        self._ftp = client
+
+    @property
+    def connected(self) -> bool:
+        """Whether a connection has been made, without connecting"""
+        return self._ftp is not None
+
+    def alive(self) -> bool:
+        """Whether the server still answers on the connection, True if none has been made yet as one is made on first use"""
+        if self._ftp is None:
+            return True
+        try:
+            self._ftp.voidcmd('NOOP')
+        except (*ftplib.all_errors, AttributeError):  # AttributeError: ftplib drops the socket of a closed connection
+            return False
+        return True
 
     def _validate_profile(self):
         err_text = None
@@ -149,26 +216,38 @@ class ftp:
             logging.critical(err_text)
             raise ValueError(err_text)
 
+    @METRICS.timed('ftp.connect')
     def _connectftp(self):
         """Connects to the ftp"""
-        if self.use_tls:
-            self.ftp = ftplib.FTP_TLS()
-            self.ftp.connect(host=self.host, port=self.port)
-            self.ftp.login(user=self.usr, passwd=self.pwd)
-        else:
-            self.ftp = ftplib.FTP()
-            self.ftp.connect(host=self.host, port=self.port)
-            self.ftp.login(user=self.usr, passwd=self.pwd)
+        ftp = ftplib.FTP_TLS() if self.use_tls else ftplib.FTP()
+        ftp.connect(host=self.host, port=self.port)
+        ftp.login(user=self.usr, passwd=self.pwd)
+        self.ftp = ftp
+
+    def _connection(self, remote_dir: str) -> ftplib.FTP:
+        """Class function to open an additional connection in 'remote_dir' for parallel transfers, to be used as a context manager"""
+        session = ftplib.FTP_TLS() if self.use_tls else ftplib.FTP()
+        try:
+            session.connect(host=self.host, port=self.port)
+            session.login(user=self.usr, passwd=self.pwd)
+            if self.use_tls:
+                session.prot_p()
+            session.cwd(remote_dir)
+        except BaseException:
+            session.close()
+            raise
+        return session
 
     def _writelog(self, direction: str, remote_dir: str, local_dir: str, filename: str):
-        """Class function to write to a log file"""
+        """Class function to write to a log file, safe to call from parallel transfer threads"""
         if not os.path.isdir(self.log_path):
-            os.mkdir(self.log_path)
+            os.makedirs(self.log_path, exist_ok=True)
         with open(os.path.join(self.log_path, self.log_name), 'a') as logfile:
             dte, tme = dt.datetime.now().strftime('%Y-%m-%d'), dt.datetime.now().strftime('%H:%M:%S')
             logfile.write(f'{self.name}{self.log_delim}{dte}{self.log_delim}{tme}{self.log_delim}{direction}{self.log_delim}')
             logfile.write(f'{remote_dir}{self.log_delim}{local_dir.replace(os.sep, posixpath.sep)}{self.log_delim}{filename}{NL}')
 
+    @METRICS.timed('ftp.list')
     def listftpdir(self, remote_dir: str) -> list:
         """Return a list of files/folders on an FTP
 
@@ -187,11 +266,280 @@ class ftp:
         self.ftp.cwd(remote_dir)
         if self.use_tls:
             self.ftp.prot_p()
-        file_list = self.ftp.nlst()  # this technically will return directories too, FTP doesn't provide an easy way to exclude them
+        file_list = LISTING_CACHE.get(ftp_constants.MODULE_NAME, self.name, remote_dir, 'nlst', self.listing_ttl)
+        if file_list is None:
+            file_list = self.ftp.nlst()  # this technically will return directories too, FTP doesn't provide an easy way to exclude them
+            if self.listing_ttl:
+                LISTING_CACHE.put(ftp_constants.MODULE_NAME, self.name, remote_dir, 'nlst', file_list)
         file_list = [f for f in file_list if '.' in f]  # excluding strings without extensions, only 99% right
 
         return file_list
 
+    def _listftpattr(self, remote_dir: str) -> list:
+        """Class function to return the size and modification time of all files, excluding directories, in a remote directory
+
+        Uses MLSD where the server supports it, otherwise falls back to NLST with a SIZE and MDTM per file.
+        Served from the shared listing cache when 'self.listing_ttl' allows it.
+
+        """
+        self.ftp.cwd(remote_dir)
+        if self.use_tls:
+            self.ftp.prot_p()
+
+        attr_list = LISTING_CACHE.get(ftp_constants.MODULE_NAME, self.name, remote_dir, 'attr', self.listing_ttl)
+        if attr_list is not None:
+            return attr_list
+
+        attr_list = []
+        try:
+            for name, facts in self.ftp.mlsd(facts=['type', 'size', 'modify']):
+                if facts.get('type', 'file').lower() != 'file':
+                    continue  # skips dir, cdir, pdir and OS-specific entries
+                size = int(facts['size']) if facts.get('size', '').isdigit() else None
+                attr_list.append(remote_file(name, size, parse_mlsd_time(facts.get('modify'))))
+        except ftplib.error_perm:
+            # MLSD not supported; a failing SIZE is the best available indicator of a directory
+            for name in self.ftp.nlst():
+                try:
+                    size = self.ftp.size(name)
+                except ftplib.error_perm:
+                    continue
+                try:
+                    mtime = parse_mlsd_time(self.ftp.voidcmd(f'MDTM {name}')[4:].strip())
+                except ftplib.error_perm:
+                    mtime = None
+                attr_list.append(remote_file(name, size, mtime))
+
+        if self.listing_ttl:
+            LISTING_CACHE.put(ftp_constants.MODULE_NAME, self.name, remote_dir, 'attr', attr_list)
+
+        return attr_list
+
+    def _stor(self, remote_dir: str, filename: str, local_file: str, session: ftplib.FTP = None):
+        """Class function to upload a file into the current remote directory, invalidating any cached listing of it"""
+        session = self.ftp if session is None else session
+        try:
+            with open(local_file, 'rb') as uf:
+                session.storbinary('STOR ' + filename, uf, callback=block_callback(self.throttle))
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                self._interrupted(session)
+            raise
+        finally:
+            LISTING_CACHE.invalidate(ftp_constants.MODULE_NAME, self.name, remote_dir)
+
+    def _interrupted(self, session: ftplib.FTP):
+        """Class function to read the reply to a transfer stopped from its block callback (i.e. cancelled)
+
+        ftplib closes the data connection without reading the reply, which would otherwise be taken as the reply to
+        the next command
+
+        """
+        try:
+            session.voidresp()
+        except ftplib.all_errors:
+            pass
+
+    def _session(self, remote_dir: str):
+        """Class function to move the FTP session to 'remote_dir', returned as a context manager for symmetry with sftp"""
+        self.ftp.cwd(remote_dir)
+        if self.use_tls:
+            self.ftp.prot_p()
+        return contextlib.nullcontext(self.ftp)
+
+    @contextlib.contextmanager
+    def _stream_put(self, session: ftplib.FTP, remote_dir: str, filename: str):
+        """Class function to open a file in the current remote directory for streamed writing over a data connection
+
+        A partially written file is removed on failure
+
+        """
+        try:
+            session.voidcmd('TYPE I')
+            with session.transfercmd('STOR ' + filename) as conn:
+                with conn.makefile('wb') as cf:
+                    yield cf
+                if isinstance(conn, ssl.SSLSocket):
+                    conn.unwrap()
+            session.voidresp()
+        except BaseException:
+            try:
+                session.delete(filename)
+            except ftplib.all_errors:
+                pass
+            raise
+        finally:
+            LISTING_CACHE.invalidate(ftp_constants.MODULE_NAME, self.name, remote_dir)
+
+    def _stor_bundle(self, remote_dir: str, bundle: str, local_dir: str, file_list: list) -> bool:
+        """Class function to upload files packed into a single compressed bundle, written straight into the data connection
+
+        Returns
+        -------
+        bool : Whether or not the bundle was uploaded, a partially written bundle is removed
+
+        """
+        try:
+            with self._stream_put(self.ftp, remote_dir, bundle) as cf:
+                write_bundle(cf, bundle, local_dir, file_list)
+        except Exception as e:
+            logging.error(f"unable to upload bundle '{bundle}' to '{remote_dir}'|{e}")
+            return False
+
+        return True
+
+    def _delete(self, remote_dir: str, filename: str, session: ftplib.FTP = None):
+        """Class function to delete a file in the current remote directory, invalidating any cached listing of it"""
+        session = self.ftp if session is None else session
+        try:
+            session.delete(filename)
+        finally:
+            LISTING_CACHE.invalidate(ftp_constants.MODULE_NAME, self.name, remote_dir)
+
+    def _rename(self, old_file: str, new_file: str):
+        """Class function to rename a remote file, invalidating any cached listing of both remote directories"""
+        try:
+            self.ftp.rename(old_file, new_file)
+        finally:
+            LISTING_CACHE.invalidate(ftp_constants.MODULE_NAME, self.name, posixpath.dirname(old_file))
+            LISTING_CACHE.invalidate(ftp_constants.MODULE_NAME, self.name, posixpath.dirname(new_file))
+
+    def _archive(self, remote_dir: str, remote_archive_dir: str, file_list: list) -> list:
+        """Class function to move remote files into an archive directory with server-side renames (RNFR/RNTO)
+
+        Returns
+        -------
+        list : the files archived
+
+        """
+        archive_list = []
+        for f in file_list:
+            old_file = posixpath.join(remote_dir, f)
+            new_file = posixpath.join(remote_archive_dir, f)
+            try:
+                self._rename(old_file, new_file)
+                archive_list.append(f)
+            except Exception as e:
+                logging.error(f"unable to archive '{old_file}' to '{new_file}'|{e}")
+
+        return archive_list
+
+    def _read_hash_manifest(self, remote_dir: str, hash_manifest: str) -> dict:
+        """Class function to read a hash manifest from the current remote directory, returning an empty dict if it does not exist"""
+        buffer = io.BytesIO()
+        try:
+            self.ftp.retrbinary('RETR ' + hash_manifest, buffer.write)
+        except ftplib.error_perm:
+            return {}
+        return parse_hash_manifest(buffer.getvalue().decode('utf-8'))
+
+    def _write_hash_manifest(self, remote_dir: str, hash_manifest: str, hashes: dict):
+        """Class function to add file hashes to a hash manifest in the current remote directory, keeping earlier entries"""
+        all_hashes = self._read_hash_manifest(remote_dir, hash_manifest)
+        all_hashes.update(hashes)
+        with self._stream_put(self.ftp, remote_dir, hash_manifest) as mf:
+            mf.write(format_hash_manifest(all_hashes).encode('utf-8'))
+
+    def _remote_size(self, filename: str) -> int:
+        """Class function to return the size of a file in the current remote directory, or None if unavailable"""
+        try:
+            self.ftp.voidcmd('TYPE I')
+            return self.ftp.size(filename)
+        except ftplib.error_perm:
+            return None
+
+    def _remote_hash_function(self):
+        """Class function to build a function returning the SHA-256 of a file in the current remote directory
+
+        Uses the HASH command, returns None if the server does not support it with SHA-256
+
+        """
+        try:
+            self.ftp.sendcmd('OPTS HASH SHA-256')
+        except ftplib.error_perm:
+            return None
+
+        def remote_hash(filename: str) -> str:
+            try:
+                response = self.ftp.sendcmd(f'HASH {filename}')  # 213 SHA-256 0-<size> <digest> <filename>
+            except ftplib.error_perm:
+                return None
+            parts = response.split()
+            return parts[3].lower() if len(parts) >= 4 else None
+
+        return remote_hash
+
+    def _download_file(
+        self,
+        remote_dir: str,
+        local_dir: str,
+        local_archive_dir: str,
+        filename: str,
+        delete_ftp: bool,
+        write_log: bool,
+        extract_bundles: bool = False,
+        session: ftplib.FTP = None,
+        recorder: result_recorder = None
+    ) -> bool:
+        """Class function to download a single file from the current remote directory
+
+        Skipped if it already exists locally or in the local archive. With 'extract_bundles', a bundle is read from the
+        data connection as a stream and its content extracted into 'local_dir'. Uses 'session' instead of 'self.ftp'
+        if provided. The outcome is handed to 'recorder' if provided
+
+        Returns
+        -------
+        bool : Whether or not the file was downloaded
+
+        """
+        started = time.monotonic()
+        recorder = result_recorder(None) if recorder is None else recorder
+        session = self.ftp if session is None else session
+        remote_file = os.path.join(remote_dir, filename).replace('\\', '/')
+        local_file = os.path.join(local_dir, filename)
+        if os.path.isfile(local_file) or os.path.isfile(os.path.join(local_archive_dir, filename)):
+            recorder.record(filename, local_file, 0, started, 'skipped')
+            return False
+
+        extract = extract_bundles and bundle_format(filename) is not None
+        extract_list = []
+        try:
+            if extract:
+                session.voidcmd('TYPE I')
+                with session.transfercmd('RETR ' + filename) as conn:
+                    with conn.makefile('rb') as rf:
+                        extract_list = extract_bundle(rf, filename, local_dir)
+                        while rf.read(transfer_constants.COPY_BUFSIZE):
+                            pass  # consume any trailing padding so the server sees a complete transfer
+                    if isinstance(conn, ssl.SSLSocket):
+                        conn.unwrap()
+                session.voidresp()
+            else:
+                with open(local_file, 'wb') as lf:
+                    session.retrbinary('RETR ' + filename, block_callback(self.throttle, lf.write))
+        except BaseException as e:
+            if os.path.isfile(local_file):
+                os.remove(local_file)
+            if not isinstance(e, Exception):
+                self._interrupted(session)
+                raise
+            logging.error(f"unable to download '{remote_file}'|{e}")
+            recorder.record(filename, local_file, 0, started, 'failed', e)
+            return False
+
+        if write_log:
+            self._writelog('GET', remote_dir, local_dir, filename)
+        if delete_ftp:
+            self._delete(remote_dir, filename, session)
+
+        if extract:
+            nbytes = sum(os.path.getsize(os.path.join(local_dir, f.replace(posixpath.sep, os.sep))) for f in extract_list)
+        else:
+            nbytes = os.path.getsize(local_file)
+        recorder.record(filename, local_file, nbytes, started, 'success')
+        return True
+
+    @METRICS.timed('ftp.download')
     def download(
         self,
         remote_dir: str = None,
@@ -199,7 +547,16 @@ class ftp:
         remote_files: list | str = None,
         suppress_override: list | str = None,
         delete_ftp: bool = True,
-        write_log: bool = False
+        write_log: bool = False,
+        min_age: float | dt.timedelta = None,
+        max_age: float | dt.timedelta = None,
+        min_size: int = None,
+        newer_than: float | dt.datetime = None,
+        remote_archive_dir: str = None,
+        extract_bundles: bool = False,
+        verify: bool = False,
+        hash_manifest: str = None,
+        concurrency: int | str = 1
     ) -> list:
         """Download files from an FTP
 
@@ -217,6 +574,31 @@ class ftp:
             Indicator if files should be deleted from the FTP after download is completed
         write_log : bool, optional (default False)
             Indicator if files downloaded should be written to a log file
+        min_age : float or datetime.timedelta, optional (default None)
+            Only download files last modified at least this many seconds ago, i.e. to skip files still being written
+        max_age : float or datetime.timedelta, optional (default None)
+            Only download files last modified at most this many seconds ago
+        min_size : int, optional (default None)
+            Only download files of at least this many bytes
+        newer_than : float or datetime.datetime, optional (default None)
+            Only download files last modified after this point in time, given as a datetime or seconds since the epoch
+        remote_archive_dir : str, optional (default None)
+            Remote directory to move files into after download is completed, relative to 'remote_dir' unless absolute.
+            Files are moved with server-side renames, so no data is sent back. Takes precedence over 'delete_ftp'
+        extract_bundles : bool, optional (default False)
+            Indicator if downloaded bundles (.zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz) should be extracted into
+            'local_dir' as they are read instead of being saved. Files already present locally are not overwritten
+        verify : bool, optional (default False)
+            Indicator if downloaded files should be checked against the remote size and, where the server supports the
+            HASH command, a SHA-256 computed remotely. Files failing a check are removed locally and are neither
+            deleted nor archived remotely
+        hash_manifest : str, optional (default None)
+            Name of a SHA-256 manifest in 'remote_dir' (sha256sum format) to verify downloaded files against. The
+            manifest itself is not downloaded. Local hashes are computed in a thread pool while transfers continue
+        concurrency : int or str, optional (default 1)
+            Number of additional FTP connections downloading files at the same time, or "auto" to ramp the number up
+            and down with the measured throughput, per-file latency and error rate, starting from the level remembered
+            for the profile. 1 downloads over the existing connection
 
         Returns
         -------
@@ -225,13 +607,25 @@ class ftp:
         Raises
         ------
         FileNotFoundError
-            If 'local_dir' does not exist
+            If 'local_dir' or 'remote_archive_dir' does not exist
+        TypeError
+            If 'min_age', 'max_age', 'min_size' or 'newer_than' is not of an accepted type
+        ValueError
+            If 'concurrency' is neither a positive integer nor "auto"
+
+        Notes
+        -----
+        When any of 'min_age', 'max_age', 'min_size' or 'newer_than' is provided the directory is listed with MLSD,
+        which also excludes directories reliably, instead of NLST
 
         """
         remote_dir = self.remote_in if remote_dir is None else remote_dir
         local_dir = self.local_in if local_dir is None else local_dir
         delete_ftp = delete_ftp if delete_ftp in BOOLEANS else False
         write_log = write_log if write_log in BOOLEANS else False
+        extract_bundles = extract_bundles if extract_bundles in BOOLEANS else False
+        verify = verify if verify in BOOLEANS else False
+        tuner = concurrency_tuner(ftp_constants.MODULE_NAME, self.name, concurrency, self.config_file)
 
         if not os.path.isdir(local_dir):
             err_msg = f"local directory '{local_dir} does not exist"
@@ -245,76 +639,149 @@ class ftp:
         suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
         suppress_override = suppress_override if isinstance(suppress_override, list) else []
         suppress_list = self.suppress_in if len(suppress_override) == 0 else suppress_override
+        if hash_manifest is not None:
+            suppress_list = suppress_list + [hash_manifest]
+
+        qualifies = attribute_filter(min_age, max_age, min_size, newer_than)
+        local_archive_dir = os.path.join(local_dir, get_config('archiveDirName', self.config_file))
+
+        if remote_archive_dir is not None:
+            delete_ftp = False
+            remote_archive_dir = posixpath.join(remote_dir, remote_archive_dir)
+            try:
+                self.ftp.cwd(remote_archive_dir)
+            except ftplib.error_perm:
+                err_msg = f"remote archive directory '{remote_archive_dir}' does not exist"
+                logging.critical(err_msg)
+                raise FileNotFoundError(err_msg)
+
+        # when checking files, deleting and logging wait until the checks have passed
+        check_files = verify or hash_manifest is not None
+        file_delete = delete_ftp and not check_files
+        file_log = write_log and not check_files
+        progress = progress_tracker(progress_callback(self.track_progress))
+        recorder = result_recorder(self.on_result, defer=check_files, progress=progress, metric='ftp.download', profile=self.name)
 
         success_list = []
-        dir_list = self.listftpdir(remote_dir)
-        suppress_items = []
-        if len(remote_files) == 0:
-            # no specific files passed, figure it out within the script
-            # do not need separate handling of suppress_list because it's just a list iterable
-            for f in dir_list:
-                for item in suppress_list:
-                    if fnmatch.fnmatch(f, item):
-                        suppress_items.append(f)
-            download_files = [x for x in dir_list if x not in suppress_items]
+        attr_list = {}
+        if qualifies is None:
+            dir_list = self.listftpdir(remote_dir)
+            download_files = select_files(dir_list, remote_files, suppress_list, 'download', remote_dir)
         else:
-            # specific files/wildcards provided, bypass config parameters
-            download_list = []
-            for include_file in remote_files:
-                match_found = False
-                for f in dir_list:
-                    if fnmatch.fnmatch(f, include_file):
-                        download_list.append(f)
-                        match_found = True
-                if not match_found:
-                    logging.info(f"unable to download '{include_file}', file or pattern does not exist in '{remote_dir}'")
-
-            # pull out the files to suppress
-            if len(suppress_list) != 0:
-                for f in download_list:
-                    for item in suppress_list:
-                        if fnmatch.fnmatch(f, item):
-                            suppress_items.append(f)
-            download_files = [x for x in download_list if x not in suppress_items]
-
-        tot_ct = len(download_files)
-        for ctr, f in enumerate(download_files):
-            remote_file = os.path.join(remote_dir, f).replace('\\', '/')
-            local_file = os.path.join(local_dir, f)
-            archive_dir_name = get_config('archiveDirName', self.config_file)
-            local_file_archive = os.path.join(local_dir, archive_dir_name, f)
-            if not os.path.isfile(local_file):
-                if not os.path.isfile(local_file_archive):
-                    success = True
-                    try:
-                        with open(local_file, 'wb') as lf:
-                            self.ftp.retrbinary('RETR ' + f, lf.write)
-                    except Exception as e:
-                        success = False
-                        logging.error(f"unable to download '{remote_file}'|{e}")
-                        if os.path.isfile(local_file):
-                            os.remove(local_file)
-
-                    if success:
+            attr_list = {f.filename: f for f in self._listftpattr(remote_dir)}
+            download_files = select_files(list(attr_list), remote_files, suppress_list, 'download', remote_dir)
+            download_files = [f for f in download_files if qualifies(attr_list[f])]
+        progress.expect(download_files, None if qualifies is None else {f: attr_list[f].st_size for f in download_files})
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=transfer_constants.HASH_WORKERS) as hash_pool, progress.watch(self):
+            hash_futures = {}
+            if tuner.autotune or tuner.level > 1:
+                def transfer(session: ftplib.FTP, f: str) -> bool:
+                    if not self._download_file(
+                        remote_dir, local_dir, local_archive_dir, f, file_delete, file_log, extract_bundles, session, recorder
+                    ):
+                        return False
+                    if check_files and os.path.isfile(os.path.join(local_dir, f)):
+                        hash_futures[f] = hash_pool.submit(sha256_file, os.path.join(local_dir, f))
+                    return True
+
+                def size_of(f: str) -> int:
+                    local_file = os.path.join(local_dir, f)
+                    return os.path.getsize(local_file) if os.path.isfile(local_file) else 0
+
+                pending_files = []
+                for f in download_files:
+                    if os.path.isfile(os.path.join(local_dir, f)) or os.path.isfile(os.path.join(local_archive_dir, f)):
+                        recorder.record(f, os.path.join(local_dir, f), 0, time.monotonic(), 'skipped')
+                    else:
+                        pending_files.append(f)
+                success_list = parallel_transfer(
+                    pending_files, lambda: self._connection(remote_dir), transfer, size_of, tuner
+                )
+            else:
+                for f in download_files:
+                    if self._download_file(
+                        remote_dir, local_dir, local_archive_dir, f, file_delete, file_log, extract_bundles, recorder=recorder
+                    ):
                         success_list.append(f)
-                        if write_log:
-                            self._writelog('GET', remote_dir, local_dir, f)
-                        if delete_ftp:
-                            self.ftp.delete(f)
+                        if check_files and os.path.isfile(os.path.join(local_dir, f)):
+                            hash_futures[f] = hash_pool.submit(sha256_file, os.path.join(local_dir, f))  # hashed while the next file transfers
 
-            if self.track_progress:
-                if (ctr + 1) % 100 == 0:
-                    logging.info(f'{ctr + 1} files processed out of {tot_ct}')
+            if check_files:
+                expected_hashes = {} if hash_manifest is None else self._read_hash_manifest(remote_dir, hash_manifest)
+                expected_sizes = {}
+                if verify:
+                    expected_sizes = {f: attr_list[f].st_size if f in attr_list else self._remote_size(f) for f in success_list}
+                remote_hash = self._remote_hash_function() if verify else None
+                verified_list = verify_files(local_dir, success_list, hash_futures, expected_sizes, expected_hashes, remote_hash)
+                for f in success_list:
+                    if f not in verified_list:
+                        os.remove(os.path.join(local_dir, f))
+                success_list = verified_list
+                recorder.release(success_list)
+
+                for f in success_list:
+                    if write_log:
+                        self._writelog('GET', remote_dir, local_dir, f)
+                    if delete_ftp:
+                        self._delete(remote_dir, f)
+
+        if remote_archive_dir is not None:
+            self._archive(remote_dir, remote_archive_dir, success_list)
 
         return success_list
 
+    def pending_uploads(self, local_dir: str = None, local_files: list | str = None, suppress_override: list | str = None) -> list:
+        """Select the files an upload would send, without connecting to the FTP
+
+        Parameters
+        ----------
+        local_dir : str, optional (default None)
+            Local directory to upload files from. Will use 'self.local_out' if not provided
+        local_files : list or str, optional (default None)
+            Specific files or wildcard names to upload. Will use all files in 'local_dir' if not provided
+        suppress_override : list or str, optional (default None)
+            Specific files or wildcard names to suppress from upload. Will use all 'self.suppress_out' if not provided
+
+        Returns
+        -------
+        list : the basename of the files that would be uploaded
+
+        Raises
+        ------
+        FileNotFoundError
+            If 'local_dir' does not exist
+
+        """
+        local_dir = self.local_out if local_dir is None else local_dir
+        if not os.path.isdir(local_dir):
+            err_msg = f"local directory '{local_dir} does not exist"
+            logging.critical(err_msg)
+            raise FileNotFoundError(err_msg)
+
+        # validate variables and make sure they the proper data type
+        local_files = [local_files] if isinstance(local_files, str) else local_files
+        local_files = local_files if isinstance(local_files, list) else []
+
+        suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
+        suppress_override = suppress_override if isinstance(suppress_override, list) else []
+        suppress_list = self.suppress_out if len(suppress_override) == 0 else suppress_override
+
+        directory_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
+        return select_files(directory_list, local_files, suppress_list, 'upload', local_dir.replace(os.sep, posixpath.sep))
+
+    @METRICS.timed('ftp.upload')
     def upload(
             self,
             remote_dir: str = None,
             local_dir: str = None,
             local_files: list | str = None,
             suppress_override: list | str = None,
-            write_log: bool = False
+            write_log: bool = False,
+            bundle: str = None,
+            verify: bool = False,
+            hash_manifest: str = None,
+            concurrency: int | str = 1
     ) -> list:
         """Upload files to an FTP
 
@@ -330,6 +797,22 @@ class ftp:
             Specific files or wildcard names to suppress from upload. Will use all 'self.suppress_out' if not provided
         write_log : bool, optional (default False)
             Indicator if files uploaded should be written to a log file
+        bundle : str, optional (default None)
+            Name of a single compressed bundle to pack the selected files into, written to 'remote_dir' as it is built.
+            The extension determines the format: .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz. No file is reported as
+            uploaded if the bundle fails
+        verify : bool, optional (default False)
+            Indicator if uploaded files should be checked against the remote size and, where the server supports the
+            HASH command, a SHA-256 computed remotely. Remote copies failing a check are removed and the local file
+            is not archived. Ignored if 'bundle' is provided
+        hash_manifest : str, optional (default None)
+            Name of a SHA-256 manifest (sha256sum format) to write to 'remote_dir' after the files, keeping the entries
+            of files uploaded earlier. Local hashes are computed in a thread pool while transfers continue. Ignored if
+            'bundle' is provided
+        concurrency : int or str, optional (default 1)
+            Number of additional FTP connections uploading files at the same time, or "auto" to ramp the number up and
+            down with the measured throughput, per-file latency and error rate, starting from the level remembered for
+            the profile. 1 uploads over the existing connection. Not used with 'bundle'
 
         Returns
         -------
@@ -339,83 +822,352 @@ class ftp:
         ------
         FileNotFoundError
             If 'local_dir' does not exist
+        ValueError
+            If the extension of 'bundle' is not a supported bundle format
+            If 'concurrency' is neither a positive integer nor "auto"
 
         """
         remote_dir = self.remote_out if remote_dir is None else remote_dir
         local_dir = self.local_out if local_dir is None else local_dir
         write_log = write_log if write_log in BOOLEANS else False
+        verify = verify if verify in BOOLEANS else False
+        if bundle is not None:
+            check_bundle_format(bundle)
+        tuner = concurrency_tuner(ftp_constants.MODULE_NAME, self.name, concurrency, self.config_file)
+
+        upload_files = self.pending_uploads(local_dir, local_files, suppress_override)
+        success_list = []
+        if len(upload_files) > 0:
+            archive_dir_name = get_config('archiveDirName', self.config_file)
+            local_dir_archive = os.path.join(local_dir, archive_dir_name)
+            check_files = (verify or hash_manifest is not None) and bundle is None
+            progress = progress_tracker(progress_callback(self.track_progress))
+            progress.expect(upload_files, {f: os.path.getsize(os.path.join(local_dir, f)) for f in upload_files})
+            recorder = result_recorder(self.on_result, defer=check_files, progress=progress, metric='ftp.upload', profile=self.name)
+
+            def finish(f: str):
+                if write_log:
+                    self._writelog('PUT', remote_dir, local_dir, f)
+
+                if os.path.isdir(local_dir_archive):
+                    archive_name = os.path.join(local_dir_archive, f)
+                    os.rename(os.path.join(local_dir, f), archive_name)
+
+            self.ftp.cwd(remote_dir)
+            if self.use_tls:
+                self.ftp.prot_p()
+            if bundle is not None:
+                started = time.monotonic()
+                bundled = self._stor_bundle(remote_dir, bundle, local_dir, upload_files)
+                remote_bundle = posixpath.join(remote_dir, bundle)
+                for f in upload_files:
+                    if bundled:
+                        recorder.record(f, remote_bundle, os.path.getsize(os.path.join(local_dir, f)), started, 'success')
+                    else:
+                        recorder.record(f, remote_bundle, 0, started, 'failed', f"bundle '{bundle}' failed")
+                if not bundled:
+                    return success_list
+            with concurrent.futures.ThreadPoolExecutor(max_workers=transfer_constants.HASH_WORKERS) as hash_pool, progress.watch(self):
+                hash_futures = {}
+                if check_files:
+                    # hashing runs alongside the transfers below
+                    hash_futures = {f: hash_pool.submit(sha256_file, os.path.join(local_dir, f)) for f in upload_files}
+                if bundle is None and (tuner.autotune or tuner.level > 1):
+                    def transfer(session: ftplib.FTP, f: str) -> bool:
+                        started = time.monotonic()
+                        try:
+                            self._stor(remote_dir, f, os.path.join(local_dir, f), session)
+                        except Exception as e:
+                            recorder.record(f, posixpath.join(remote_dir, f), 0, started, 'failed', e)
+                            raise
+                        recorder.record(f, posixpath.join(remote_dir, f), os.path.getsize(os.path.join(local_dir, f)), started, 'success')
+                        return True
+
+                    success_list = parallel_transfer(
+                        upload_files, lambda: self._connection(remote_dir), transfer, lambda f: os.path.getsize(os.path.join(local_dir, f)),
+                        tuner
+                    )
+                    if not check_files:
+                        for f in success_list:
+                            finish(f)
+                else:
+                    for f in upload_files:
+                        success = True
+                        lf = os.path.join(local_dir, f)
+                        started = time.monotonic()
+                        try:
+                            if bundle is None:
+                                self._stor(remote_dir, f, lf)
+                                recorder.record(f, posixpath.join(remote_dir, f), os.path.getsize(lf), started, 'success')
+                        except Exception as e:
+                            success = False
+                            logging.error(f"unable to upload '{f} to '{remote_dir}'|{e}")
+                            recorder.record(f, posixpath.join(remote_dir, f), 0, started, 'failed', e)
+
+                        if success:
+                            success_list.append(f)
+                            if not check_files:
+                                finish(f)
+
+                if check_files:
+                    if verify:
+                        expected_sizes = {f: os.path.getsize(os.path.join(local_dir, f)) for f in success_list}
+                        remote_sizes = {f: self._remote_size(f) for f in success_list}
+                        size_list = [f for f in success_list if remote_sizes[f] in (None, expected_sizes[f])]
+                        for f in success_list:
+                            if f not in size_list:
+                                logging.error(f"verification failed for '{f}', size {remote_sizes[f]} does not match {expected_sizes[f]}")
+                        verified_list = verify_files(local_dir, size_list, hash_futures, {}, {}, self._remote_hash_function())
+                        for f in success_list:
+                            if f not in verified_list:
+                                self._delete(remote_dir, f)
+                        success_list = verified_list
+                    recorder.release(success_list)
+                    if hash_manifest is not None and len(success_list) > 0:
+                        self._write_hash_manifest(remote_dir, hash_manifest, {f: hash_futures[f].result() for f in success_list})
+                    concurrent.futures.wait(hash_futures.values())
+                    for f in success_list:
+                        finish(f)
+
+        return success_list
+
+    @METRICS.timed('ftp.sync')
+    def sync(
+            self,
+            remote_dir: str = None,
+            local_dir: str = None,
+            direction: str = 'down',
+            sync_files: list | str = None,
+            suppress_override: list | str = None,
+            propagate_deletes: bool = False,
+            write_log: bool = False
+    ) -> list:
+        """Incrementally mirror a directory between the FTP and the local file system
+
+        Files are compared against a manifest persisted at the end of the previous sync, so only new or changed files
+        are transferred. Unlike 'download' and 'upload', source files are never deleted or archived.
+
+        Parameters
+        ----------
+        remote_dir : str, optional (default None)
+            Remote directory to sync. Will use 'self.remote_in' for "down" and 'self.remote_out' for "up" if not provided
+        local_dir : str, optional (default None)
+            Local directory to sync. Will use 'self.local_in' for "down" and 'self.local_out' for "up" if not provided
+        direction : str, optional (default "down")
+            Direction to sync; "down" mirrors the FTP into 'local_dir', "up" mirrors 'local_dir' onto the FTP
+        sync_files : list or str, optional (default None)
+            Specific files or wildcard names to sync. Will use all files in the source directory if not provided
+        suppress_override : list or str, optional (default None)
+            Specific files or wildcard names to suppress from the sync. Will use the default suppress list for 'direction' if not provided
+        propagate_deletes : bool, optional (default False)
+            Indicator if files removed from the source since the last sync should also be removed from the destination
+        write_log : bool, optional (default False)
+            Indicator if files transferred or deleted should be written to a log file
+
+        Returns
+        -------
+        list : the basename of the files transferred
+
+        Raises
+        ------
+        ValueError
+            If 'direction' is not "down" or "up"
+        FileNotFoundError
+            If 'local_dir' does not exist
+
+        """
+        if direction not in transfer_constants.SYNC_DIRECTIONS:
+            err_msg = f"invalid sync direction '{direction}', expecting one of {transfer_constants.SYNC_DIRECTIONS}"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+        if direction == 'down':
+            remote_dir = self.remote_in if remote_dir is None else remote_dir
+            local_dir = self.local_in if local_dir is None else local_dir
+        else:
+            remote_dir = self.remote_out if remote_dir is None else remote_dir
+            local_dir = self.local_out if local_dir is None else local_dir
+        propagate_deletes = propagate_deletes if propagate_deletes in BOOLEANS else False
+        write_log = write_log if write_log in BOOLEANS else False
 
         if not os.path.isdir(local_dir):
             err_msg = f"local directory '{local_dir} does not exist"
             logging.critical(err_msg)
             raise FileNotFoundError(err_msg)
 
-        # validate variables and make sure they the proper data type
-        local_files = [local_files] if isinstance(local_files, str) else local_files
-        local_files = local_files if isinstance(local_files, list) else []
+        sync_files = [sync_files] if isinstance(sync_files, str) else sync_files
+        sync_files = sync_files if isinstance(sync_files, list) else []
 
         suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
         suppress_override = suppress_override if isinstance(suppress_override, list) else []
-        suppress_list = self.suppress_out if len(suppress_override) == 0 else suppress_override
+        default_suppress = self.suppress_in if direction == 'down' else self.suppress_out
+        suppress_list = default_suppress if len(suppress_override) == 0 else suppress_override
 
-        directory_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
-        suppress_items = []
-        if len(local_files) == 0:
-            # no specific files passed, figure it out within the script
-            # do not need separate handling of suppress_list because it's just a list iterable
-            for f in directory_list:
-                for item in suppress_list:
-                    if fnmatch.fnmatch(f, item):
-                        suppress_items.append(f)
-            upload_files = [x for x in directory_list if x not in suppress_items]
+        mf = manifest(ftp_constants.MODULE_NAME, self.name, self.config_file)
+        key = mf.key(direction, remote_dir, local_dir)
+        recorded = list(mf.entries(key))
+
+        remote_attrs = {f.filename: f for f in self._listftpattr(remote_dir)}  # also leaves the session in remote_dir
+        local_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
+        if direction == 'down':
+            source_list = select_files(list(remote_attrs), sync_files, suppress_list, 'sync', remote_dir)
+        else:
+            source_list = select_files(local_list, sync_files, suppress_list, 'sync', local_dir.replace(os.sep, posixpath.sep))
+
+        if direction == 'down':
+            sizes = {f: remote_attrs[f].st_size for f in source_list}
         else:
-            # specific files/wildcards provided, bypass config parameters
-            upload_list = []
-            for include_file in local_files:
-                match_found = False
-                for f in directory_list:
-                    if fnmatch.fnmatch(f, include_file):
-                        upload_list.append(f)
-                        match_found = True
-                if not match_found:
-                    logging.info(f"unable to upload '{include_file}', file or pattern does not exist in '{local_dir.replace(os.sep, posixpath.sep)}'")
-
-            # pull out the files to suppress
-            if len(suppress_list) != 0:
-                for f in upload_list:
-                    for item in suppress_list:
-                        if fnmatch.fnmatch(f, item):
-                            suppress_items.append(f)
-            upload_files = [x for x in upload_list if x not in suppress_items]
+            sizes = {f: os.path.getsize(os.path.join(local_dir, f)) for f in source_list}
+        progress = progress_tracker(progress_callback(self.track_progress))
+        progress.expect(source_list, sizes)
+        recorder = result_recorder(self.on_result, progress=progress, metric='ftp.sync', profile=self.name)
 
         success_list = []
-        tot_ct = len(upload_files)
-        if tot_ct > 0:
-            archive_dir_name = get_config('archiveDirName', self.config_file)
-            local_dir_archive = os.path.join(local_dir, archive_dir_name)
-            self.ftp.cwd(remote_dir)
-            for ctr, f in enumerate(upload_files):
-                success = True
-                lf = os.path.join(local_dir, f)
+        uploaded = []
+        with progress.watch(self):
+            for f in source_list:
+                started = time.monotonic()
+                local_file = os.path.join(local_dir, f)
+                target = local_file if direction == 'down' else posixpath.join(remote_dir, f)
+                remote_sig = remote_signature(remote_attrs.get(f))
+                local_sig = local_signature(local_file)
+                if mf.is_unchanged(key, f, remote_sig, local_sig):
+                    recorder.record(f, target, 0, started, 'skipped')
+                    continue
                 try:
-                    with open(lf, 'rb') as uf:
-                        self.ftp.storbinary('STOR ' + f, uf)
+                    if direction == 'down':
+                        with open(f'{local_file}.part', 'wb') as lf:
+                            self.ftp.retrbinary('RETR ' + f, block_callback(self.throttle, lf.write))
+                        os.replace(f'{local_file}.part', local_file)
+                        mf.update(key, f, remote_sig, local_signature(local_file))
+                    else:
+                        self._stor(remote_dir, f, local_file)
+                        uploaded.append((f, local_sig))
                 except Exception as e:
-                    success = False
-                    logging.error(f"unable to upload '{f} to '{remote_dir}'|{e}")
-
-                if self.track_progress:
-                    if (ctr + 1) % 100 == 0:
-                        logging.info(f'{ctr + 1} files processed out of {tot_ct}')
-
-                if success:
+                    logging.error(f"unable to sync '{f}' between '{remote_dir}' and '{local_dir}'|{e}")
+                    if os.path.isfile(f'{local_file}.part'):
+                        os.remove(f'{local_file}.part')
+                    recorder.record(f, target, 0, started, 'failed', e)
+                except BaseException:
+                    if direction == 'down':
+                        self._interrupted(self.ftp)
+                        if os.path.isfile(f'{local_file}.part'):
+                            os.remove(f'{local_file}.part')
+                    raise
+                else:
                     success_list.append(f)
-
                     if write_log:
-                        self._writelog('PUT', remote_dir, local_dir, f)
+                        self._writelog('GET' if direction == 'down' else 'PUT', remote_dir, local_dir, f)
+                    recorder.record(f, target, os.path.getsize(local_file), started, 'success')
 
-                    if os.path.isdir(local_dir_archive):
-                        archive_name = os.path.join(local_dir_archive, f)
-                        os.rename(lf, archive_name)
+        if len(uploaded) > 0:
+            # STOR does not report what the server recorded, a single relisting covers every upload
+            remote_attrs = {f.filename: f for f in self._listftpattr(remote_dir)}
+            for f, local_sig in uploaded:
+                mf.update(key, f, remote_signature(remote_attrs.get(f)), local_sig)
+
+        # anything recorded at the last sync that is no longer at the source has been deleted since
+        source_names = remote_attrs if direction == 'down' else local_list
+        for f in [x for x in recorded if x not in source_names]:
+            if propagate_deletes:
+                try:
+                    if direction == 'down':
+                        if os.path.isfile(os.path.join(local_dir, f)):
+                            os.remove(os.path.join(local_dir, f))
+                    elif f in remote_attrs:
+                        self._delete(remote_dir, f)
+                except Exception as e:
+                    logging.error(f"unable to propagate delete of '{f}'|{e}")
+                    continue
+                if write_log:
+                    self._writelog('DELETE', remote_dir, local_dir, f)
+            mf.discard(key, f)
+
+        mf.save()
 
         return success_list
+
+    def iter_download(self, *args, **kwargs):
+        """Iterator counterpart of 'download', taking the same arguments and yielding a transfer.file_result per file
+
+        The download runs on a background thread and each result is yielded as soon as its file is final, so the caller
+        can start on a file (i.e. decrypt it) while the rest of the batch is still downloading. Skipped and failed
+        files are yielded too, see 'status'. With 'verify' or 'hash_manifest' successful files are only yielded once
+        every check has run. Leaving the loop early stops the download at its next chunk
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, in completion order
+
+        """
+        return iterate_results(self, 'download', *args, **kwargs)
+
+    def iter_upload(self, *args, **kwargs):
+        """Iterator counterpart of 'upload', taking the same arguments and yielding a transfer.file_result per file
+
+        The upload runs on a background thread and each result is yielded as soon as its file is on the server. Failed
+        files are yielded too, see 'status'. With 'verify' or 'hash_manifest' successful files are only yielded once
+        every check has run. Leaving the loop early stops the upload at its next chunk
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, in completion order
+
+        """
+        return iterate_results(self, 'upload', *args, **kwargs)
+
+    async def download_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'download', taking the same arguments and returning the same list
+
+        Runs on the shared transfer thread pool (transfer.ASYNC_RUNNER), which limits how many transfers run at once
+        and runs calls on this object one after the other. Cancelling the awaiting task stops the transfer at its next
+        chunk and removes the partially downloaded file
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the download may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the download did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'download', *args, timeout=timeout, **kwargs)
+
+    async def upload_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'upload', taking the same arguments and returning the same list
+
+        Runs on the shared transfer thread pool (transfer.ASYNC_RUNNER), which limits how many transfers run at once
+        and runs calls on this object one after the other. Cancelling the awaiting task stops the transfer at its next
+        chunk, a partially written remote file may be left behind and is overwritten by the next upload
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the upload may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the upload did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'upload', *args, timeout=timeout, **kwargs)
+
+    async def sync_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'sync', taking the same arguments and returning the same list
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the sync may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the sync did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'sync', *args, timeout=timeout, **kwargs)
@@ -0,0 +1,287 @@
+import atexit
+import datetime as dt
+import functools
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+class metrics_constants:
+    """A class for constants necessary for the metrics module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    ENV_VAR = 'AUTOMATION_METRICS'  # export files separated by os.pathsep, enables collection at import when set
+    PROMETHEUS_EXTENSIONS = ['.prom']
+    PROMETHEUS_PREFIX = 'automation'
+
+
+class _null_span:
+    """Stand-in returned while collection is disabled, entering and leaving it does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        return False
+
+
+_NULL_SPAN = _null_span()
+
+
+class _span:
+    """Times the block it wraps and adds the duration to its registry on exit, counting an error if one was raised"""
+    __slots__ = ('registry', 'key', 'start')
+
+    def __init__(self, registry, key: tuple):
+        self.registry = registry
+        self.key = key
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.registry._observe(self.key, time.perf_counter() - self.start, exception_type is not None)
+        return False
+
+
+class metrics_registry:
+    """Thread-safe collection of timing spans and counters for a run, exported to JSON or a Prometheus text file
+
+    Spans and counters are keyed by a dotted name, i.e. "sftp.connect", and optional labels. Spans keep the count,
+    total, shortest and longest duration and the number that raised. Collection is off until 'enable' is called, or
+    the AUTOMATION_METRICS environment variable names export files when the module is imported. While it is off a span
+    is a shared object that does nothing and counters return at once, so instrumented code pays only an attribute check
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether spans and counters are being collected
+    export_files : list
+        Files written by 'export' and when the interpreter exits, Prometheus text format for a .prom extension and
+        JSON otherwise
+
+    """
+    def __init__(self):
+        self.enabled = False
+        self.export_files = []
+        self._spans = {}  # (name, labels): [count, total, min, max, errors]
+        self._counters = {}  # (name, labels): value
+        self._started = None
+        self._exit_registered = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+
+    def enable(self, export_files: list | str = None):
+        """Start collecting, adding 'export_files' to the files written when the interpreter exits
+
+        Parameters
+        ----------
+        export_files : list or str, optional (default None)
+            Full names of files to write the summary to, Prometheus text format for a .prom extension and JSON otherwise
+
+        """
+        export_files = [export_files] if isinstance(export_files, str) else export_files
+        export_files = export_files if isinstance(export_files, list) else []
+        with self._lock:
+            self.export_files += [f for f in export_files if f not in self.export_files]
+            if self._started is None:
+                self._started = dt.datetime.now()
+            if len(self.export_files) > 0 and not self._exit_registered:
+                atexit.register(self.export)
+                self._exit_registered = True
+            self.enabled = True
+
+    def disable(self):
+        """Stop collecting, keeping what was collected so far"""
+        self.enabled = False
+
+    def reset(self):
+        """Drop every span and counter collected so far"""
+        with self._lock:
+            self._spans = {}
+            self._counters = {}
+            self._started = dt.datetime.now() if self.enabled else None
+
+    def span(self, name: str, **labels):
+        """Return a context manager timing the block it wraps
+
+        Parameters
+        ----------
+        name : str
+            Dotted name of the operation, i.e. "sftp.connect"
+        **labels
+            Labels telling spans of the same name apart, i.e. profile="Partner". None values are left out
+
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _span(self, self._key(name, labels))
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function as a span, labelled with the profile of the instance if it has one"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                profile = getattr(args[0], 'name', None) if len(args) > 0 else None
+                with self.span(name, profile=profile if isinstance(profile, str) else None):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name: str, seconds: float, error: bool = False, **labels):
+        """Add a duration measured elsewhere to a span"""
+        if self.enabled:
+            self._observe(self._key(name, labels), seconds, error)
+
+    def _observe(self, key: tuple, seconds: float, error: bool):
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                self._spans[key] = [1, seconds, seconds, seconds, int(error)]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = min(stats[2], seconds)
+                stats[3] = max(stats[3], seconds)
+                stats[4] += int(error)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add 'value' to a counter, i.e. count("sftp.download.bytes", 1024)"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_file(self, name: str, status: str, nbytes: int, seconds: float, **labels):
+        """Count a processed file by status, its bytes if it succeeded, and add its duration to the "<name>.file" span"""
+        if not self.enabled:
+            return
+        self.count(f'{name}.files', 1, status=status, **labels)
+        if status == 'success':
+            self.count(f'{name}.bytes', nbytes, **labels)
+        self.observe(f'{name}.file', seconds, status == 'failed', **labels)
+
+    def summary(self) -> dict:
+        """Return the spans and counters collected so far
+
+        Returns
+        -------
+        dict : "started" and "exported" timestamps, a "spans" list with count, total, mean, min and max seconds and
+        errors per name and labels, and a "counters" list with the value per name and labels
+
+        """
+        with self._lock:
+            spans = [(k, list(v)) for k, v in self._spans.items()]
+            counters = list(self._counters.items())
+            started = self._started
+        return {
+            'started': None if started is None else started.isoformat(timespec='seconds'),
+            'exported': dt.datetime.now().isoformat(timespec='seconds'),
+            'spans': [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': stats[0],
+                    'total_seconds': round(stats[1], 6),
+                    'mean_seconds': round(stats[1] / stats[0], 6),
+                    'min_seconds': round(stats[2], 6),
+                    'max_seconds': round(stats[3], 6),
+                    'errors': stats[4]
+                }
+                for (name, labels), stats in sorted(spans)
+            ],
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(counters)]
+        }
+
+    def prometheus_text(self) -> str:
+        """Return the spans and counters in the Prometheus text exposition format"""
+        summary = self.summary()
+        prefix = metrics_constants.PROMETHEUS_PREFIX
+        lines = [
+            f'# HELP {prefix}_span_seconds Time spent in instrumented operations',
+            f'# TYPE {prefix}_span_seconds summary'
+        ]
+        for s in summary['spans']:
+            labels = _prometheus_labels({'span': s['name'], **s['labels']})
+            lines.append(f"{prefix}_span_seconds_sum{labels} {s['total_seconds']}")
+            lines.append(f"{prefix}_span_seconds_count{labels} {s['count']}")
+        for metric, field, text in (
+            ('span_max_seconds', 'max_seconds', 'Longest single span'),
+            ('span_errors', 'errors', 'Spans that raised an exception')
+        ):
+            lines += [f'# HELP {prefix}_{metric} {text}', f'# TYPE {prefix}_{metric} gauge']
+            lines += [f"{prefix}_{metric}{_prometheus_labels({'span': s['name'], **s['labels']})} {s[field]}" for s in summary['spans']]
+
+        counters = {}
+        for c in summary['counters']:
+            counters.setdefault(f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', c['name'])}_total", []).append(c)
+        for metric, entries in counters.items():
+            lines += [f"# HELP {metric} Counter {entries[0]['name']}", f'# TYPE {metric} counter']
+            lines += [f"{metric}{_prometheus_labels(c['labels'])} {c['value']}" for c in entries]
+
+        lines += [
+            f'# HELP {prefix}_last_export_timestamp_seconds Time the metrics were written',
+            f'# TYPE {prefix}_last_export_timestamp_seconds gauge',
+            f'{prefix}_last_export_timestamp_seconds {time.time():.3f}'
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, filename: str):
+        """Write the summary to a JSON file, replacing it in one step"""
+        _replace_file(filename, json.dumps(self.summary(), indent=4))
+
+    def write_prometheus(self, filename: str):
+        """Write the summary to a Prometheus text file (i.e. for the node_exporter textfile collector), replacing it in one step"""
+        _replace_file(filename, self.prometheus_text())
+
+    def export(self):
+        """Write the summary to every file in 'export_files', logging instead of raising on failure"""
+        for filename in self.export_files:
+            try:
+                if os.path.splitext(filename)[1].lower() in metrics_constants.PROMETHEUS_EXTENSIONS:
+                    self.write_prometheus(filename)
+                else:
+                    self.write_json(filename)
+            except OSError as e:
+                logging.error(f"unable to write metrics to '{filename}'|{e}")
+
+
+def _prometheus_labels(labels: dict) -> str:
+    if len(labels) == 0:
+        return ''
+    escaped = []
+    for k, v in labels.items():
+        value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f"{re.sub(r'[^a-zA-Z0-9_]', '_', k)}=\"{value}\"")
+    return '{' + ','.join(escaped) + '}'
+
+
+def _replace_file(filename: str, text: str):
+    """Write 'text' to a temporary file next to 'filename' and move it into place, so readers never see half a file"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(filename)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_name, filename)
+    except BaseException:
+        if os.path.isfile(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+METRICS = metrics_registry()
+if os.getenv(metrics_constants.ENV_VAR):
+    METRICS.enable([f for f in os.getenv(metrics_constants.ENV_VAR).split(os.pathsep) if f])
@@ -1,16 +1,22 @@
 from collections import defaultdict
+import copy
 import csv
 import datetime as dt
+import importlib
 import json
 import logging
 import os
 import re
 import sys
+import threading
 import traceback
 import yaml
 
 from . import VALID_DELIMS
 
+_CONFIG_CACHE = {}  # config file: ((mtime, size), parsed content)
+_CONFIG_LOCK = threading.Lock()
+
 
 def get_config(key: str, config_file: str = None) -> str:
     """Return a key value from the library configuration file
@@ -47,14 +53,24 @@ def get_config(key: str, config_file: str = None) -> str:
     if config_type not in ['json', 'yaml']:
         raise NotImplementedError(f"config file '{os.path.basename(config_file)}' not supported")
 
-    with open(config_file, 'r') as cf:
-        if config_type == 'json':
-            key_data = json.load(cf)
-        elif config_type == 'yaml':
-            key_data = yaml.safe_load(cf)
-        val = key_data.get(key)
-
-    return val
+    # the parsed file is reused until it changes on disk, classes read several keys while initializing
+    file_stat = os.stat(config_file)
+    signature = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _CONFIG_LOCK:
+        cached = _CONFIG_CACHE.get(config_file)
+    if cached is not None and cached[0] == signature:
+        key_data = cached[1]
+    else:
+        with open(config_file, 'r') as cf:
+            if config_type == 'json':
+                key_data = json.load(cf)
+            elif config_type == 'yaml':
+                key_data = yaml.safe_load(cf)
+        with _CONFIG_LOCK:
+            _CONFIG_CACHE[config_file] = (signature, key_data)
+    val = key_data.get(key)
+
+    return copy.deepcopy(val) if isinstance(val, (dict, list)) else val
 
 
 def csv_to_json(csvfile: str, delimiter: str = ',') -> dict:
@@ -190,3 +206,29 @@ def list_to_html(data: list, has_header: bool = True) -> str:
     html += '</table>'
 
     return html
+
+
+class lazy_module:
+    """Stand-in for a module that is only imported the first time one of its attributes is used
+
+    Keeps heavy optional dependencies (pandas, paramiko, win32com, ...) out of the import of the modules that use them,
+    an import error is raised on first use rather than at import. Attributes are looked up on the module every time, so
+    patching the real module still applies
+
+    Parameters
+    ----------
+    name : str
+        Full name of the module, i.e. "win32com.client"
+
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy_module '{self._name}' ({'loaded' if self._module is not None else 'not loaded'})>"
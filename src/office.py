@@ -3,12 +3,13 @@ import datetime as dt
 import logging
 import os
 
-import pandas as pd
-from win32com import client
-import xlsxwriter as xl
-
 from . import BOOLEANS, NL, VALID_DELIMS
-from .misc import get_config
+from .metrics import METRICS
+from .misc import get_config, lazy_module
+
+pd = lazy_module('pandas')
+client = lazy_module('win32com.client')
+xl = lazy_module('xlsxwriter')
 
 
 class convert():
@@ -32,6 +33,7 @@ class convert():
         logging.debug(f'delim guess|{delim}')
         return delim
 
+    @METRICS.timed('office.extract_columns')
     def extract_columns(self, filename: str, columns: list | str | int) -> str:
         """Extract specific columns from a csv file
 
@@ -110,6 +112,7 @@ class convert():
 
         return output_file
 
+    @METRICS.timed('office.change_delimiter')
     def change_delimiter(self, filename: str, old_delim: str = None, new_delim: str = None) -> str:
         """Change the delimiter of a csv file
 
@@ -156,6 +159,7 @@ class convert():
 
         return output_file
 
+    @METRICS.timed('office.csv_to_excel')
     def csv_to_excel(self, filename: str, delim: str = None) -> str:
         """Convert a csv file into Excel (xlsx)
 
@@ -214,6 +218,7 @@ class convert():
 
         return output_file
 
+    @METRICS.timed('office.excel_to_csv')
     def excel_to_csv(self, filename: str, delim: str = ',') -> str:
         """Convert an Excel file into csv
 
@@ -268,6 +273,7 @@ class convert():
 
         return output_file
 
+    @METRICS.timed('office.word_to_pdf')
     def word_to_pdf(self, filename: str) -> str:
         """Convert a Word file into pdf
 
@@ -322,6 +328,7 @@ class excel():
     def __init__(self, config_file: str = None):
         self.config_file = config_file
 
+    @METRICS.timed('office.refresh_file')
     def refresh_file(self, filename: str, save_copy: bool = True) -> str:
         """Refresh all data connections
 
@@ -376,6 +383,7 @@ class excel():
 
         return output_file
 
+    @METRICS.timed('office.run_vba')
     def run_vba(self, filename: str, macro_name: str = None, save_copy: bool = True) -> str:
         """Execute VBA
 
@@ -2,12 +2,15 @@ import datetime as dt
 import fnmatch
 import logging
 import os
-
-import pgpy
+import time
 
 from . import NL, BOOLEANS
-from .misc import get_config
+from .metrics import METRICS
+from .misc import get_config, lazy_module
 from .secrets import keepass
+from .transfer import file_result
+
+pgpy = lazy_module('pgpy')
 
 
 class pgp_constants:
@@ -94,6 +97,8 @@ class pgp:
         self.log_name = f"{self.__class__.__name__}_{dt.datetime.now().strftime('%Y%m%d%H%M%S')}.log"
         self.log_delim = get_config('logDelimiter', self.config_file)
 
+        self._public_keys = {}  # key text: parsed key, kept while the instance lives
+
         self._validate_profile()
 
     def _validate_profile(self):
@@ -107,6 +112,18 @@ class pgp:
         if err_text is not None:
             raise RuntimeError(err_text)
 
+    def _public_key(self):
+        """Class function to parse the public key, reusing the parsed key while 'public_key' is unchanged
+
+        Only the public key is kept, unlocking the private key changes it so it is parsed again for every use
+        """
+        pub_key = self._public_keys.get(self.public_key)
+        if pub_key is None:
+            with METRICS.span('pgp.load_key', profile=self.name):
+                pub_key, _ = pgpy.PGPKey.from_blob(self.public_key)
+            self._public_keys = {self.public_key: pub_key}
+        return pub_key
+
     def _writelog(self, typ: str, dir: str, file_in: str, file_out: str):
         """Class function to write to a log file"""
         if not os.path.isdir(self.log_path):
@@ -116,6 +133,7 @@ class pgp:
             logfile.write(f'{self.name}{self.log_delim}{dte}{self.log_delim}{tme}{self.log_delim}{typ}{self.log_delim}')
             logfile.write(f'{dir}{self.log_delim}{file_in}{self.log_delim}{file_out}{NL}')
 
+    @METRICS.timed('pgp.encrypt')
     def encrypt(self, path_override: str = None, file_override: list | str = None, archive: bool = True, write_log: bool = False) -> list:
         """Encrypt files
 
@@ -134,6 +152,36 @@ class pgp:
         -------
         list : All files that were encrypted, or an empty list if no files were encrypted
 
+        Raises
+        ------
+        FileNotFoundError
+            If 'path_override' does not exist
+
+        """
+        return [r.path for r in self.iter_encrypt(path_override, file_override, archive, write_log) if r.status == 'success']
+
+    def iter_encrypt(self, path_override: str = None, file_override: list | str = None, archive: bool = True, write_log: bool = False):
+        """Encrypt files one at a time, yielding the result of each as soon as it is written
+
+        Takes the same arguments as 'encrypt'. Nothing is done until the first result is requested, so the caller can
+        hand each encrypted file on (i.e. to an upload) while the next one is encrypted
+
+        Parameters
+        ----------
+        path_override : str, optional (default None)
+            Directory to encrypt. Will use self.encrypt_path if not provided
+        file_override : list or str, optional (default None)
+            Specific file(s) or wildcard names to encrypt. Will encrypt all files in directory if not provided
+        archive : bool, optional (default True)
+            Indicator if original file(s) should move to an config-defeind archive subdirectory after encryption
+        write_log : bool, optional (default False)
+            Indicator if files encrypted should be written to a log file
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, "skipped" if it is already encrypted. 'path' is the full path
+        of the encrypted file
+
         Raises
         ------
         FileNotFoundError
@@ -151,7 +199,6 @@ class pgp:
         file_override = [file_override] if isinstance(file_override, str) else file_override  # convert single files to a list
         file_override = file_override if isinstance(file_override, list) else []  # convert to empty list if not already a list type
 
-        success_list = []
         directory_list = [f for f in os.listdir(path_override) if os.path.isfile(os.path.join(path_override, f))]
         if len(file_override) == 0:
             # no specific files passed, use standard config parameters
@@ -171,8 +218,9 @@ class pgp:
                         encrypt_list.append(f)
             encrypt_files = [x for x in encrypt_list if os.path.isfile(os.path.join(path_override, x))]
 
-        pub_key, _ = pgpy.PGPKey.from_blob(self.public_key)
+        pub_key = self._public_key()
         for f in encrypt_files:
+            started = time.monotonic()
             with open(os.path.join(path_override, f), 'rb') as file:
                 data = file.read()
             try:
@@ -194,7 +242,6 @@ class pgp:
                 with open(encrypted_file, 'wb') as ef:
                     ef.write(encrypted_data)
 
-                success_list.append(encrypted_file)
                 if write_log:
                     self._writelog('ENCRYPT', path_override, f, os.path.basename(encrypted_file))
 
@@ -205,8 +252,13 @@ class pgp:
                         archive_name = os.path.join(archive_dir, f)
                         os.rename(os.path.join(path_override, f), archive_name)
 
-        return success_list
+                result = file_result(f, encrypted_file, len(encrypted_data), time.monotonic() - started, 'success')
+            else:
+                result = file_result(f, os.path.join(path_override, f), 0, time.monotonic() - started, 'skipped')
+            METRICS.record_file('pgp.encrypt', result.status, result.bytes, result.duration, profile=self.name)
+            yield result
 
+    @METRICS.timed('pgp.decrypt')
     def decrypt(self, path_override: str = None, file_override: list | str = None, archive: bool = True, write_log: bool = False) -> list:
         """Decrypt files
 
@@ -225,6 +277,36 @@ class pgp:
         -------
         list : All files that were decrypted, or an empty list if no files were decrypted
 
+        Raises
+        ------
+        FileNotFoundError
+            If 'path_override' does not exist
+
+        """
+        return [r.path for r in self.iter_decrypt(path_override, file_override, archive, write_log) if r.status == 'success']
+
+    def iter_decrypt(self, path_override: str = None, file_override: list | str = None, archive: bool = True, write_log: bool = False):
+        """Decrypt files one at a time, yielding the result of each as soon as it is written
+
+        Takes the same arguments as 'decrypt'. Nothing is done until the first result is requested, so the caller can
+        hand each decrypted file on (i.e. to a conversion) while the next one is decrypted
+
+        Parameters
+        ----------
+        path_override : str, optional (default None)
+            Directory to decrypt. Will use self.decrypt_path if not provided
+        file_override : list or str, optional (default None)
+            Specific file(s) or wildcard names to decrypt. Will decrypt all files in directory if not provided
+        archive : bool, optional (default True)
+            Indicator if original file(s) should move to a config-defined archive subdirectory after decryption
+        write_log : bool, optional (default False)
+            Indicator if files decrypted should be written to a log file
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, "skipped" if it is not encrypted. 'path' is the full path of
+        the decrypted file
+
         Raises
         ------
         FileNotFoundError
@@ -242,7 +324,6 @@ class pgp:
         file_override = [file_override] if isinstance(file_override, str) else file_override  # convert single files to a list
         file_override = file_override if isinstance(file_override, list) else []  # convert to empty list if not already a list type
 
-        success_list = []
         directory_list = [f for f in os.listdir(path_override) if os.path.isfile(os.path.join(path_override, f))]
         if len(file_override) == 0:
             # no specific files passed, use standard config parameters
@@ -262,9 +343,11 @@ class pgp:
                         decrypt_list.append(f)
             decrypt_files = [x for x in decrypt_list if os.path.isfile(os.path.join(path_override, x))]
 
-        prv_key, _ = pgpy.PGPKey.from_blob(self.private_key)
+        with METRICS.span('pgp.load_key', profile=self.name):
+            prv_key, _ = pgpy.PGPKey.from_blob(self.private_key)
         with prv_key.unlock(self.passphrase):
             for f in decrypt_files:
+                started = time.monotonic()
                 with open(os.path.join(path_override, f), 'rb') as file:
                     data = file.read()
                 try:
@@ -280,6 +363,7 @@ class pgp:
 
                 if done:
                     logging.warning(f'File is already decrypted|{f}')
+                    result = file_result(f, os.path.join(path_override, f), 0, time.monotonic() - started, 'skipped')
                 else:
                     decrypted_data = prv_key.decrypt(encrypted_data).message
                     if not isinstance(decrypted_data, bytearray):
@@ -299,7 +383,6 @@ class pgp:
                     with open(decrypted_file, 'wb') as df:
                         df.write(decrypted_data)
 
-                    success_list.append(decrypted_file)
                     if write_log:
                         self._writelog('DECRYPT', path_override, f, os.path.basename(decrypted_file))
 
@@ -310,4 +393,6 @@ class pgp:
                             archive_name = os.path.join(archive_dir, f)
                             os.rename(os.path.join(path_override, f), archive_name)
 
-        return success_list
+                    result = file_result(f, decrypted_file, len(decrypted_data), time.monotonic() - started, 'success')
+                METRICS.record_file('pgp.decrypt', result.status, result.bytes, result.duration, profile=self.name)
+                yield result
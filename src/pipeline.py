@@ -0,0 +1,474 @@
+import fnmatch
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+import yaml
+
+from . import BOOLEANS
+from .metrics import METRICS
+from .misc import get_config
+from .transfer import iterate_results
+
+
+class pipeline_constants:
+    """A class for constants necessary for the pipeline module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    SOURCE_TYPES = ['files', 'download']  # first stage only, produces the files
+    PROTOCOLS = ['sftp', 'ftp']
+    CONVERT_METHODS = ['change_delimiter', 'csv_to_excel', 'excel_to_csv', 'extract_columns', 'word_to_pdf']
+    QUEUE_SIZE = 16  # files waiting between two stages before the upstream stage blocks
+    CONCURRENCY = 1
+
+
+class _item:
+    """A file travelling through the pipeline"""
+    __slots__ = ('name', 'path', 'bytes', 'started', 'stage')
+
+    def __init__(self, name: str, path: str, nbytes: int = 0):
+        self.name = name
+        self.path = path
+        self.bytes = nbytes
+        self.started = time.monotonic()
+        self.stage = None
+
+
+_END = object()  # sentinel telling a worker its upstream stage has finished
+
+
+class stage:
+    """One step of a pipeline, run by 'concurrency' workers each holding its own client
+
+    Attributes
+    ----------
+    name : str
+        Name of the stage in logs, results and metrics, its type if not provided
+    type : str
+        What the stage does, see the pipeline class documentation
+    concurrency : int
+        Workers processing files at the same time, for a download source the number of concurrent transfers
+    options : dict
+        Every other key of the stage definition
+
+    """
+    def __init__(self, definition: dict):
+        """Inits stage class
+
+        Parameters
+        ----------
+        definition : dict
+            The stage as defined in the pipeline file
+
+        Raises
+        ------
+        ValueError
+            If the type, protocol or method is not supported or a key the type needs is missing
+
+        """
+        definition = dict(definition) if isinstance(definition, dict) else {}
+        self.type = definition.pop('type', None)
+        self.name = str(definition.pop('name', self.type))
+        concurrency = definition.pop('concurrency', pipeline_constants.CONCURRENCY)
+        self.concurrency = concurrency if isinstance(concurrency, int) and not isinstance(concurrency, bool) and concurrency > 0 else pipeline_constants.CONCURRENCY
+        self.options = definition
+        self.options['args'] = self.options.get('args') or {}
+        self._validate()
+
+    def _validate(self):
+        required = {
+            'files': ['directory'],
+            'download': ['protocol', 'profile'],
+            'decrypt': ['profile'],
+            'encrypt': ['profile'],
+            'convert': ['method'],
+            'load': ['table'],
+            'upload': ['protocol', 'profile'],
+            'archive': ['directory']
+        }
+        err_msg = None
+        if self.type not in required:
+            err_msg = f"invalid stage type '{self.type}', expected one of {', '.join(required)}"
+        elif not isinstance(self.options['args'], dict):
+            err_msg = f"stage '{self.name}' args must be a mapping"
+        else:
+            missing = [k for k in required[self.type] if not self.options.get(k)]
+            if len(missing) > 0:
+                err_msg = f"stage '{self.name}' is missing {', '.join(missing)}"
+            elif 'protocol' in required[self.type] and self.options['protocol'] not in pipeline_constants.PROTOCOLS:
+                err_msg = f"invalid protocol '{self.options['protocol']}' in stage '{self.name}'"
+            elif self.type == 'convert' and self.options['method'] not in pipeline_constants.CONVERT_METHODS:
+                err_msg = f"invalid method '{self.options['method']}' in stage '{self.name}'"
+            elif self.type == 'load' and not (self.options.get('connection') or self.options.get('connection_env')):
+                err_msg = f"stage '{self.name}' needs a connection or connection_env"
+        if err_msg is not None:
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+    def describe(self) -> dict:
+        """Return the stage definition without its connection string"""
+        options = {k: v for k, v in self.options.items() if k != 'connection'}
+        return {'name': self.name, 'type': self.type, 'concurrency': self.concurrency, **options}
+
+    def open(self, config_file: str = None):
+        """Create the client a worker uses for every file it processes, None if the stage needs none"""
+        if self.type in ('download', 'upload'):
+            if self.options['protocol'] == 'sftp':
+                from .sftp import sftp
+                return sftp(self.options['profile'], track_progress=False, config_file=config_file, lazy=True)
+            from .ftp import ftp
+            return ftp(self.options['profile'], track_progress=False, config_file=config_file, lazy=True)
+        if self.type in ('decrypt', 'encrypt'):
+            from .pgp import pgp
+            return pgp(self.options['profile'], config_file=config_file)
+        if self.type == 'convert':
+            from .office import convert
+            return convert(config_file)
+        if self.type == 'load':
+            from .db import db
+            return db(self.options.get('connection') or os.getenv(self.options['connection_env']))
+        return None
+
+    @staticmethod
+    def close(client):
+        """Close a client created by 'open'"""
+        if client is None or not hasattr(client, 'close'):
+            return
+        if getattr(client, 'conn', True) is None:
+            return  # db without a connection
+        try:
+            client.close()
+        except Exception as e:
+            logging.warning(f'unable to close client|{e}')
+
+    def process(self, client, item: _item):
+        """Run the stage on one file, updating the item to the file the next stage receives
+
+        Raises
+        ------
+        RuntimeError
+            If the library reported the file as failed or did not process it
+
+        """
+        args = self.options['args']
+        directory, filename = os.path.split(item.path)
+        if self.type in ('decrypt', 'encrypt'):
+            action = client.iter_decrypt if self.type == 'decrypt' else client.iter_encrypt
+            results = list(action(path_override=directory, file_override=[filename], **args))
+            if len(results) == 0:
+                raise RuntimeError(f'{self.type} did not process the file')
+            if results[0].status == 'failed':
+                raise RuntimeError(results[0].error or f'{self.type} failed')
+            item.path = results[0].path
+        elif self.type == 'convert':
+            output_file = getattr(client, self.options['method'])(filename=item.path, **args)
+            item.path = output_file or item.path
+        elif self.type == 'load':
+            client.load_csv(item.path, self.options['table'], **args)
+        elif self.type == 'upload':
+            uploaded = client.upload(remote_dir=self.options.get('remote_dir'), local_dir=directory, local_files=[filename], **args)
+            if filename not in uploaded:
+                raise RuntimeError('upload did not transfer the file')
+            if not os.path.isfile(item.path):
+                # upload moves the file into the archive directory of its folder when that directory exists
+                archived = os.path.join(directory, get_config('archiveDirName', client.config_file), filename)
+                item.path = archived if os.path.isfile(archived) else item.path
+        elif self.type == 'archive':
+            os.makedirs(self.options['directory'], exist_ok=True)
+            target = os.path.join(self.options['directory'], filename)
+            shutil.move(item.path, target)
+            item.path = target
+        if os.path.isfile(item.path):
+            item.bytes = os.path.getsize(item.path)
+
+
+class pipeline:
+    """Class to run files through a chain of library operations, each file moving on as soon as a stage is done with it
+
+    The first stage produces the files, either "files" listing a local directory or "download" transferring from an
+    sftp or ftp profile, and every file it produces is handed to the next stage straight away. Each later stage runs
+    with its own number of workers, reads from a bounded queue and writes to the next one, so a stage works on one
+    file while the stage before it works on the next; a full queue holds the upstream stage back. A file that fails a
+    stage is reported and goes no further, the rest carry on.
+
+    Stage types and their keys, with "args" passed on to the library method:
+        files: directory, pattern (default "*")
+        download: protocol (sftp or ftp), profile, args of download, i.e. remote_dir and local_dir
+        decrypt, encrypt: profile, args of pgp.decrypt or pgp.encrypt except path_override and file_override
+        convert: method of office.convert, i.e. csv_to_excel, args besides filename
+        load: table, connection or connection_env (environment variable holding the connection string), args of db.load_csv
+        upload: protocol, profile, remote_dir, args of upload
+        archive: directory to move the file to
+
+    Example
+    -------
+    name: partner_inbound
+    queue_size: 16
+    stages:
+      - type: download
+        protocol: sftp
+        profile: Partner
+        concurrency: 4
+        args: {remote_dir: /outbound, local_dir: C:/inbound/partner}
+      - type: decrypt
+        profile: Partner
+        concurrency: 2
+        args: {archive: false}
+      - type: load
+        table: stage.PartnerFile
+        connection_env: PARTNER_DB
+      - type: archive
+        directory: C:/inbound/partner/Archive
+
+    Attributes
+    ----------
+    name : str
+        Name of the pipeline in logs and metrics
+    stages : list
+        The stages in order
+    queue_size : int
+        Files waiting between two stages
+    config_file : str
+        Full path location of library configuration file
+
+    """
+    def __init__(self, definition: dict, config_file: str = None):
+        """Inits pipeline class
+
+        Parameters
+        ----------
+        definition : dict
+            The parsed pipeline file, with "name", "queue_size" and the list of "stages"
+        config_file : str, optional (default None)
+            Full path location of library configuration file
+
+        Raises
+        ------
+        ValueError
+            If there are no stages, the first stage is not a source, a later one is, or a stage is invalid
+
+        """
+        definition = definition if isinstance(definition, dict) else {}
+        self.name = str(definition.get('name', pipeline_constants.MODULE_NAME))
+        self.config_file = config_file
+        queue_size = definition.get('queue_size', pipeline_constants.QUEUE_SIZE)
+        self.queue_size = queue_size if isinstance(queue_size, int) and not isinstance(queue_size, bool) and queue_size > 0 else pipeline_constants.QUEUE_SIZE
+        definitions = definition.get('stages')
+        if not isinstance(definitions, list) or len(definitions) == 0:
+            err_msg = f"pipeline '{self.name}' has no stages"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+        self.stages = [stage(d) for d in definitions]
+
+        err_msg = None
+        if self.stages[0].type not in pipeline_constants.SOURCE_TYPES:
+            err_msg = f"first stage of pipeline '{self.name}' must be one of {', '.join(pipeline_constants.SOURCE_TYPES)}"
+        elif any(s.type in pipeline_constants.SOURCE_TYPES for s in self.stages[1:]):
+            err_msg = f"only the first stage of pipeline '{self.name}' may be a source"
+        if err_msg is not None:
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+        self._results = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_yaml(cls, filename: str, config_file: str = None):
+        """Create a pipeline from a YAML file
+
+        Raises
+        ------
+        FileNotFoundError
+            If 'filename' does not exist
+
+        """
+        if not os.path.isfile(filename):
+            err_msg = f"pipeline file '{filename}' does not exist"
+            logging.critical(err_msg)
+            raise FileNotFoundError(err_msg)
+        with open(filename, 'r', encoding='utf-8') as f:
+            definition = yaml.safe_load(f)
+        if isinstance(definition, dict):
+            definition.setdefault('name', os.path.splitext(os.path.basename(filename))[0])
+        return cls(definition, config_file)
+
+    def describe(self) -> dict:
+        """Return the pipeline definition as it will run, without connection strings"""
+        return {'name': self.name, 'queue_size': self.queue_size, 'stages': [s.describe() for s in self.stages]}
+
+    def run(self) -> list:
+        """Run every file through the stages and wait for all of them
+
+        Returns
+        -------
+        list : a dict per file with its "name", "status" (success, skipped or failed), the "stage" it reached, its
+        final "path", the "error" if it failed and the "seconds" since it was produced
+
+        """
+        self._results = []
+        self._cancelled.clear()
+        queues = [None] + [queue.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        remaining = [1] + [s.concurrency for s in self.stages[1:]]  # workers of each stage still running, one source
+        threads = []
+        for index, s in enumerate(self.stages[1:], start=1):
+            for i in range(s.concurrency):
+                threads.append(threading.Thread(
+                    target=self._worker, args=(index, queues, remaining), name=f'{pipeline_constants.MODULE_NAME}-{s.name}-{i + 1}', daemon=True
+                ))
+        for t in threads:
+            t.start()
+
+        source = self.stages[0]
+        logging.info(f"pipeline '{self.name}' started with {len(self.stages)} stages")
+        try:
+            try:
+                self._produce(source, queues[1] if len(queues) > 1 else None)
+            except Exception as e:
+                logging.error(f"source stage '{source.name}' of pipeline '{self.name}' failed|{e}")
+                self._record(_item(source.name, None), source, 'failed', f'{e.__class__.__name__}: {e}')
+            except BaseException:
+                self._cancelled.set()
+                raise
+            finally:
+                self._finish_stage(0, queues, remaining)
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            self._cancelled.set()  # workers drain their queues without processing
+            for t in threads:
+                t.join()
+            raise
+
+        with self._lock:
+            results = list(self._results)
+        failed = len([r for r in results if r['status'] == 'failed'])
+        logging.info(f"pipeline '{self.name}' finished, {len(results) - failed} files done and {failed} failed")
+        return results
+
+    def _put(self, q: queue.Queue, entry):
+        while True:
+            try:
+                q.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set() and entry is not _END:
+                    return
+
+    def _produce(self, source: stage, output: queue.Queue):
+        """Run the source stage, handing each file to the next stage as soon as it is available"""
+        if source.type == 'files':
+            directory = source.options['directory']
+            pattern = source.options.get('pattern', '*')
+            for f in sorted(os.listdir(directory)):
+                path = os.path.join(directory, f)
+                if os.path.isfile(path) and fnmatch.fnmatch(f, pattern):
+                    item = _item(f, path, os.path.getsize(path))
+                    self._forward(item, source, output)
+            return
+
+        client = source.open(self.config_file)
+        try:
+            args = dict(source.options['args'])
+            args.setdefault('concurrency', source.concurrency)
+            for result in iterate_results(client, 'download', **args):
+                item = _item(result.name, result.path, result.bytes)
+                item.started = time.monotonic() - result.duration
+                if result.status == 'success':
+                    self._forward(item, source, output)
+                else:
+                    self._record(item, source, result.status, result.error)
+                if self._cancelled.is_set():
+                    break
+        finally:
+            source.close(client)
+
+    def _forward(self, item: _item, current: stage, output: queue.Queue):
+        item.stage = current.name
+        if output is None:
+            self._record(item, current, 'success')
+        else:
+            self._put(output, item)
+
+    def _finish_stage(self, index: int, queues: list, remaining: list):
+        """Count a worker of stage 'index' as finished, telling the next stage once all of them are"""
+        with self._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].concurrency):
+                self._put(queues[index + 1], _END)
+
+    def _worker(self, index: int, queues: list, remaining: list):
+        current = self.stages[index]
+        output = queues[index + 1] if index + 1 < len(queues) else None
+        client, setup_error = None, None
+        try:
+            client = current.open(self.config_file)
+        except Exception as e:
+            setup_error = f'{e.__class__.__name__}: {e}'
+            logging.error(f"unable to start stage '{current.name}' of pipeline '{self.name}'|{e}")
+        try:
+            while True:
+                item = queues[index].get()
+                if item is _END:
+                    return
+                if self._cancelled.is_set():
+                    self._record(item, current, 'failed', 'cancelled')
+                    continue
+                if setup_error is not None:
+                    self._record(item, current, 'failed', setup_error)
+                    continue
+                started = time.monotonic()
+                try:
+                    current.process(client, item)
+                except Exception as e:
+                    logging.error(f"stage '{current.name}' of pipeline '{self.name}' failed for '{item.name}'|{e}")
+                    self._record(item, current, 'failed', f'{e.__class__.__name__}: {e}')
+                    METRICS.record_file(f'pipeline.{current.name}', 'failed', 0, time.monotonic() - started, pipeline=self.name)
+                    continue
+                METRICS.record_file(f'pipeline.{current.name}', 'success', item.bytes, time.monotonic() - started, pipeline=self.name)
+                self._forward(item, current, output)
+        finally:
+            current.close(client)
+            self._finish_stage(index, queues, remaining)
+
+    def _record(self, item: _item, current: stage, status: str, error: str = None):
+        result = {
+            'name': item.name,
+            'status': status,
+            'stage': current.name,
+            'path': item.path,
+            'error': error,
+            'seconds': round(time.monotonic() - item.started, 3)
+        }
+        with self._lock:
+            self._results.append(result)
+
+
+def run_pipeline(filename: str, config_file: str = None, dry_run: bool = False) -> dict:
+    """Load a pipeline from a YAML file and run it
+
+    Parameters
+    ----------
+    filename : str
+        Full path of the pipeline file
+    config_file : str, optional (default None)
+        Full path location of library configuration file
+    dry_run : bool, optional (default False)
+        Indicator if the pipeline should only be validated and described, not run
+
+    Returns
+    -------
+    dict : the "pipeline" as described by pipeline.describe and, unless a dry run, the per file "results"
+
+    """
+    dry_run = dry_run if dry_run in BOOLEANS else False
+    p = pipeline.from_yaml(filename, config_file)
+    report = {'pipeline': p.describe()}
+    if not dry_run:
+        report['results'] = p.run()
+    return report
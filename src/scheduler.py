@@ -0,0 +1,353 @@
+import bisect
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+from . import BOOLEANS
+
+
+class scheduler_constants:
+    """A class for constants necessary for the scheduler module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    ACTIONS = ['download', 'upload', 'sync']
+    MAX_WORKERS = 4  # jobs running at the same time across every profile
+    MAX_PER_HOST = 2  # jobs running at the same time against a single host
+
+
+class token_bucket:
+    """Thread-safe token bucket limiting a byte rate, serving waiting consumers in priority order
+
+    Tokens accumulate at 'rate' bytes per second up to 'capacity'. A consumer may take more than is available, the
+    bucket then goes into debt and later consumers wait until it is paid off, so the long-term rate is kept even for
+    chunks larger than the capacity. While several consumers wait, the one with the highest priority is served first
+    and the others only get what it leaves over
+
+    Attributes
+    ----------
+    rate : float
+        Number of bytes per second the bucket allows
+    capacity : float
+        Most bytes that can build up while nothing is consumed, one second worth of 'rate' by default
+
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        """Inits token_bucket class
+
+        Parameters
+        ----------
+        rate : float
+            Number of bytes per second the bucket allows
+        capacity : float, optional (default None)
+            Most bytes that can build up while nothing is consumed, one second worth of 'rate' if not provided
+
+        Raises
+        ------
+        ValueError
+            If 'rate' is not a positive number
+
+        """
+        if not isinstance(rate, (int, float)) or isinstance(rate, bool) or rate <= 0:
+            err_msg = f"invalid rate '{rate}', expected a positive number of bytes per second"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+        self.rate = float(rate)
+        self.capacity = self.rate if capacity is None else max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def consume(self, amount: int, priority: int = 0):
+        """Take 'amount' bytes from the bucket, blocking until it is this consumer's turn and the bucket is out of debt
+
+        Parameters
+        ----------
+        amount : int
+            Number of bytes moved
+        priority : int, optional (default 0)
+            Priority of the consumer, higher values are served first
+
+        """
+        if amount <= 0:
+            return
+        with self._condition:
+            ticket = (-priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiting[0] == ticket and self._tokens >= 0:
+                        self._tokens -= amount
+                        return
+                    timeout = None if self._waiting[0] != ticket else -self._tokens / self.rate
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+
+class _job:
+    """A transfer submitted to the scheduler"""
+    def __init__(self, client, action: str, priority: int, kwargs: dict):
+        self.client = client
+        self.action = action
+        self.priority = priority
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+
+
+class scheduler:
+    """Class to queue sftp and ftp transfers from many profiles and run them by priority within bandwidth and connection limits
+
+    Jobs wait in a single queue and the highest priority job that may start goes first, jobs of equal priority run in
+    the order they were submitted. A job may start when a worker is free, fewer than 'max_per_host' jobs are running
+    against its host and no other job is running on the same client object, as a client's connection is not shared
+    between threads. Bandwidth is limited with token buckets, one for all transfers and one per profile, which are fed
+    through the 'throttle' attribute of the client while its job runs. When a bucket is contended, the transfer with
+    the higher priority gets the bytes first, so large low priority jobs cannot starve urgent ones.
+
+    Can be used directly or as a context manager, leaving the context waits for every job to finish
+
+    Attributes
+    ----------
+    max_workers : int
+        Most jobs running at the same time
+    max_per_host : int
+        Most jobs running at the same time against a single host, each job counts as one connection
+    global_bucket : token_bucket
+        Bucket shared by every transfer, None if the total bandwidth is not limited
+    profile_buckets : dict
+        Bucket per profile name, profiles without an entry are not limited on their own
+    keep_results : bool
+        Indicator if finished jobs are kept for 'wait' without futures, False for long-running callers
+
+    """
+    def __init__(
+        self,
+        max_workers: int = scheduler_constants.MAX_WORKERS,
+        max_per_host: int = scheduler_constants.MAX_PER_HOST,
+        global_rate: float = None,
+        profile_rates: dict = None,
+        keep_results: bool = True
+    ):
+        """Inits scheduler class
+
+        Parameters
+        ----------
+        max_workers : int, optional (default 4)
+            Most jobs running at the same time
+        max_per_host : int, optional (default 2)
+            Most jobs running at the same time against a single host
+        global_rate : float, optional (default None)
+            Most bytes per second moved by all jobs together, not limited if not provided
+        profile_rates : dict, optional (default None)
+            Most bytes per second moved by the jobs of a profile, keyed by profile name
+        keep_results : bool, optional (default True)
+            Indicator if finished jobs are kept so 'wait' without futures returns every result. A long-running caller
+            that waits on the futures returned by 'submit' passes False, so finished jobs are not held forever
+
+        Raises
+        ------
+        ValueError
+            If 'max_workers' or 'max_per_host' is not a positive integer
+            If a rate is not a positive number
+
+        """
+        for name, value in (('max_workers', max_workers), ('max_per_host', max_per_host)):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                err_msg = f"invalid {name} '{value}', expected a positive integer"
+                logging.critical(err_msg)
+                raise ValueError(err_msg)
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.global_bucket = None if global_rate is None else token_bucket(global_rate)
+        profile_rates = profile_rates if isinstance(profile_rates, dict) else {}
+        self.profile_buckets = {name: token_bucket(rate) for name, rate in profile_rates.items()}
+        self.keep_results = keep_results if keep_results in BOOLEANS else True
+
+        self._pending = []  # sorted (-priority, sequence, job)
+        self._started = {}  # futures of the jobs taken off the queue, in the order they started; a dict as it keeps that order
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running_hosts = collections.Counter()
+        self._running_clients = set()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f'{scheduler_constants.MODULE_NAME}-{i + 1}', daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.shutdown()
+
+    def submit(self, client, action: str, priority: int = 0, **kwargs) -> concurrent.futures.Future:
+        """Queue a transfer to run on a connected client
+
+        Parameters
+        ----------
+        client : sftp.sftp or ftp.ftp
+            Connected client of the profile to transfer with
+        action : str
+            Method of 'client' to run; "download", "upload" or "sync"
+        priority : int, optional (default 0)
+            Priority of the job, higher values run first and win contended bandwidth
+        **kwargs
+            Arguments passed on to the method
+
+        Returns
+        -------
+        concurrent.futures.Future : resolves to the return value of the method, can be cancelled while still queued
+
+        Raises
+        ------
+        RuntimeError
+            If the scheduler has been shut down
+        ValueError
+            If 'action' is not supported
+
+        """
+        if action not in scheduler_constants.ACTIONS:
+            err_msg = f"invalid action '{action}', expected one of {', '.join(scheduler_constants.ACTIONS)}"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+        priority = priority if isinstance(priority, int) and not isinstance(priority, bool) else 0
+
+        job = _job(client, action, priority, kwargs)
+        with self._condition:
+            if self._closed:
+                err_msg = 'cannot submit a job after the scheduler has been shut down'
+                logging.critical(err_msg)
+                raise RuntimeError(err_msg)
+            bisect.insort(self._pending, (-priority, next(self._counter), job), key=lambda x: x[:2])
+            self._condition.notify_all()
+        return job.future
+
+    def wait(self, futures: list = None, timeout: float = None) -> list:
+        """Wait for jobs to finish and return their results
+
+        Parameters
+        ----------
+        futures : list, optional (default None)
+            Futures returned by 'submit' to wait for. Will wait for every job submitted so far if not provided, only those
+            still queued or running if 'keep_results' is False
+        timeout : float, optional (default None)
+            Most seconds to wait, no limit if not provided
+
+        Returns
+        -------
+        list : the result of each job, in the order of 'futures' or in the order the jobs started
+
+        Raises
+        ------
+        TimeoutError
+            If the jobs did not finish within 'timeout'
+        Exception
+            The exception of the first failed job, in the same order
+
+        """
+        if futures is None:
+            with self._condition:
+                futures = list(self._started) + [job.future for _, _, job in self._pending]
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        if len(not_done) > 0:
+            err_msg = f'{len(not_done)} of {len(futures)} jobs did not finish within {timeout} seconds'
+            logging.error(err_msg)
+            raise TimeoutError(err_msg)
+        return [f.result() for f in futures]
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stop accepting jobs and let the workers exit once the queue is empty
+
+        Parameters
+        ----------
+        wait : bool, optional (default True)
+            Indicator if the call should block until every worker has exited
+        cancel_pending : bool, optional (default False)
+            Indicator if jobs that have not started should be cancelled instead of run
+
+        """
+        wait = wait if wait in BOOLEANS else True
+        cancel_pending = cancel_pending if cancel_pending in BOOLEANS else False
+        with self._condition:
+            self._closed = True
+            if cancel_pending:
+                for _, _, job in self._pending:
+                    job.future.cancel()
+                self._pending = []
+            self._condition.notify_all()
+        if wait:
+            for t in self._workers:
+                t.join()
+
+    def _next_job(self) -> _job:
+        """Take the highest priority job that may start, blocking until there is one or the scheduler is closed"""
+        with self._condition:
+            while True:
+                for i, (_, _, job) in enumerate(self._pending):
+                    host = getattr(job.client, 'host', None)
+                    if self._running_hosts[host] < self.max_per_host and id(job.client) not in self._running_clients:
+                        del self._pending[i]
+                        self._running_hosts[host] += 1
+                        self._running_clients.add(id(job.client))
+                        self._started[job.future] = None
+                        if not self.keep_results:
+                            job.future.add_done_callback(self._finished)
+                        return job
+                if self._closed and len(self._pending) == 0:
+                    return None
+                self._condition.wait()
+
+    def _finished(self, future: concurrent.futures.Future):
+        """Forget a finished job, so a scheduler not keeping results only holds the jobs still in progress"""
+        with self._condition:
+            self._started.pop(future, None)
+
+    def _throttle(self, job: _job):
+        """Build the throttle of a job, None if none of its buckets exist"""
+        buckets = [b for b in (self.profile_buckets.get(job.client.name), self.global_bucket) if b is not None]
+        if len(buckets) == 0:
+            return None
+
+        def throttle(nbytes: int):
+            for bucket in buckets:
+                bucket.consume(nbytes, job.priority)
+
+        return throttle
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    job.client.throttle = self._throttle(job)
+                    try:
+                        job.future.set_result(getattr(job.client, job.action)(**job.kwargs))
+                    except BaseException as e:
+                        logging.error(f"{job.action} job for profile '{job.client.name}' failed|{e}")
+                        job.future.set_exception(e)
+                    finally:
+                        job.client.throttle = None
+            finally:
+                with self._condition:
+                    self._running_hosts[getattr(job.client, 'host', None)] -= 1
+                    self._running_clients.discard(id(job.client))
+                    self._condition.notify_all()
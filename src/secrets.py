@@ -1,4 +1,14 @@
-from pykeepass import PyKeePass, pykeepass as pk
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import weakref
+
+from .metrics import METRICS
+from .misc import lazy_module
+
+pk = lazy_module('pykeepass.pykeepass')
 
 
 class secrets_constants():
@@ -11,20 +21,82 @@ class secrets_constants():
         'SuppressEncryptDefault'
     ]
     SFTP_PROPERTIES = [
+        'AllowExec',
+        'Ciphers',
+        'Compression',
         'HostKeyType',
         'HostKeyValue',
         'LocalInDefault',
         'LocalOutDefault',
         'LoginType',
+        'MaxPacketSize',
         'Passphrase',
         'Port',
         'RemoteInDefault',
         'RemoteOutDefault',
         'SuppressInDefault',
-        'SuppressOutDefault'
+        'SuppressOutDefault',
+        'WindowSize'
     ]
 
 
+class database_cache:
+    """Thread-safe cache of unlocked Keepass databases, shared by every keepass instance in the process
+
+    Off by default, so every keepass instance opens the file itself. When enabled, i.e. by a long-running service,
+    a database is unlocked once per file and password and reused until the file changes on disk, which skips the key
+    derivation that makes opening a database slow. Databases are keyed by a hash of the password, not the password.
+    A shared database is one object for every thread, so keepass instances hold the lock from 'lock' while using it
+
+    """
+    def __init__(self):
+        self.enabled = False
+        self._databases = {}  # (file, password hash): ((mtime, size), PyKeePass)
+        self._locks = weakref.WeakKeyDictionary()  # PyKeePass: lock, kept as long as the database is in use
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """Start reusing unlocked databases"""
+        self.enabled = True
+
+    def disable(self):
+        """Stop reusing unlocked databases and drop the ones kept so far"""
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        """Drop every unlocked database kept so far"""
+        with self._lock:
+            self._databases = {}
+
+    def open(self, filename: str, password: str) -> pk.PyKeePass:
+        """Return the unlocked database in 'filename', opening it only if it is not cached or has changed since"""
+        if not self.enabled:
+            return pk.PyKeePass(filename=filename, password=password)
+        try:
+            stat_result = os.stat(filename)
+        except (OSError, TypeError):
+            return pk.PyKeePass(filename=filename, password=password)  # raises the same error as an uncached open
+
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        key = (os.path.abspath(filename), hashlib.sha256(str(password).encode('utf-8')).hexdigest())
+        with self._lock:
+            cached = self._databases.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            kp = pk.PyKeePass(filename=filename, password=password)
+            self._databases[key] = (signature, kp)
+            return kp
+
+    def lock(self, kp: pk.PyKeePass) -> threading.RLock:
+        """Return the lock guarding reads and writes of the database 'kp', the same lock for every user of the object"""
+        with self._lock:
+            return self._locks.setdefault(kp, threading.RLock())
+
+
+DATABASE_CACHE = database_cache()
+
+
 class keepass():
     """Class to interact with a Keepass file where secrets are saved
 
@@ -68,14 +140,17 @@ class keepass():
             If the unique entry found is not the expected object type
 
         """
-        self.kp = PyKeePass(filename=filename, password=password)
+        with METRICS.span('keepass.open', group=group_title):
+            self.kp = DATABASE_CACHE.open(filename, password)
+        self._lock = DATABASE_CACHE.lock(self.kp)
         self.group_title = group_title
 
-        groups = self.kp.find_groups(name=group_title, first=False)
-        self.group = self._validategroup(groups)
+        with self._lock:
+            groups = self.kp.find_groups(name=group_title, first=False)
+            self.group = self._validategroup(groups)
 
-        entries = self.kp.find_entries(group=self.group, title=entry_title, first=False)
-        self.entry = self._validateentry(entries)
+            entries = self.kp.find_entries(group=self.group, title=entry_title, first=False)
+            self.entry = self._validateentry(entries)
 
     def _validategroup(self, groups: list) -> pk.Group:
         group_count = len(groups)
@@ -121,7 +196,8 @@ class keepass():
         if field not in field_list:
             raise NotImplementedError(f"field '{field}' is not a valid general field, expecting one of {field_list}")
 
-        return getattr(self.entry, field)
+        with self._lock:
+            return getattr(self.entry, field)
 
     def getcustomproperties(self, string_field: str) -> str:
         """Obtains custom property value
@@ -153,7 +229,8 @@ class keepass():
             if string_field not in property_list:
                 raise NotImplementedError(f"unexpected custom property '{string_field}'")
 
-        props = self.entry.custom_properties
+        with self._lock:
+            props = self.entry.custom_properties
         return props.get(string_field)
 
     def readattachment(self, attachment_name: str) -> str:
@@ -174,12 +251,12 @@ class keepass():
             If 'attachment_name' does not exist in the Keepass entry
 
         """
-        attach = self.entry.attachments
         data = None
-        for a in attach:
-            if a.filename == attachment_name:
-                data = a.data.decode('utf-8')
-                break
+        with self._lock:
+            for a in self.entry.attachments:
+                if a.filename == attachment_name:
+                    data = a.data.decode('utf-8')
+                    break
         if data is None:
             raise IndexError(f'attachment {attachment_name} does not exist')
 
@@ -203,8 +280,9 @@ class keepass():
             If custom property 'string_field' does not exist and 'create_property' is False
 
         """
-        if string_field in self.entry.custom_properties or create_property:
-            self.entry.set_custom_property(key=string_field, value=new_value)
-        else:
-            raise KeyError(f"keepass entry '{self.entry.title}' custom property '{string_field}' does not exist")
-        self.kp.save()
+        with self._lock:
+            if string_field in self.entry.custom_properties or create_property:
+                self.entry.set_custom_property(key=string_field, value=new_value)
+            else:
+                raise KeyError(f"keepass entry '{self.entry.title}' custom property '{string_field}' does not exist")
+            self.kp.save()
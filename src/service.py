@@ -0,0 +1,673 @@
+import argparse
+import concurrent.futures
+import contextlib
+import datetime as dt
+import hmac
+import importlib
+import ipaddress
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+from . import __version__, BOOLEANS
+from .metrics import METRICS
+from .misc import get_config
+from .scheduler import scheduler, scheduler_constants
+from .secrets import DATABASE_CACHE
+
+
+class service_constants:
+    """A class for constants necessary for the service module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    HOST = '127.0.0.1'  # only local processes may connect
+    PORT = 8765
+    TRANSFER_ACTIONS = ['download', 'upload', 'sync']
+    PGP_ACTIONS = ['encrypt', 'decrypt']
+    CONVERT_METHODS = ['change_delimiter', 'csv_to_excel', 'excel_to_csv', 'extract_columns', 'word_to_pdf']
+    CONTROL_ACTIONS = ['ping']
+    PROTOCOLS = ['sftp', 'ftp']
+    MAX_WORKERS = 2  # pgp and convert jobs running at the same time
+    MAX_IDLE = 2  # idle clients kept per profile
+    IDLE_TIMEOUT = 300  # seconds an idle client is kept before it is closed
+    POLL_INTERVAL = 1.0  # seconds between scans of the spool directory
+    MAX_REQUEST = 1024 * 1024  # bytes of a single request line
+    SPOOL_EXTENSION = '.json'
+    SPOOL_WORKING = 'working'
+    SPOOL_DONE = 'done'
+    SPOOL_FAILED = 'failed'
+    PRELOAD_MODULES = {  # kind: modules imported by 'warm'
+        'sftp': ['paramiko'],
+        'ftp': [],
+        'pgp': ['pgpy'],
+        'office': ['pandas', 'xlsxwriter']
+    }
+
+
+class client_pool:
+    """Thread-safe pool of sftp, ftp and pgp profile objects, each checked out by one job at a time
+
+    Clients are built on first use and returned to the pool after a job, so their connection, unlocked secrets and
+    parsed keys are reused by the next job of the same profile. Clients are connected lazily and a client whose job
+    raised is closed instead of returned, as its connection may be broken. Idle clients are closed once they have been
+    idle for 'idle_timeout' seconds or more than 'max_idle' of a profile are waiting
+
+    Attributes
+    ----------
+    config_file : str
+        Full path location of library configuration file
+    max_idle : int
+        Most idle clients kept per kind and profile
+    idle_timeout : float
+        Seconds an idle client is kept
+
+    """
+    def __init__(self, config_file: str = None, max_idle: int = service_constants.MAX_IDLE, idle_timeout: float = service_constants.IDLE_TIMEOUT):
+        self.config_file = config_file
+        self.max_idle = max_idle if isinstance(max_idle, int) and not isinstance(max_idle, bool) and max_idle >= 0 else service_constants.MAX_IDLE
+        self.idle_timeout = idle_timeout if isinstance(idle_timeout, (int, float)) and idle_timeout > 0 else service_constants.IDLE_TIMEOUT
+        self._idle = {}  # (kind, profile): [(idle since, client)]
+        self._hosts = {}  # (kind, profile): host of the last client built
+        self._lock = threading.Lock()
+
+    def _build(self, kind: str, profile: str):
+        """Class function to create a client, importing its module on first use"""
+        if kind == 'sftp':
+            from .sftp import sftp
+            return sftp(profile, track_progress=False, config_file=self.config_file, lazy=True)
+        if kind == 'ftp':
+            from .ftp import ftp
+            return ftp(profile, track_progress=False, config_file=self.config_file, lazy=True)
+        from .pgp import pgp
+        return pgp(profile, config_file=self.config_file)
+
+    @staticmethod
+    def _alive(client) -> bool:
+        try:
+            return client.alive() if hasattr(client, 'alive') else True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(client):
+        try:
+            if hasattr(client, 'close'):
+                client.close()
+        except Exception as e:
+            logging.warning(f"unable to close client of profile '{client.name}'|{e}")
+
+    def checkout(self, kind: str, profile: str):
+        """Take an idle client of the profile from the pool, creating one if none is idle with a live connection"""
+        while True:
+            with self._lock:
+                idle = self._idle.get((kind, profile), [])
+                now = time.monotonic()
+                expired = [c for since, c in idle if now - since >= self.idle_timeout]
+                idle[:] = [(since, c) for since, c in idle if now - since < self.idle_timeout]
+                client = idle.pop()[1] if len(idle) > 0 else None
+            for c in expired:
+                self._close(c)
+            if client is None or self._alive(client):
+                break
+            # servers and firewalls drop idle connections sooner than the idle timeout
+            logging.info(f"pooled {kind} client of profile '{profile}' lost its connection, closing it")
+            self._close(client)
+        if client is None:
+            client = self._build(kind, profile)
+            with self._lock:
+                self._hosts[(kind, profile)] = getattr(client, 'host', None)
+        return client
+
+    def host(self, kind: str, profile: str) -> str:
+        """Return the host of the profile if a client of it has been built, None otherwise"""
+        with self._lock:
+            return self._hosts.get((kind, profile))
+
+    def checkin(self, kind: str, profile: str, client, healthy: bool = True):
+        """Return a client to the pool, closing it instead if it is not 'healthy' or enough clients are idle"""
+        surplus = None
+        if healthy:
+            with self._lock:
+                idle = self._idle.setdefault((kind, profile), [])
+                idle.append((time.monotonic(), client))
+                if len(idle) > self.max_idle:
+                    surplus = idle.pop(0)[1]
+        else:
+            surplus = client
+        if surplus is not None:
+            self._close(surplus)
+
+    @contextlib.contextmanager
+    def client(self, kind: str, profile: str):
+        """Context manager checking a client out for the duration of the block"""
+        client = self.checkout(kind, profile)
+        try:
+            yield client
+        except BaseException:
+            self.checkin(kind, profile, client, healthy=False)
+            raise
+        self.checkin(kind, profile, client)
+
+    def idle_count(self) -> int:
+        """Return the number of idle clients in the pool"""
+        with self._lock:
+            return sum(len(v) for v in self._idle.values())
+
+    def close(self):
+        """Close every idle client"""
+        with self._lock:
+            clients = [c for idle in self._idle.values() for _, c in idle]
+            self._idle = {}
+        for c in clients:
+            self._close(c)
+
+
+class _pooled_transfer:
+    """Stand-in for an sftp or ftp client queued on the scheduler, checking a client out of the pool only once the job runs
+
+    Jobs waiting behind the scheduler limits hold no client, so the pool only builds as many clients as transfers run
+    at the same time. The host of a profile is known once a client of it has been built, until then the profile name
+    stands in for it in the per-host limit
+    """
+    def __init__(self, pool: client_pool, protocol: str, profile: str):
+        self.pool = pool
+        self.protocol = protocol
+        self.name = profile
+        self.host = pool.host(protocol, profile) or profile
+        self.throttle = None
+
+    def _run(self, action: str, **kwargs):
+        with self.pool.client(self.protocol, self.name) as client:
+            client.throttle = self.throttle
+            try:
+                return getattr(client, action)(**kwargs)
+            finally:
+                client.throttle = None
+
+    def download(self, **kwargs) -> list:
+        return self._run('download', **kwargs)
+
+    def upload(self, **kwargs) -> list:
+        return self._run('upload', **kwargs)
+
+    def sync(self, **kwargs) -> list:
+        return self._run('sync', **kwargs)
+
+
+class _request_handler(socketserver.StreamRequestHandler):
+    """Reads one JSON job per line and writes one JSON response per line"""
+    def handle(self):
+        while True:
+            line = self.rfile.readline(service_constants.MAX_REQUEST + 1)
+            if not line:
+                return
+            if len(line) > service_constants.MAX_REQUEST:
+                self._respond({'status': 'failed', 'error': f'request larger than {service_constants.MAX_REQUEST} bytes'})
+                return
+            if line.strip() == b'':
+                continue
+            self._respond(self.server.service.handle_request(line))
+
+    def _respond(self, response: dict):
+        self.wfile.write(json.dumps(response, default=_jsonable).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class _socket_server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class service:
+    """Long-running process that keeps secrets, connections, keys and dependencies warm and runs jobs sent to it
+
+    Jobs are JSON objects received as one line per job on a local TCP socket, answered with one JSON line once the
+    job is done, or JSON files dropped in a spool directory, answered with a result file. A job names its action and
+    the arguments passed on to the library method, i.e.
+
+    {"action": "download", "protocol": "sftp", "profile": "Partner", "args": {"remote_dir": "/out", "local_dir": "C:/in"}}
+    {"action": "decrypt", "profile": "Partner", "args": {"path_override": "C:/in"}}
+    {"action": "convert", "method": "csv_to_excel", "args": {"filename": "C:/in/report.csv"}}
+
+    Transfers (download, upload, sync) run on a transfer scheduler, so the per-host connection limit and priorities
+    apply, and pgp and convert jobs on a separate worker pool. sftp, ftp and pgp clients come from a client pool, the
+    Keepass database stays unlocked while the file is unchanged and the configuration file is cached by get_config.
+
+    Spool files must be written under another extension and renamed to .json once complete. They are moved to the
+    "working" subdirectory while running, then the job and its response are written to "done" or "failed"
+
+    Attributes
+    ----------
+    config_file : str
+        Full path location of library configuration file
+    host : str
+        Address the socket listens on
+    port : int
+        Port the socket listens on, None if the socket is not used
+    spool_dir : str
+        Directory watched for job files, None if no directory is watched
+    token : str
+        Secret every socket request must carry in its "token" field, not required if None which is only allowed on loopback
+    pool : client_pool
+        Clients reused between jobs
+    transfers : scheduler.scheduler
+        Runs the transfer jobs
+    workers : concurrent.futures.ThreadPoolExecutor
+        Runs the pgp and convert jobs
+
+    """
+    def __init__(
+        self,
+        config_file: str = None,
+        host: str = service_constants.HOST,
+        port: int = None,
+        spool_dir: str = None,
+        use_socket: bool = True,
+        max_transfers: int = scheduler_constants.MAX_WORKERS,
+        max_per_host: int = scheduler_constants.MAX_PER_HOST,
+        max_workers: int = service_constants.MAX_WORKERS,
+        token: str = None,
+        poll_interval: float = service_constants.POLL_INTERVAL
+    ):
+        """Inits service class
+
+        Parameters
+        ----------
+        config_file : str, optional (default None)
+            Full path location of library configuration file
+        host : str, optional (default "127.0.0.1")
+            Address the socket listens on
+        port : int, optional (default None)
+            Port the socket listens on, the configuration key "service_port" or 8765 if not provided. 0 picks a free port
+        spool_dir : str, optional (default None)
+            Directory to watch for job files, the configuration key "service_spoolDir" if not provided. No directory is
+            watched if neither is set
+        use_socket : bool, optional (default True)
+            Indicator if jobs are accepted on the socket
+        max_transfers : int, optional (default 4)
+            Most transfer jobs running at the same time
+        max_per_host : int, optional (default 2)
+            Most transfer jobs running at the same time against a single host
+        max_workers : int, optional (default 2)
+            Most pgp and convert jobs running at the same time
+        token : str, optional (default None)
+            Secret socket requests must carry, read from the environment variable named by the configuration key
+            "service_tokenEnvVar" if not provided
+        poll_interval : float, optional (default 1.0)
+            Seconds between scans of the spool directory
+
+        Raises
+        ------
+        ValueError
+            If 'max_workers' is not a positive integer
+            If neither the socket nor a spool directory is used
+            If the socket listens beyond the loopback address without a token
+
+        """
+        self.config_file = config_file
+        use_socket = use_socket if use_socket in BOOLEANS else True
+        if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+            err_msg = f"invalid max_workers '{max_workers}', expected a positive integer"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+        self.host = host
+        self.port = None
+        if use_socket:
+            port = port if port is not None else get_config('service_port', self.config_file)
+            self.port = int(port) if port is not None and str(port).strip() != '' else service_constants.PORT
+        self.spool_dir = spool_dir if spool_dir is not None else get_config('service_spoolDir', self.config_file)
+        self.spool_dir = self.spool_dir or None
+        if self.port is None and self.spool_dir is None:
+            err_msg = 'service needs the socket or a spool directory to receive jobs'
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+        if token is None:
+            token_var = get_config('service_tokenEnvVar', self.config_file)
+            token = os.getenv(token_var) if token_var else None
+        self.token = token or None
+        if self.port is not None and self.token is None and not _is_loopback(self.host):
+            err_msg = f"service listening on '{self.host}' needs a token, anyone reaching the port could run jobs"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+        self.poll_interval = poll_interval if isinstance(poll_interval, (int, float)) and poll_interval > 0 else service_constants.POLL_INTERVAL
+
+        self.pool = client_pool(self.config_file)
+        self.transfers = scheduler(max_workers=max_transfers, max_per_host=max_per_host, keep_results=False)
+        self.workers = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{service_constants.MODULE_NAME}-worker')
+
+        self._server = None
+        self._threads = []
+        self._stopped = threading.Event()
+        self._started = None
+        self._counts = {'submitted': 0, 'success': 0, 'failed': 0}
+        self._counts_lock = threading.Lock()
+        self._database_cache_enabled = DATABASE_CACHE.enabled
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.stop()
+
+    @property
+    def address(self) -> tuple:
+        """Host and port the socket is bound to, None if the socket is not used or not started"""
+        return None if self._server is None else self._server.server_address[:2]
+
+    def warm(self, preload: list):
+        """Import dependencies and create, and for transfers connect, clients ahead of the first job
+
+        Parameters
+        ----------
+        preload : list
+            Entries of the form "kind:profile", i.e. "sftp:Partner" or "pgp:Partner", or "office" to import pandas
+
+        """
+        for entry in preload or []:
+            kind, _, profile = str(entry).partition(':')
+            for module in service_constants.PRELOAD_MODULES.get(kind, []):
+                try:
+                    importlib.import_module(module)
+                except ImportError as e:
+                    logging.warning(f"unable to preload '{module}'|{e}")
+            if kind not in service_constants.PROTOCOLS + ['pgp'] or profile == '':
+                continue
+            try:
+                with self.pool.client(kind, profile) as client:
+                    if kind in service_constants.PROTOCOLS:
+                        getattr(client, 'ssh' if kind == 'sftp' else 'ftp')
+            except Exception as e:
+                logging.error(f"unable to preload {kind} profile '{profile}'|{e}")
+
+    def start(self):
+        """Start listening on the socket and watching the spool directory, returning at once"""
+        DATABASE_CACHE.enable()
+        self._started = time.monotonic()
+        if self.port is not None:
+            self._server = _socket_server((self.host, self.port), _request_handler)
+            self._server.service = self
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name=f'{service_constants.MODULE_NAME}-socket', daemon=True))
+            logging.info(f'service listening on {self.address[0]}:{self.address[1]}')
+        if self.spool_dir is not None:
+            for name in (service_constants.SPOOL_WORKING, service_constants.SPOOL_DONE, service_constants.SPOOL_FAILED):
+                os.makedirs(os.path.join(self.spool_dir, name), exist_ok=True)
+            abandoned = os.listdir(os.path.join(self.spool_dir, service_constants.SPOOL_WORKING))
+            if len(abandoned) > 0:
+                logging.warning(f"jobs left in the working directory by an earlier run are not restarted|{', '.join(abandoned)}")
+            self._threads.append(threading.Thread(target=self._watch_spool, name=f'{service_constants.MODULE_NAME}-spool', daemon=True))
+            logging.info(f"service watching spool directory '{self.spool_dir}'")
+        for t in self._threads:
+            t.start()
+
+    def serve_forever(self):
+        """Start if needed and block until 'stop' is called or the process is interrupted"""
+        if self._started is None:
+            self.start()
+        try:
+            while not self._stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            logging.info('service interrupted')
+        finally:
+            self.stop()
+
+    def stop(self, wait: bool = True):
+        """Stop accepting jobs, let running jobs finish if 'wait' and close every pooled client"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for t in self._threads:
+            t.join()
+        self.transfers.shutdown(wait=wait)
+        self.workers.shutdown(wait=wait)
+        self.pool.close()
+        if not self._database_cache_enabled:
+            DATABASE_CACHE.disable()
+
+    def submit(self, job: dict) -> concurrent.futures.Future:
+        """Validate a job and queue it on the matching pool
+
+        Parameters
+        ----------
+        job : dict
+            The job, see the class documentation for its fields
+
+        Returns
+        -------
+        concurrent.futures.Future : resolves to the return value of the library method
+
+        Raises
+        ------
+        ValueError
+            If the job is not a dict, its action, protocol or method is not supported or its profile or args are missing
+
+        """
+        if not isinstance(job, dict):
+            raise ValueError(f"invalid job '{job}', expected a JSON object")
+        action = job.get('action')
+        args = job.get('args', {})
+        if not isinstance(args, dict):
+            raise ValueError(f"invalid args '{args}', expected a JSON object")
+        profile = job.get('profile')
+
+        if action in service_constants.TRANSFER_ACTIONS:
+            protocol = job.get('protocol', 'sftp')
+            if protocol not in service_constants.PROTOCOLS:
+                raise ValueError(f"invalid protocol '{protocol}', expected one of {', '.join(service_constants.PROTOCOLS)}")
+            if not profile:
+                raise ValueError(f'{action} job without a profile')
+            priority = job.get('priority', 0)
+            future = self.transfers.submit(_pooled_transfer(self.pool, protocol, profile), action, priority=priority, **args)
+        elif action in service_constants.PGP_ACTIONS:
+            if not profile:
+                raise ValueError(f'{action} job without a profile')
+            future = self.workers.submit(self._run_pgp, profile, action, args)
+        elif action == 'convert':
+            method = job.get('method')
+            if method not in service_constants.CONVERT_METHODS:
+                raise ValueError(f"invalid method '{method}', expected one of {', '.join(service_constants.CONVERT_METHODS)}")
+            future = self.workers.submit(self._run_convert, method, args)
+        else:
+            raise ValueError(f"invalid action '{action}', expected one of {', '.join(self.actions())}")
+
+        with self._counts_lock:
+            self._counts['submitted'] += 1
+        METRICS.count('service.jobs', action=action)
+        return future
+
+    @staticmethod
+    def actions() -> list:
+        """Return every action a job may name"""
+        return service_constants.TRANSFER_ACTIONS + service_constants.PGP_ACTIONS + ['convert'] + service_constants.CONTROL_ACTIONS
+
+    def _run_pgp(self, profile: str, action: str, args: dict):
+        with self.pool.client('pgp', profile) as client:
+            return getattr(client, action)(**args)
+
+    def _run_convert(self, method: str, args: dict):
+        from .office import convert
+        return getattr(convert(self.config_file), method)(**args)
+
+    def run(self, job: dict) -> dict:
+        """Run a job and wait for it, returning its response instead of raising
+
+        Returns
+        -------
+        dict : "id" of the job if it had one, "status" of "success" or "failed", the "result" of the library method,
+        the "error" if it failed and the "seconds" it took
+
+        """
+        started = time.perf_counter()
+        response = {'id': job.get('id') if isinstance(job, dict) else None, 'status': 'success', 'result': None, 'error': None}
+        action = job.get('action') if isinstance(job, dict) else None
+        try:
+            if action == 'ping':
+                response['result'] = self.status()
+            else:
+                with METRICS.span('service.job', action=action):
+                    response['result'] = self.submit(job).result()
+        except Exception as e:
+            response['status'] = 'failed'
+            response['error'] = f'{e.__class__.__name__}: {e}'
+            logging.error(f"service job {response['id'] or action} failed|{e}")
+        response['seconds'] = round(time.perf_counter() - started, 3)
+        if action != 'ping':
+            with self._counts_lock:
+                self._counts[response['status']] += 1
+        return response
+
+    def status(self) -> dict:
+        """Return the version, uptime, job counts and number of idle pooled clients"""
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            'version': __version__,
+            'uptime_seconds': 0 if self._started is None else round(time.monotonic() - self._started, 1),
+            'jobs': counts,
+            'idle_clients': self.pool.idle_count()
+        }
+
+    def handle_request(self, line: bytes) -> dict:
+        """Parse and authorize a socket request, then run it"""
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            return {'id': None, 'status': 'failed', 'result': None, 'error': f'invalid JSON|{e}'}
+        if self.token is not None:
+            supplied = job.get('token') if isinstance(job, dict) else None
+            if not isinstance(supplied, str) or not hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8')):
+                logging.warning('service rejected a request with a missing or wrong token')
+                return {'id': job.get('id') if isinstance(job, dict) else None, 'status': 'failed', 'result': None, 'error': 'invalid token'}
+        if isinstance(job, dict) and job.get('wait') is False:
+            try:
+                self.submit(job)
+            except ValueError as e:
+                return {'id': job.get('id'), 'status': 'failed', 'result': None, 'error': f'ValueError: {e}'}
+            return {'id': job.get('id'), 'status': 'queued', 'result': None, 'error': None}
+        return self.run(job)
+
+    def _watch_spool(self):
+        """Claim job files from the spool directory until stopped, running each on its own thread"""
+        working = os.path.join(self.spool_dir, service_constants.SPOOL_WORKING)
+        while not self._stopped.is_set():
+            try:
+                names = sorted(f for f in os.listdir(self.spool_dir) if f.endswith(service_constants.SPOOL_EXTENSION))
+            except OSError as e:
+                logging.error(f"unable to list spool directory '{self.spool_dir}'|{e}")
+                names = []
+            for name in names:
+                claimed = os.path.join(working, name)
+                try:
+                    os.replace(os.path.join(self.spool_dir, name), claimed)  # another service may claim the same file
+                except OSError:
+                    continue
+                threading.Thread(target=self._run_spool_file, args=(claimed,), name=f'{service_constants.MODULE_NAME}-{name}', daemon=True).start()
+            self._stopped.wait(self.poll_interval)
+
+    def _run_spool_file(self, claimed: str):
+        name = os.path.basename(claimed)
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError) as e:
+            job = None
+            response = {'id': None, 'status': 'failed', 'result': None, 'error': f'invalid job file|{e}'}
+        else:
+            response = self.run(job)
+        folder = service_constants.SPOOL_DONE if response['status'] == 'success' else service_constants.SPOOL_FAILED
+        result_file = os.path.join(self.spool_dir, folder, name)
+        temp_file = f'{result_file}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'job': job, 'finished': dt.datetime.now().isoformat(timespec='seconds'), **response}, f, indent=4, default=_jsonable)
+        os.replace(temp_file, result_file)
+        os.remove(claimed)
+
+
+def _jsonable(value):
+    """Fallback for json.dumps, objects such as transfer.file_result become their attributes"""
+    if hasattr(value, '__dict__'):
+        return vars(value)
+    return str(value)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def send_job(job: dict, host: str = service_constants.HOST, port: int = service_constants.PORT, token: str = None, timeout: float = None) -> dict:
+    """Send a job to a running service and return its response
+
+    Parameters
+    ----------
+    job : dict
+        The job, see the service class documentation for its fields
+    host : str, optional (default "127.0.0.1")
+        Address the service listens on
+    port : int, optional (default 8765)
+        Port the service listens on
+    token : str, optional (default None)
+        Secret the service requires, if any
+    timeout : float, optional (default None)
+        Most seconds to wait for the response, no limit if not provided
+
+    Returns
+    -------
+    dict : the response of the service
+
+    """
+    job = dict(job, token=token) if token is not None else job
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall(json.dumps(job).encode('utf-8') + b'\n')
+        with conn.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f'service at {host}:{port} closed the connection without a response')
+    return json.loads(line)
+
+
+def main(argv: list = None):
+    """Run the service in the foreground until interrupted"""
+    parser = argparse.ArgumentParser(prog='automation service', description='Run jobs sent over a local socket or a spool directory, keeping resources warm')
+    parser.add_argument('--config-file', help='Library configuration file, the CONFIGFILE environment variable if not provided')
+    parser.add_argument('--host', default=service_constants.HOST, help='Address to listen on, other than loopback requires a token')
+    parser.add_argument('--port', type=int, help='Port to listen on, the configuration key "service_port" or 8765 if not provided')
+    parser.add_argument('--no-socket', action='store_true', help='Only accept jobs from the spool directory')
+    parser.add_argument('--spool-dir', help='Directory to watch for job files, the configuration key "service_spoolDir" if not provided')
+    parser.add_argument('--max-transfers', type=int, default=scheduler_constants.MAX_WORKERS)
+    parser.add_argument('--max-per-host', type=int, default=scheduler_constants.MAX_PER_HOST)
+    parser.add_argument('--max-workers', type=int, default=service_constants.MAX_WORKERS)
+    parser.add_argument('--preload', nargs='*', default=[], help='Clients and dependencies to load at start, i.e. sftp:Partner pgp:Partner office')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(threadName)s %(message)s')
+    svc = service(
+        config_file=args.config_file,
+        host=args.host,
+        port=args.port,
+        spool_dir=args.spool_dir,
+        use_socket=not args.no_socket,
+        max_transfers=args.max_transfers,
+        max_per_host=args.max_per_host,
+        max_workers=args.max_workers
+    )
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop as on Ctrl+C, letting running jobs finish
+    svc.warm(args.preload)
+    svc.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,114 @@
+from __future__ import annotations
+
 import base64
+import concurrent.futures
+import contextlib
 import datetime as dt
-import fnmatch
+import hashlib
 import io
 import logging
 import os
 import posixpath
+import queue
 import re
+import shlex
+import shutil
 import stat
-
-import paramiko
+import tarfile
+import threading
+import time
 
 from . import NL, BOOLEANS
-from .misc import get_config
+from .metrics import METRICS
+from .misc import get_config, lazy_module
 from .secrets import keepass
+from .transfer import (
+    ASYNC_RUNNER, LISTING_CACHE, attribute_filter, bundle_format, check_bundle_format, concurrency_tuner, extract_bundle,
+    format_hash_manifest, is_selected, iterate_results, log_unmatched, manifest, local_signature, parallel_transfer,
+    paramiko_callback, parse_hash_manifest, progress_callback, progress_tracker, remote_file, remote_signature, result_recorder,
+    select_files, sha256_file, transfer_constants, verify_files, write_bundle
+)
+
+paramiko = lazy_module('paramiko')
 
 
 class sftp_constants:
     """A class for constants necessary for the sftp module"""
     MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    PIPELINE_DEPTH = 64  # most requests awaiting a reply when renaming or deleting many remote files
+    APPEND_VERIFY_SIZE = 64 * 1024  # bytes compared before appending when the server cannot hash a file itself
+    POSIX_RENAME = 'posix-rename@openssh.com'
+    TRUE_VALUES = ['TRUE', 'YES', 'Y', '1']
+    TAR_CREATE = 'tar -cf - -C {remote_dir} --null -T -'
+    TAR_EXTRACT = 'tar -xf - -C {remote_dir}'
+    TUNING_SETTINGS = {  # KeePass custom property: config key used when the profile does not set it
+        'WindowSize': 'sftp_windowSize',
+        'MaxPacketSize': 'sftp_maxPacketSize',
+        'Ciphers': 'sftp_ciphers',
+        'Compression': 'sftp_compression'
+    }
+
+
+class _request_batch:
+    """Collects the replies to requests sent without waiting, in the form paramiko hands them to file objects"""
+    def __init__(self):
+        self.responses = {}
+
+    def _async_response(self, t, msg, num):
+        self.responses[num] = (t, msg)
+
+
+def transport_options(
+    window_size: int = None,
+    max_packet_size: int = None,
+    ciphers: list = None,
+    compression: bool = False
+) -> dict:
+    """Return the extra keyword arguments for paramiko.SSHClient.connect that apply transport tuning
+
+    Nothing is returned for settings left at None so untuned connections keep the paramiko defaults
+
+    Parameters
+    ----------
+    window_size : int, optional (default None)
+        Initial SSH channel window size in bytes, larger windows keep more data in flight on high latency links
+    max_packet_size : int, optional (default None)
+        Largest SSH packet in bytes the channel accepts
+    ciphers : list, optional (default None)
+        Cipher names to prefer, in order, ahead of the remaining ciphers paramiko supports; unsupported names are ignored
+    compression : bool, optional (default False)
+        Whether to request zlib compression of the SSH transport
+
+    Returns
+    -------
+    dict : Keyword arguments to pass on to paramiko.SSHClient.connect, empty if nothing is tuned
+
+    """
+    options = {}
+    if compression is True:
+        options['compress'] = True
+    if window_size is None and max_packet_size is None and not ciphers:
+        return options
+
+    def transport_factory(sock, **kwargs) -> paramiko.Transport:
+        transport = paramiko.Transport(
+            sock,
+            default_window_size=window_size or paramiko.common.DEFAULT_WINDOW_SIZE,
+            default_max_packet_size=max_packet_size or paramiko.common.DEFAULT_MAX_PACKET_SIZE,
+            **kwargs
+        )
+        if ciphers:
+            security_options = transport.get_security_options()
+            supported = security_options.ciphers
+            unsupported = [cipher for cipher in ciphers if cipher not in supported]
+            if unsupported:
+                logging.warning(f"ignoring unsupported ciphers {', '.join(unsupported)}")
+            preferred = [cipher for cipher in ciphers if cipher in supported]
+            security_options.ciphers = tuple(preferred + [cipher for cipher in supported if cipher not in preferred])
+        return transport
+
+    options['transport_factory'] = transport_factory
+    return options
 
 
 class sftp:
@@ -41,12 +132,15 @@ class sftp:
         Password to connect with
     passphrase : str
         Passphrase for the key file, if applicable
-    private_key : str
-        Actual private key text from the key file, if applicable
+    private_key : str or paramiko.RSAKey
+        Actual private key text from the key file, if applicable, parsed into a key when connecting
     save_host_key : bool
         Whether or not to save the host key information
     connect_insecure : bool
         Whether to bypass host key verification upon connection
+    allow_exec : bool
+        Whether the profile allows commands over an SSH exec channel, required for bulk transfers. Set with the
+        'AllowExec' custom property
     remote_in : str
         Default remote directory to upload files to. With use root "/" if not provided
     remote_out : str
@@ -60,15 +154,34 @@ class sftp:
     suppress_out : list
         Specific files or wildcard names to not upload to an SFTP
     ssh : paramiko.SSHClient
-        Object representing the SFTP client being connected to
+        Object representing the SFTP client being connected to, connected on first use if 'lazy' is True
+    lazy : bool
+        Whether parsing the private key and connecting are deferred until the first operation that needs the server
     log_path : str
         Directory in which log files will write to. Defined in the configuration file and will always be root/module_name
     log_name : str
         Name of log file, always module_yyyymmddHHMMSS.log
     log_delim : str
         Delimiter to use in the log file, defined in the configuration file
-    track_progress : bool
-        Indicator whether to print progress messages to stdout every 100 files processed
+    track_progress : bool or callable
+        Indicator whether to log progress of transfers, every 100 files processed and every minute while bytes move, or
+        a callable receiving a transfer.transfer_progress with file and byte counts, MB/s, ETA and errors instead
+    listing_ttl : float
+        Number of seconds a remote directory listing can be reused from the shared listing cache, 0 disables caching
+    window_size : int
+        SSH channel window size in bytes from the 'WindowSize' property or 'sftp_windowSize' config, None for the default
+    max_packet_size : int
+        SSH packet size in bytes from the 'MaxPacketSize' property or 'sftp_maxPacketSize' config, None for the default
+    ciphers : list
+        Preferred ciphers from the comma separated 'Ciphers' property or 'sftp_ciphers' config
+    compression : bool
+        Whether to compress the SSH transport, from the 'Compression' property or 'sftp_compression' config
+    throttle : callable
+        Called with the number of bytes moved after every chunk of a per-file transfer, blocking to limit bandwidth.
+        Set by scheduler.scheduler while it runs a job on this profile, None otherwise
+    on_result : callable
+        Called with a transfer.file_result as each file of a download or upload completes. Set by 'iter_download' and
+        'iter_upload' while they run, None otherwise
 
     """
     def __init__(
@@ -77,7 +190,9 @@ class sftp:
         track_progress: bool = True,
         config_file: str = None,
         save_host_key: bool = False,
-        connect_insecure: bool = False
+        connect_insecure: bool = False,
+        listing_ttl: float = 0,
+        lazy: bool = False
     ):
         """Inits sftp class
 
@@ -85,14 +200,21 @@ class sftp:
         ----------
         profile_name : str
             Name of SFTP profile
-        track_progress: bool, optional (default True)
-            Inidicator if progress should be printed to stdout
+        track_progress: bool or callable, optional (default True)
+            Inidicator if progress should be logged, or a callable to call with a transfer.transfer_progress after
+            every file processed and at most once a second while bytes move
         config_file : str, optional (default None)
             Full path location of library configuration file
         save_host_key : bool, optional (default False)
             Whether or not to save the host key information
         connect_insecure : bool, optional (default False)
             Whether to bypass host key verification upon connection
+        listing_ttl : float, optional (default 0)
+            Number of seconds a remote directory listing can be reused from the shared listing cache, 0 disables caching
+        lazy : bool, optional (default False)
+            Whether parsing the private key and connecting should wait until the first operation that needs the
+            server, so a script that finds nothing to transfer never connects. Connection errors are then raised by
+            that operation instead of here
 
         Raises
         ------
@@ -128,14 +250,17 @@ class sftp:
         self.usr = self.kp.getgeneral('Username')
         self.pwd = self.kp.getgeneral('Password')
         self.passphrase = self.kp.getcustomproperties('Passphrase')
-        self.private_key = self.kp.readattachment('OPENSSH_PRIVATE.asc')
-        if self.private_key:
-            self.private_key = io.StringIO(self.private_key)
-            self.private_key = paramiko.RSAKey.from_private_key(self.private_key, self.passphrase)
+        self.private_key = self.kp.readattachment('OPENSSH_PRIVATE.asc')  # parsed when connecting
         self.save_host_key = save_host_key if save_host_key in BOOLEANS else False
         self.connect_insecure = connect_insecure if connect_insecure in BOOLEANS else False
         if self.connect_insecure:
             logging.info(f'connecting to {self.host} insecurely')
+        self.allow_exec = self.kp.getcustomproperties('AllowExec')
+        self.allow_exec = False if self.allow_exec is None else self.allow_exec.strip().upper() in sftp_constants.TRUE_VALUES
+        self.window_size = self._tuning_setting('WindowSize')
+        self.max_packet_size = self._tuning_setting('MaxPacketSize')
+        self.ciphers = self._tuning_setting('Ciphers')
+        self.compression = self._tuning_setting('Compression')
 
         root = '/'
         self.remote_in = self.kp.getcustomproperties('RemoteInDefault')
@@ -156,20 +281,73 @@ class sftp:
         self.log_path = os.path.join(get_config('logRoot', self.config_file), sftp_constants.MODULE_NAME)
         self.log_name = f"{self.__class__.__name__}_{dt.datetime.now().strftime('%Y%m%d%H%M%S')}_{re.sub(r'[^a-zA-Z0-9]', '', self.name)}.log"
         self.log_delim = get_config('logDelimiter', self.config_file)
-        self.track_progress = track_progress if track_progress in BOOLEANS else True
+        self.track_progress = track_progress if track_progress in BOOLEANS or callable(track_progress) else True
+        self.listing_ttl = listing_ttl if isinstance(listing_ttl, (int, float)) and listing_ttl > 0 else 0
+        self.throttle = None
+        self.on_result = None
+        self.lazy = lazy if lazy in BOOLEANS else False
+        self._ssh = None
+        self._connect_lock = threading.Lock()
 
         self._validate_profile()
 
-        self._connectssh()
+        if not self.lazy:
+            self._connectssh()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self.ssh.close()
+        self.close()
 
     def close(self):
-        self.ssh.close()
+        if self._ssh is not None:
+            self._ssh.close()
+
+    @property
+    def ssh(self) -> paramiko.SSHClient:
+        """The connected SSH client, connecting first if the connection was deferred"""
+        if self._ssh is None:
+            with self._connect_lock:
+                if self._ssh is None:
+                    self._connectssh()
+        return self._ssh
+
+    @ssh.setter
+    def ssh(self, client: paramiko.SSHClient):
+        self._ssh = client
+
+    @property
+    def connected(self) -> bool:
+        """Whether a connection has been made, without connecting"""
+        return self._ssh is not None
+
+    def alive(self) -> bool:
+        """Whether the connection is still open, True if none has been made yet as one is made on first use"""
+        if self._ssh is None:
+            return True
+        transport = self._ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _tuning_setting(self, property_name: str):
+        """Class function to read a transport tuning setting from the profile, falling back to the configuration file"""
+        value = self.kp.getcustomproperties(property_name)
+        if value is None or str(value).strip() == '':
+            value = get_config(sftp_constants.TUNING_SETTINGS[property_name], self.config_file)
+        if value is None or str(value).strip() == '':
+            return False if property_name == 'Compression' else None
+
+        if property_name == 'Compression':
+            return value if value in BOOLEANS else str(value).strip().upper() in sftp_constants.TRUE_VALUES
+        if property_name == 'Ciphers':
+            value = value if isinstance(value, list) else str(value).split(',')
+            return [cipher.strip() for cipher in value if cipher.strip()]
+        try:
+            value = int(value)
+        except ValueError:
+            logging.warning(f"ignoring invalid {property_name} '{value}' for profile '{self.name}'")
+            return None
+        return value if value > 0 else None
 
     def _validate_profile(self):
         err_text = None
@@ -186,8 +364,9 @@ class sftp:
             logging.critical(err_text)
             raise ValueError(err_text)
 
+    @METRICS.timed('sftp.connect')
     def _connectssh(self):
-        """Connects to the ssh
+        """Connects to the ssh, parsing the private key first if it is still text
 
         Raises
         ------
@@ -199,29 +378,34 @@ class sftp:
             Anything else that might pop up
 
         """
-        self.ssh = paramiko.SSHClient()
+        if isinstance(self.private_key, str) and self.private_key:
+            self.private_key = paramiko.RSAKey.from_private_key(io.StringIO(self.private_key), self.passphrase)
+        ssh = paramiko.SSHClient()
         if self.save_host_key or self.connect_insecure:
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         else:
             host_key = paramiko.pkey.PKey.from_type_string(self.host_key_type, base64.b64decode(self.host_key_value))
-            self.ssh.get_host_keys().add(self.host, self.host_key_type, host_key)
+            ssh.get_host_keys().add(self.host, self.host_key_type, host_key)
+        tuning = transport_options(self.window_size, self.max_packet_size, self.ciphers, self.compression)
         try:
             if self.login_type == 'NORMAL':
-                self.ssh.connect(
+                ssh.connect(
                     hostname=self.host,
                     port=self.port,
                     username=self.usr,
-                    password=self.pwd
+                    password=self.pwd,
+                    **tuning
                 )
             elif self.login_type == 'KEY':
-                self.ssh.connect(
+                ssh.connect(
                     hostname=self.host,
                     port=self.port,
                     username=self.usr,
                     password=self.pwd,
                     pkey=self.private_key,
                     passphrase=self.passphrase,
-                    disabled_algorithms=dict(pubkeys=['rsa-sha2-512', 'rsa-sha2-256'])
+                    disabled_algorithms=dict(pubkeys=['rsa-sha2-512', 'rsa-sha2-256']),
+                    **tuning
                 )
         except paramiko.AuthenticationException as e:
             logging.critical(paramiko.AuthenticationException(self.host))
@@ -233,43 +417,698 @@ class sftp:
             logging.critical(f'Unhandled exception {e}|{self.host}')
             raise Exception(f'Unhandled exception {e}|{self.host}') from e
 
+        self.ssh = ssh
         if self.save_host_key:
             host_key = self.ssh.get_transport().get_remote_server_key()
             self.kp.writecustomproperty(string_field='HostKeyType', new_value=host_key.get_name(), create_property=True)
             self.kp.writecustomproperty(string_field='HostKeyValue', new_value=host_key.get_base64(), create_property=True)
 
     def _writelog(self, direction: str, remote_dir: str, local_dir: str, filename: str):
-        """Class function to write to a log file"""
+        """Class function to write to a log file, safe to call from parallel transfer threads"""
         if not os.path.isdir(self.log_path):
-            os.mkdir(self.log_path)
+            os.makedirs(self.log_path, exist_ok=True)
         with open(os.path.join(self.log_path, self.log_name), 'a') as logfile:
             dte, tme = dt.datetime.now().strftime('%Y-%m-%d'), dt.datetime.now().strftime('%H:%M:%S')
             logfile.write(f'{self.name}{self.log_delim}{dte}{self.log_delim}{tme}{self.log_delim}{direction}{self.log_delim}')
             logfile.write(f'{remote_dir}{self.log_delim}{local_dir.replace(os.sep, posixpath.sep)}{self.log_delim}{filename}{NL}')
 
-    def listsftpdir(self, remote_dir: str) -> list:
+    def _listdir_all(self, ftp: paramiko.SFTPClient, remote_dir: str) -> list:
+        """Class function to return the attributes of everything in a remote directory, including subdirectories
+
+        Served from the shared listing cache when 'self.listing_ttl' allows it
+
+        """
+        dir_list = LISTING_CACHE.get(sftp_constants.MODULE_NAME, self.name, remote_dir, 'attr', self.listing_ttl)
+        if dir_list is None:
+            dir_list = ftp.listdir_attr(remote_dir)
+            if self.listing_ttl:
+                LISTING_CACHE.put(sftp_constants.MODULE_NAME, self.name, remote_dir, 'attr', dir_list)
+        return dir_list
+
+    def _listdir_attr(self, ftp: paramiko.SFTPClient, remote_dir: str) -> list:
+        """Class function to return the attributes of all files, excluding directories, in a remote directory"""
+        return [f for f in self._listdir_all(ftp, remote_dir) if not stat.S_ISDIR(f.st_mode)]
+
+    def _walk(self, remote_dir: str, max_workers: int = transfer_constants.WALK_WORKERS) -> list:
+        """Class function to list every file below a remote directory
+
+        Subdirectories are listed concurrently, each worker thread using its own SFTP channel on the shared transport.
+        Symbolic links are reported as files and never followed.
+
+        Returns
+        -------
+        list : transfer.remote_file records, with 'filename' relative to 'remote_dir' using "/" separators
+
+        """
+        thread_data = threading.local()
+        channels = []
+        channel_lock = threading.Lock()
+
+        def list_dir(rel_dir: str):
+            ftp = getattr(thread_data, 'ftp', None)
+            if ftp is None:
+                ftp = self.ssh.open_sftp()
+                thread_data.ftp = ftp
+                with channel_lock:
+                    channels.append(ftp)
+            return rel_dir, self._listdir_all(ftp, posixpath.join(remote_dir, rel_dir) if rel_dir else remote_dir)
+
+        file_list = []
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=f'{sftp_constants.MODULE_NAME}-walk') as executor:
+                pending = {executor.submit(list_dir, '')}
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        rel_dir, dir_list = future.result()
+                        for attr in dir_list:
+                            rel_name = posixpath.join(rel_dir, attr.filename) if rel_dir else attr.filename
+                            if stat.S_ISDIR(attr.st_mode):
+                                if attr.filename not in ['.', '..']:
+                                    pending.add(executor.submit(list_dir, rel_name))
+                            else:
+                                file_list.append(remote_file(rel_name, attr.st_size, attr.st_mtime))
+        finally:
+            for ftp in channels:
+                ftp.close()
+
+        return sorted(file_list, key=lambda x: x.filename)
+
+    def _put(self, ftp: paramiko.SFTPClient, local_file: str, remote_file: str) -> paramiko.SFTPAttributes:
+        """Class function to upload a file, invalidating any cached listing of its remote directory"""
+        try:
+            return ftp.put(local_file, remote_file, callback=paramiko_callback(self.throttle))
+        finally:
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, posixpath.dirname(remote_file))
+
+    def _remove(self, ftp: paramiko.SFTPClient, remote_file: str):
+        """Class function to delete a remote file, invalidating any cached listing of its remote directory"""
+        try:
+            ftp.remove(remote_file)
+        finally:
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, posixpath.dirname(remote_file))
+
+    def _rename(self, ftp: paramiko.SFTPClient, old_file: str, new_file: str):
+        """Class function to rename a remote file, invalidating any cached listing of both remote directories"""
+        try:
+            ftp.rename(old_file, new_file)
+        finally:
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, posixpath.dirname(old_file))
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, posixpath.dirname(new_file))
+
+    def _makedirs(self, ftp: paramiko.SFTPClient, remote_dir: str):
+        """Class function to create a remote directory, and any missing parent, if it does not exist yet"""
+        try:
+            ftp.stat(remote_dir)
+            return
+        except FileNotFoundError:
+            pass
+
+        parent_dir = posixpath.dirname(remote_dir)
+        if parent_dir not in ('', posixpath.sep, remote_dir):
+            self._makedirs(ftp, parent_dir)
+        ftp.mkdir(remote_dir)
+        LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, parent_dir)
+
+    def _pipeline(self, ftp: paramiko.SFTPClient, requests: list) -> list:
+        """Class function to send status-only SFTP requests without waiting for each reply
+
+        Up to 'PIPELINE_DEPTH' requests are outstanding at a time, so operating on many files costs a handful of round
+        trips instead of one per file
+
+        Parameters
+        ----------
+        ftp : paramiko.SFTPClient
+            Channel to send the requests on, must not be in use by another thread
+        requests : list
+            Tuples of the request type followed by its arguments, i.e. (paramiko.sftp.CMD_REMOVE, path)
+
+        Returns
+        -------
+        list : None for each request that succeeded, otherwise the exception describing its failure, in request order
+
+        """
+        results = []
+        depth = sftp_constants.PIPELINE_DEPTH
+        for i in range(0, len(requests), depth):
+            batch = _request_batch()
+            nums = [ftp._async_request(batch, *request) for request in requests[i:i + depth]]
+            while len(batch.responses) < len(nums):
+                ftp._read_response()
+
+            for num in nums:
+                t, msg = batch.responses[num]
+                try:
+                    if t != paramiko.sftp.CMD_STATUS:
+                        raise IOError(f'unexpected response {t}')
+                    ftp._convert_status(msg)
+                    results.append(None)
+                except IOError as e:
+                    results.append(e)
+
+        return results
+
+    def _remove_many(self, ftp: paramiko.SFTPClient, remote_dir: str, file_list: list) -> list:
+        """Class function to delete many remote files with pipelined requests
+
+        Returns
+        -------
+        list : the files deleted
+
+        """
+        remove_list = [posixpath.join(remote_dir, f) for f in file_list]
+        try:
+            results = self._pipeline(ftp, [(paramiko.sftp.CMD_REMOVE, x) for x in remove_list])
+        finally:
+            for old_dir in {posixpath.dirname(x) for x in remove_list}:
+                LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, old_dir)
+
+        delete_list = []
+        for f, remote_path, result in zip(file_list, remove_list, results):
+            if result is None:
+                delete_list.append(f)
+            else:
+                logging.error(f"unable to delete '{remote_path}'|{result}")
+
+        return delete_list
+
+    def _archive(self, ftp: paramiko.SFTPClient, remote_dir: str, remote_archive_dir: str, file_list: list) -> list:
+        """Class function to move remote files into an archive directory with server-side renames
+
+        Renames are sent as pipelined posix-rename requests. Any file the server refuses to rename that way (i.e. the
+        extension is not supported) is retried with a standard rename. Relative paths in 'file_list' keep their
+        structure under 'remote_archive_dir'
+
+        Returns
+        -------
+        list : the files archived
+
+        """
+        rename_list = [(f, posixpath.join(remote_dir, f), posixpath.join(remote_archive_dir, f)) for f in file_list]
+        for new_dir in sorted({posixpath.dirname(x[2]) for x in rename_list} - {remote_archive_dir.rstrip(posixpath.sep)}):
+            self._makedirs(ftp, new_dir)
+
+        try:
+            results = self._pipeline(
+                ftp, [(paramiko.sftp.CMD_EXTENDED, sftp_constants.POSIX_RENAME, x[1], x[2]) for x in rename_list]
+            )
+        finally:
+            for old_dir in {posixpath.dirname(x[1]) for x in rename_list} | {posixpath.dirname(x[2]) for x in rename_list}:
+                LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, old_dir)
+
+        archive_list = [x[0] for x, result in zip(rename_list, results) if result is None]
+        retry_list = [x for x, result in zip(rename_list, results) if result is not None]
+        for f, old_file, new_file in retry_list:
+            try:
+                self._rename(ftp, old_file, new_file)
+                archive_list.append(f)
+            except Exception as e:
+                logging.error(f"unable to archive '{old_file}' to '{new_file}'|{e}")
+
+        return archive_list
+
+    @METRICS.timed('sftp.list')
+    def listsftpdir(self, remote_dir: str, recursive: bool = False, max_workers: int = transfer_constants.WALK_WORKERS) -> list:
         """Return a list of files on an SFTP
 
         Parameters
         ----------
         remote_dir : str
             Remote directory to list files from
+        recursive : bool, optional (default False)
+            Indicator if files in all subdirectories should be included, as paths relative to 'remote_dir'
+        max_workers : int, optional (default 4)
+            Number of subdirectories listed concurrently when 'recursive' is True
 
         Returns
         -------
         list : All files in the remote directory, or an empty list if no files exist
 
         """
+        recursive = recursive if recursive in BOOLEANS else False
+        if recursive:
+            return [x.filename for x in self._walk(remote_dir, max_workers)]
+
         with self.ssh.open_sftp() as ftp:
             ftp.chdir(remote_dir)
-            dir_list = ftp.listdir_attr(remote_dir)
+            dir_list = self._listdir_attr(ftp, remote_dir)
 
         file_list = []
         if len(dir_list) > 0:
-            file_list = [x.filename for x in dir_list if not stat.S_ISDIR(x.st_mode)]
+            file_list = [x.filename for x in dir_list]
 
         return file_list
 
+    def _download_file(
+        self,
+        ftp: paramiko.SFTPClient,
+        remote_dir: str,
+        local_dir: str,
+        local_archive_dir: str,
+        filename: str,
+        delete_ftp: bool,
+        write_log: bool,
+        extract_bundles: bool = False,
+        append: bool = False,
+        verify_append: bool = False,
+        recorder: result_recorder = None
+    ) -> bool:
+        """Class function to download a single file, skipped if it already exists locally or in the local archive
+
+        'filename' may be a "/" separated path relative to 'remote_dir', the same structure is created under 'local_dir'.
+        With 'extract_bundles', a bundle is read as a stream and its content extracted next to where it would be saved.
+        With 'append', a file that already exists locally is brought up to date with '_append_file' instead of skipped.
+        The outcome is handed to 'recorder' if provided
+
+        Returns
+        -------
+        bool : Whether or not the file was downloaded
+
+        """
+        started = time.monotonic()
+        recorder = result_recorder(None) if recorder is None else recorder
+        remote_file = os.path.join(remote_dir, filename).replace('\\', '/')
+        local_name = filename.replace(posixpath.sep, os.sep)
+        local_file = os.path.join(local_dir, local_name)
+        if os.path.isfile(os.path.join(local_archive_dir, local_name)):
+            recorder.record(filename, local_file, 0, started, 'skipped')
+            return False
+        if os.path.isfile(local_file):
+            size = os.path.getsize(local_file)
+            if not append or not self._append_file(ftp, remote_file, local_file, verify_append):
+                recorder.record(filename, local_file, 0, started, 'skipped')
+                return False
+            if write_log:
+                self._writelog('GET', remote_dir, local_dir, filename)
+            if delete_ftp:
+                self._remove(ftp, remote_file)
+            recorder.record(filename, local_file, max(os.path.getsize(local_file) - size, 0), started, 'success')
+            return True
+
+        if not os.path.isdir(os.path.dirname(local_file)):
+            os.makedirs(os.path.dirname(local_file))
+
+        extract = extract_bundles and bundle_format(filename) is not None
+        extract_list = []
+        try:
+            if extract:
+                with ftp.open(remote_file, 'rb') as rf:
+                    rf.prefetch()
+                    extract_list = extract_bundle(rf, filename, os.path.dirname(local_file))
+            else:
+                ftp.get(remote_file, local_file, callback=paramiko_callback(self.throttle))
+        except BaseException as e:
+            if not extract and os.path.isfile(local_file):
+                os.remove(local_file)  # a partial copy would be skipped as already downloaded by the next run
+            if not isinstance(e, Exception):
+                raise
+            logging.error(f"unable to download '{remote_file}'|{e}")
+            recorder.record(filename, local_file, 0, started, 'failed', e)
+            return False
+
+        if write_log:
+            self._writelog('GET', remote_dir, local_dir, filename)
+        if delete_ftp:
+            self._remove(ftp, remote_file)
+
+        if extract:
+            extract_dir = os.path.dirname(local_file)
+            nbytes = sum(os.path.getsize(os.path.join(extract_dir, f.replace(posixpath.sep, os.sep))) for f in extract_list)
+        else:
+            nbytes = os.path.getsize(local_file)
+        recorder.record(filename, local_file, nbytes, started, 'success')
+        return True
+
+    def _append_file(self, ftp: paramiko.SFTPClient, remote_file: str, local_file: str, verify: bool) -> bool:
+        """Class function to append the bytes a remote file gained since it was last downloaded to the local copy
+
+        The size of the local file is taken as the number of bytes already downloaded and only the tail past it is
+        read, with an offset read. A remote file that shrank, or whose already-downloaded part no longer matches when
+        'verify' is True, was rewritten and is downloaded again in full
+
+        Returns
+        -------
+        bool : Whether or not the local file changed
+
+        """
+        local_size = os.path.getsize(local_file)
+        try:
+            remote_size = ftp.stat(remote_file).st_size
+            if remote_size == local_size:
+                return False
+
+            if remote_size < local_size or (verify and not self._prefix_matches(ftp, remote_file, local_file, local_size)):
+                logging.warning(f"remote file '{remote_file}' was rewritten, downloading it again")
+                ftp.get(remote_file, f'{local_file}.part', callback=paramiko_callback(self.throttle))
+                os.replace(f'{local_file}.part', local_file)
+                return True
+
+            with ftp.open(remote_file, 'rb') as rf, open(local_file, 'ab') as lf:
+                rf.seek(local_size)
+                rf.prefetch(remote_size)
+                remaining = remote_size - local_size  # bytes appended after the stat are left for the next download
+                while remaining > 0:
+                    chunk = rf.read(min(transfer_constants.COPY_BUFSIZE, remaining))
+                    if not chunk:
+                        break
+                    lf.write(chunk)
+                    remaining -= len(chunk)
+                    if self.throttle is not None:
+                        self.throttle(len(chunk))
+        except Exception as e:
+            logging.error(f"unable to append to '{local_file}' from '{remote_file}'|{e}")
+            if os.path.isfile(f'{local_file}.part'):
+                os.remove(f'{local_file}.part')
+            if os.path.getsize(local_file) > local_size:
+                with open(local_file, 'r+b') as lf:
+                    lf.truncate(local_size)
+            return False
+
+        return True
+
+    def _prefix_matches(self, ftp: paramiko.SFTPClient, remote_file: str, local_file: str, length: int) -> bool:
+        """Class function to determine if the first 'length' bytes of a remote file still match the local file
+
+        The SHA-256 of the whole prefix is computed by the server where it supports the check-file extension.
+        Otherwise only the last 'APPEND_VERIFY_SIZE' bytes of the prefix are read and compared, which catches a
+        rewritten file without transferring it again
+
+        """
+        if length == 0:
+            return True
+        with ftp.open(remote_file, 'rb') as rf, open(local_file, 'rb') as lf:
+            try:
+                remote_hash = rf.check('sha256', 0, length)
+            except IOError:
+                start = max(0, length - sftp_constants.APPEND_VERIFY_SIZE)
+                rf.seek(start)
+                lf.seek(start)
+                return rf.read(length - start) == lf.read(length - start)
+
+            local_hash = hashlib.sha256()
+            remaining = length
+            while remaining > 0:
+                chunk = lf.read(min(transfer_constants.COPY_BUFSIZE, remaining))
+                if not chunk:
+                    break
+                local_hash.update(chunk)
+                remaining -= len(chunk)
+            return remote_hash == local_hash.digest()
+
+    def _read_hash_manifest(self, ftp: paramiko.SFTPClient, remote_dir: str, hash_manifest: str) -> dict:
+        """Class function to read a remote hash manifest, returning an empty dict if it does not exist"""
+        try:
+            with ftp.open(posixpath.join(remote_dir, hash_manifest), 'rb') as mf:
+                return parse_hash_manifest(mf.read().decode('utf-8'))
+        except FileNotFoundError:
+            return {}
+
+    def _write_hash_manifest(self, ftp: paramiko.SFTPClient, remote_dir: str, hash_manifest: str, hashes: dict):
+        """Class function to add file hashes to a remote hash manifest, keeping the entries of files uploaded earlier"""
+        all_hashes = self._read_hash_manifest(ftp, remote_dir, hash_manifest)
+        all_hashes.update(hashes)
+        with self._stream_put(ftp, remote_dir, hash_manifest) as mf:
+            mf.write(format_hash_manifest(all_hashes).encode('utf-8'))
+
+    def _remote_hash_function(self, ftp: paramiko.SFTPClient, remote_dir: str):
+        """Class function to build a function returning the SHA-256 of a file in 'remote_dir' computed by the server
+
+        Uses the check-file extension; once the server refuses it the function returns None without asking again
+
+        """
+        supported = [True]
+
+        def remote_hash(filename: str) -> str:
+            if not supported[0]:
+                return None
+            try:
+                with ftp.open(posixpath.join(remote_dir, filename), 'rb') as rf:
+                    return rf.check('sha256').hex()
+            except IOError:
+                supported[0] = False
+                return None
+
+        return remote_hash
+
+    def _download_stream(
+        self,
+        ftp: paramiko.SFTPClient,
+        remote_dir: str,
+        local_dir: str,
+        local_archive_dir: str,
+        remote_files: list,
+        suppress_list: list,
+        qualifies,
+        delete_ftp: bool,
+        write_log: bool,
+        extract_bundles: bool = False,
+        append: bool = False,
+        verify_append: bool = False,
+        recorder: result_recorder = None
+    ) -> list:
+        """Class function to download files while the remote directory is still being listed
+
+        The listing is read incrementally with 'listdir_iter' on 'ftp' and selected file names are handed through a
+        bounded queue to a worker transferring on a second SFTP channel, so memory use does not depend on the size of
+        the directory and the first transfer starts as soon as the first matching entry arrives
+
+        """
+        file_queue = queue.Queue(maxsize=transfer_constants.STREAM_QUEUE_SIZE)
+        stop_event = threading.Event()
+        worker_errors = []
+        success_list = []
+
+        def worker():
+            f = ''
+            try:
+                with self.ssh.open_sftp() as transfer_ftp:
+                    while True:
+                        f = file_queue.get()
+                        if f is None:
+                            break
+                        if self._download_file(
+                            transfer_ftp, remote_dir, local_dir, local_archive_dir, f, delete_ftp, write_log, extract_bundles, append,
+                            verify_append, recorder
+                        ):
+                            success_list.append(f)
+                        if stop_event.is_set():
+                            break
+            except BaseException as e:
+                worker_errors.append(e)
+            finally:
+                stop_event.set()
+                while f is not None:
+                    f = file_queue.get()  # drain so the lister is never left blocked on a full queue
+
+        worker_thread = threading.Thread(target=worker, name=f'{sftp_constants.MODULE_NAME}-stream', daemon=True)
+        worker_thread.start()
+        matched = set()
+        try:
+            for attr in ftp.listdir_iter(remote_dir, read_aheads=transfer_constants.STREAM_READ_AHEADS):
+                if stop_event.is_set():
+                    break
+                if stat.S_ISDIR(attr.st_mode):
+                    continue
+                if is_selected(attr.filename, remote_files, suppress_list, matched):
+                    if qualifies is None or qualifies(attr):
+                        file_queue.put(attr.filename)
+        except BaseException:
+            stop_event.set()
+            raise
+        finally:
+            file_queue.put(None)
+            worker_thread.join()
+
+        if len(worker_errors) > 0:
+            if not isinstance(worker_errors[0], Exception):
+                raise worker_errors[0]  # i.e. a cancelled transfer
+            err_msg = f"streaming download from '{remote_dir}' failed|{worker_errors[0]}"
+            logging.critical(err_msg)
+            raise RuntimeError(err_msg) from worker_errors[0]
+
+        log_unmatched(remote_files, matched, 'download', remote_dir)
+
+        return success_list
+
+    def _use_bulk(self, bulk: bool) -> bool:
+        """Class function to determine if a bulk transfer can be used, logging why not if it was requested"""
+        bulk = bulk if bulk in BOOLEANS else False
+        if bulk and not self.allow_exec:
+            logging.info(f"profile '{self.name}' does not allow exec, transferring files individually")
+            return False
+        return bulk
+
+    def _download_bulk(self, remote_dir: str, local_dir: str, local_archive_dir: str, file_list: list, write_log: bool) -> list:
+        """Class function to download many files as a single tar stream over an SSH exec channel
+
+        The remote tar reads the (null separated) file names from stdin and its output is unpacked on the fly, so the
+        per-file open/read/close round trips of SFTP are avoided. Only regular files named in 'file_list' are written,
+        skipping files that already exist locally or in the local archive. Files missing from the stream, i.e. because
+        tar is not available remotely, are left for the caller to transfer per file
+
+        Parameters
+        ----------
+        remote_dir : str
+            Remote directory the names in 'file_list' are relative to, relative paths start from the login directory
+
+        Returns
+        -------
+        list : the files downloaded
+
+        """
+        wanted = set()
+        for f in file_list:
+            local_name = f.replace(posixpath.sep, os.sep)
+            if not os.path.isfile(os.path.join(local_dir, local_name)) and not os.path.isfile(os.path.join(local_archive_dir, local_name)):
+                wanted.add(f)
+        if len(wanted) == 0:
+            return []
+
+        success_list = []
+        chan = self.ssh.get_transport().open_session()
+        try:
+            chan.exec_command(sftp_constants.TAR_CREATE.format(remote_dir=shlex.quote(remote_dir)))
+
+            def send_names():
+                # separate thread, the remote tar starts writing before it has read every name
+                try:
+                    for f in file_list:
+                        if f in wanted:
+                            chan.sendall(f'{f}\0'.encode('utf-8'))
+                finally:
+                    chan.shutdown_write()
+
+            sender = threading.Thread(target=send_names, name=f'{sftp_constants.MODULE_NAME}-bulk', daemon=True)
+            sender.start()
+            with tarfile.open(fileobj=chan.makefile('rb'), mode='r|') as tf:
+                for member in tf:
+                    if not member.isfile() or member.name not in wanted:
+                        continue
+                    local_file = os.path.join(local_dir, member.name.replace(posixpath.sep, os.sep))
+                    if not os.path.isdir(os.path.dirname(local_file)):
+                        os.makedirs(os.path.dirname(local_file))
+                    try:
+                        with tf.extractfile(member) as src, open(local_file, 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                    except BaseException:
+                        if os.path.isfile(local_file):
+                            os.remove(local_file)
+                        raise
+                    success_list.append(member.name)
+                    if write_log:
+                        self._writelog('GET', remote_dir, local_dir, member.name)
+            sender.join()
+
+            exit_status = chan.recv_exit_status()
+            if exit_status != 0:
+                err_text = chan.makefile_stderr('rb').read().decode('utf-8', errors='replace').strip()
+                logging.error(f"bulk download from '{remote_dir}' exited with status {exit_status}|{err_text}")
+        except (tarfile.TarError, paramiko.SSHException, OSError) as e:
+            logging.error(f"bulk download from '{remote_dir}' failed|{e}")
+        finally:
+            chan.close()
+
+        return success_list
+
+    def _session(self, remote_dir: str) -> paramiko.SFTPClient:
+        """Class function to open a new SFTP channel in 'remote_dir', to be used as a context manager"""
+        ftp = self.ssh.open_sftp()
+        try:
+            ftp.chdir(remote_dir)
+        except BaseException:
+            ftp.close()
+            raise
+        return ftp
+
+    @contextlib.contextmanager
+    def _stream_put(self, ftp: paramiko.SFTPClient, remote_dir: str, filename: str):
+        """Class function to open a remote file for streamed writing, a partially written file is removed on failure"""
+        remote_file = posixpath.join(remote_dir, filename)
+        try:
+            with ftp.open(remote_file, 'wb') as rf:
+                rf.set_pipelined(True)
+                yield rf
+        except BaseException:
+            try:
+                ftp.remove(remote_file)
+            except IOError:
+                pass
+            raise
+        finally:
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, remote_dir)
+
+    def _upload_bundle(self, ftp: paramiko.SFTPClient, remote_dir: str, local_dir: str, bundle: str, file_list: list) -> bool:
+        """Class function to upload files packed into a single compressed bundle, written straight into the remote file
+
+        Returns
+        -------
+        bool : Whether or not the bundle was uploaded, a partially written bundle is removed
+
+        """
+        try:
+            with self._stream_put(ftp, remote_dir, bundle) as rf:
+                write_bundle(rf, bundle, local_dir, file_list)
+        except Exception as e:
+            logging.error(f"unable to upload bundle '{bundle}' to '{remote_dir}'|{e}")
+            return False
+
+        return True
+
+    def _upload_bulk(self, ftp: paramiko.SFTPClient, remote_dir: str, local_dir: str, file_list: list) -> list:
+        """Class function to upload many files as a single tar stream over an SSH exec channel
+
+        The tar stream is written as the local files are read and unpacked by a remote tar. The result is verified with
+        one listing of 'remote_dir', only files whose remote size and modification time (kept by tar) match are
+        reported as uploaded. Nothing is reported if the stream failed or the remote tar did not exit cleanly, as a
+        remote file left from an earlier upload could match, so the caller uploads every file individually instead
+
+        Parameters
+        ----------
+        remote_dir : str
+            Remote directory to unpack the files into, relative paths start from the login directory
+
+        Returns
+        -------
+        list : the files uploaded
+
+        """
+        completed = False
+        chan = self.ssh.get_transport().open_session()
+        try:
+            chan.exec_command(sftp_constants.TAR_EXTRACT.format(remote_dir=shlex.quote(remote_dir)))
+            with chan.makefile('wb') as cf:
+                with tarfile.open(fileobj=cf, mode='w|', format=tarfile.PAX_FORMAT) as tf:
+                    for f in file_list:
+                        tf.add(os.path.join(local_dir, f), arcname=f, recursive=False)
+            chan.shutdown_write()
+
+            exit_status = chan.recv_exit_status()
+            if exit_status != 0:
+                err_text = chan.makefile_stderr('rb').read().decode('utf-8', errors='replace').strip()
+                logging.error(f"bulk upload to '{remote_dir}' exited with status {exit_status}|{err_text}")
+            completed = exit_status == 0
+        except (tarfile.TarError, paramiko.SSHException, OSError) as e:
+            logging.error(f"bulk upload to '{remote_dir}' failed|{e}")
+        finally:
+            chan.close()
+            LISTING_CACHE.invalidate(sftp_constants.MODULE_NAME, self.name, remote_dir)
+
+        if not completed:
+            return []
+
+        remote_attrs = {x.filename: x for x in self._listdir_attr(ftp, remote_dir)}
+        success_list = []
+        for f in file_list:
+            local_stat = os.stat(os.path.join(local_dir, f))
+            attr = remote_attrs.get(f)
+            # SFTP reports whole seconds, tar restores the modification time from the stream
+            if attr is not None and attr.st_size == local_stat.st_size and attr.st_mtime == int(local_stat.st_mtime):
+                success_list.append(f)
+            else:
+                logging.warning(f"bulk upload of '{f}' to '{remote_dir}' could not be confirmed, uploading it individually")
+        return success_list
+
+    @METRICS.timed('sftp.download')
     def download(
         self,
         remote_dir: str = None,
@@ -277,7 +1116,22 @@ class sftp:
         remote_files: list | str = None,
         suppress_override: list | str = None,
         delete_ftp: bool = True,
-        write_log: bool = False
+        write_log: bool = False,
+        stream: bool = False,
+        recursive: bool = False,
+        max_workers: int = transfer_constants.WALK_WORKERS,
+        min_age: float | dt.timedelta = None,
+        max_age: float | dt.timedelta = None,
+        min_size: int = None,
+        newer_than: float | dt.datetime = None,
+        remote_archive_dir: str = None,
+        bulk: bool = False,
+        extract_bundles: bool = False,
+        append: bool = False,
+        verify_append: bool = False,
+        verify: bool = False,
+        hash_manifest: str = None,
+        concurrency: int | str = 1
     ) -> list:
         """Download files from an SFTP
 
@@ -295,21 +1149,89 @@ class sftp:
             Indicator if files should be deleted from the SFTP after download is completed
         write_log : bool, optional (default False)
             Indicator if files downloaded should be written to a log file
+        stream : bool, optional (default False)
+            Indicator if transfers should start while the remote directory is still being listed. Intended for very
+            large directories; the listing cache is bypassed and files are returned in listing order
+        recursive : bool, optional (default False)
+            Indicator if files in all subdirectories should be downloaded too. 'remote_files' and the suppress list are
+            matched against paths relative to 'remote_dir' (i.e. "2024/*.csv") and the directory structure is kept locally
+        max_workers : int, optional (default 4)
+            Number of subdirectories listed concurrently when 'recursive' is True
+        min_age : float or datetime.timedelta, optional (default None)
+            Only download files last modified at least this many seconds ago, i.e. to skip files still being written
+        max_age : float or datetime.timedelta, optional (default None)
+            Only download files last modified at most this many seconds ago
+        min_size : int, optional (default None)
+            Only download files of at least this many bytes
+        newer_than : float or datetime.datetime, optional (default None)
+            Only download files last modified after this point in time, given as a datetime or seconds since the epoch
+        remote_archive_dir : str, optional (default None)
+            Remote directory to move files into after download is completed, relative to 'remote_dir' unless absolute.
+            Files are moved with server-side renames, so no data is sent back. Takes precedence over 'delete_ftp'
+        bulk : bool, optional (default False)
+            Indicator if the selected files should be transferred as a single tar stream over an SSH exec channel,
+            which is much faster for many small files. Only used if 'self.allow_exec' is True, files the stream fails
+            to deliver are downloaded individually
+        extract_bundles : bool, optional (default False)
+            Indicator if downloaded bundles (.zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz) should be extracted into
+            'local_dir' as they are read instead of being saved. Files already present locally are not overwritten
+        append : bool, optional (default False)
+            Indicator if files that already exist locally should be brought up to date when the remote copy has grown,
+            fetching only the new bytes and appending them. A remote file smaller than the local copy is downloaded
+            again. Intended for files a partner appends to throughout the day, usually with 'delete_ftp' False
+        verify_append : bool, optional (default False)
+            Indicator if the part already downloaded should be compared with the remote file before appending, so a
+            rewritten file is downloaded again in full. Uses a server-side SHA-256 where the server supports it,
+            otherwise compares the last 64 KB of the downloaded part
+        verify : bool, optional (default False)
+            Indicator if downloaded files should be checked against the remote size and, where the server supports the
+            check-file extension, a SHA-256 computed remotely. Files failing a check are removed locally and are
+            neither deleted nor archived remotely
+        hash_manifest : str, optional (default None)
+            Name of a SHA-256 manifest in 'remote_dir' (sha256sum format) to verify downloaded files against. The
+            manifest itself is not downloaded. Local hashes are computed in a thread pool while transfers continue
+        concurrency : int or str, optional (default 1)
+            Number of SFTP channels downloading files at the same time, or "auto" to ramp the number up and down with
+            the measured throughput, per-file latency and error rate, starting from the level remembered for the
+            profile. Not used when 'stream' is True
 
         Returns
         -------
-        list : the basename of the files downloaded
+        list : the basename of the files downloaded, or their relative path if 'recursive' is True
 
         Raises
         ------
         FileNotFoundError
-            If 'local_dir' does not exist
+            If 'local_dir' or 'remote_archive_dir' does not exist
+        NotImplementedError
+            If 'stream' is True along with 'recursive' or 'bulk'
+        TypeError
+            If 'min_age', 'max_age', 'min_size' or 'newer_than' is not of an accepted type
+        ValueError
+            If 'concurrency' is neither a positive integer nor "auto"
 
         """
         remote_dir = self.remote_in if remote_dir is None else remote_dir
         local_dir = self.local_in if local_dir is None else local_dir
         delete_ftp = delete_ftp if delete_ftp in BOOLEANS else False
         write_log = write_log if write_log in BOOLEANS else False
+        stream = stream if stream in BOOLEANS else False
+        recursive = recursive if recursive in BOOLEANS else False
+        bulk = self._use_bulk(bulk)
+        extract_bundles = extract_bundles if extract_bundles in BOOLEANS else False
+        append = append if append in BOOLEANS else False
+        verify_append = verify_append if verify_append in BOOLEANS else False
+        verify = verify if verify in BOOLEANS else False
+        tuner = concurrency_tuner(sftp_constants.MODULE_NAME, self.name, concurrency, self.config_file)
+
+        if stream and recursive:
+            err_msg = 'streaming is only supported for a single remote directory'
+            logging.critical(err_msg)
+            raise NotImplementedError(err_msg)
+        if stream and bulk:
+            err_msg = 'streaming is not supported for bulk transfers'
+            logging.critical(err_msg)
+            raise NotImplementedError(err_msg)
 
         if not os.path.isdir(local_dir):
             err_msg = f"local directory '{local_dir} does not exist"
@@ -323,75 +1245,192 @@ class sftp:
         suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
         suppress_override = suppress_override if isinstance(suppress_override, list) else []
         suppress_list = self.suppress_in if len(suppress_override) == 0 else suppress_override
+        if hash_manifest is not None:
+            suppress_list = suppress_list + [hash_manifest]
+
+        qualifies = attribute_filter(min_age, max_age, min_size, newer_than)
+        local_archive_dir = os.path.join(local_dir, get_config('archiveDirName', self.config_file))
+
+        if remote_archive_dir is not None:
+            delete_ftp = False
+
+        # when checking files, deleting and logging wait until the checks have passed
+        check_files = verify or hash_manifest is not None
+        file_delete = delete_ftp and not check_files
+        file_log = write_log and not check_files
+        progress = progress_tracker(progress_callback(self.track_progress))
+        recorder = result_recorder(self.on_result, defer=check_files, progress=progress, metric='sftp.download', profile=self.name)
 
         success_list = []
-        with self.ssh.open_sftp() as ftp:
+        with (
+            self.ssh.open_sftp() as ftp,
+            concurrent.futures.ThreadPoolExecutor(max_workers=transfer_constants.HASH_WORKERS) as hash_pool,
+            progress.watch(self)
+        ):
             ftp.chdir(remote_dir)
-            dir_list = [f.filename for f in ftp.listdir_attr(remote_dir) if not stat.S_ISDIR(f.st_mode)]
-            suppress_items = []
-            if len(remote_files) == 0:
-                # no specific files passed, figure it out within the script
-                # do not need separate handling of suppress_list because it's just a list iterable
-                for f in dir_list:
-                    for item in suppress_list:
-                        if fnmatch.fnmatch(f, item):
-                            suppress_items.append(f)
-                download_files = [x for x in dir_list if x not in suppress_items]
+            if remote_archive_dir is not None:
+                # renames are sent as raw requests, which do not go through the client-side working directory
+                remote_archive_dir = posixpath.join(ftp.getcwd(), remote_archive_dir)
+                try:
+                    ftp.stat(remote_archive_dir)
+                except FileNotFoundError:
+                    err_msg = f"remote archive directory '{remote_archive_dir}' does not exist"
+                    logging.critical(err_msg)
+                    raise FileNotFoundError(err_msg)
+
+            hash_futures = {}
+
+            def hash_local(f: str):
+                local_file = os.path.join(local_dir, f.replace(posixpath.sep, os.sep))
+                if check_files and os.path.isfile(local_file):
+                    hash_futures[f] = hash_pool.submit(sha256_file, local_file)
+
+            attr_list = {}
+            if stream:
+                success_list = self._download_stream(
+                    ftp, remote_dir, local_dir, local_archive_dir, remote_files, suppress_list, qualifies, file_delete, file_log,
+                    extract_bundles, append, verify_append, recorder
+                )
+                for f in success_list:
+                    hash_local(f)
             else:
-                # specific files/wildcards provided, bypass config parameters
-                download_list = []
-                for include_file in remote_files:
-                    match_found = False
-                    for f in dir_list:
-                        if fnmatch.fnmatch(f, include_file):
-                            download_list.append(f)
-                            match_found = True
-                    if not match_found:
-                        logging.info(f"unable to download '{include_file}', file or pattern does not exist in '{remote_dir}'")
-
-                # pull out the files to suppress
-                if len(suppress_list) != 0:
-                    for f in download_list:
-                        for item in suppress_list:
-                            if fnmatch.fnmatch(f, item):
-                                suppress_items.append(f)
-                download_files = [x for x in download_list if x not in suppress_items]
-
-            tot_ct = len(download_files)
-            for ctr, f in enumerate(download_files):
-                remote_file = os.path.join(remote_dir, f).replace('\\', '/')
-                local_file = os.path.join(local_dir, f)
-                archive_dir_name = get_config('archiveDirName', self.config_file)
-                local_file_archive = os.path.join(local_dir, archive_dir_name, f)
-                if not os.path.isfile(local_file):
-                    if not os.path.isfile(local_file_archive):
-                        success = True
-                        try:
-                            ftp.get(remote_file, local_file)
-                        except Exception as e:
-                            success = False
-                            logging.error(f"unable to download '{remote_file}'|{e}")
+                if recursive:
+                    attr_list = {f.filename: f for f in self._walk(remote_dir, max_workers)}
+                else:
+                    attr_list = {f.filename: f for f in self._listdir_attr(ftp, remote_dir)}
+                download_files = select_files(list(attr_list), remote_files, suppress_list, 'download', remote_dir)
+                if qualifies is not None:
+                    download_files = [f for f in download_files if qualifies(attr_list[f])]
+                progress.expect(download_files, {f: attr_list[f].st_size for f in download_files})
 
-                        if success:
+                bulk_list = set()
+                if bulk:
+                    bulk_files = [f for f in download_files if not extract_bundles or bundle_format(f) is None]
+                    started = time.monotonic()
+                    bulk_list = set(self._download_bulk(remote_dir, local_dir, local_archive_dir, bulk_files, file_log))
+                    for f in download_files:
+                        if f in bulk_list:
+                            hash_local(f)
+                            local_file = os.path.join(local_dir, f.replace(posixpath.sep, os.sep))
+                            recorder.record(f, local_file, os.path.getsize(local_file), started, 'success')
+                    if file_delete:
+                        self._remove_many(ftp, ftp.getcwd(), [f for f in download_files if f in bulk_list])
+
+                if tuner.autotune or tuner.level > 1:
+                    def needs_download(f: str) -> bool:
+                        local_name = f.replace(posixpath.sep, os.sep)
+                        local_file = os.path.join(local_dir, local_name)
+                        if os.path.isfile(os.path.join(local_archive_dir, local_name)):
+                            return False
+                        return not os.path.isfile(local_file) or (append and os.path.getsize(local_file) != attr_list[f].st_size)
+
+                    def transfer(session: paramiko.SFTPClient, f: str) -> bool:
+                        if not self._download_file(
+                            session, remote_dir, local_dir, local_archive_dir, f, file_delete, file_log, extract_bundles, append,
+                            verify_append, recorder
+                        ):
+                            return False
+                        hash_local(f)
+                        return True
+
+                    pending_files = []
+                    for f in download_files:
+                        if f in bulk_list:
+                            continue
+                        if needs_download(f):
+                            pending_files.append(f)
+                        else:
+                            recorder.record(f, os.path.join(local_dir, f.replace(posixpath.sep, os.sep)), 0, time.monotonic(), 'skipped')
+
+                    parallel_list = set(parallel_transfer(
+                        pending_files, self.ssh.open_sftp, transfer, lambda f: attr_list[f].st_size or 0, tuner
+                    ))
+                    success_list = [f for f in download_files if f in bulk_list or f in parallel_list]
+                else:
+                    for f in download_files:
+                        if f in bulk_list:
                             success_list.append(f)
-                            if write_log:
-                                self._writelog('GET', remote_dir, local_dir, f)
-                            if delete_ftp:
-                                ftp.remove(remote_file)
+                        elif self._download_file(
+                            ftp, remote_dir, local_dir, local_archive_dir, f, file_delete, file_log, extract_bundles, append,
+                            verify_append, recorder
+                        ):
+                            success_list.append(f)
+                            hash_local(f)
+
+            if check_files:
+                expected_hashes = {} if hash_manifest is None else self._read_hash_manifest(ftp, ftp.getcwd(), hash_manifest)
+                expected_sizes = {f: attr_list[f].st_size for f in success_list if f in attr_list} if verify else {}
+                remote_hash = self._remote_hash_function(ftp, ftp.getcwd()) if verify else None
+                verified_list = verify_files(local_dir, success_list, hash_futures, expected_sizes, expected_hashes, remote_hash)
+                for f in success_list:
+                    if f not in verified_list:
+                        os.remove(os.path.join(local_dir, f.replace(posixpath.sep, os.sep)))
+                success_list = verified_list
+                recorder.release(success_list)
+
+                if write_log:
+                    for f in success_list:
+                        self._writelog('GET', remote_dir, local_dir, f)
+                if delete_ftp:
+                    self._remove_many(ftp, ftp.getcwd(), success_list)
 
-                if self.track_progress:
-                    if (ctr + 1) % 100 == 0:
-                        logging.info(f'{ctr + 1} files processed out of {tot_ct}')
+            if remote_archive_dir is not None:
+                self._archive(ftp, ftp.getcwd(), remote_archive_dir, success_list)
 
         return success_list
 
+    def pending_uploads(self, local_dir: str = None, local_files: list | str = None, suppress_override: list | str = None) -> list:
+        """Select the files an upload would send, without connecting to the SFTP
+
+        Parameters
+        ----------
+        local_dir : str, optional (default None)
+            Local directory to upload files from. Will use 'self.local_out' if not provided
+        local_files : list or str, optional (default None)
+            Specific files or wildcard names to upload. Will use all files in 'local_dir' if not provided
+        suppress_override : list or str, optional (default None)
+            Specific files or wildcard names to suppress from upload. Will use all 'self.suppress_out' if not provided
+
+        Returns
+        -------
+        list : the basename of the files that would be uploaded
+
+        Raises
+        ------
+        FileNotFoundError
+            If 'local_dir' does not exist
+
+        """
+        local_dir = self.local_out if local_dir is None else local_dir
+        if not os.path.isdir(local_dir):
+            err_msg = f"local directory '{local_dir} does not exist"
+            logging.critical(err_msg)
+            raise FileNotFoundError(err_msg)
+
+        # validate variables and make sure they the proper data type
+        local_files = [local_files] if isinstance(local_files, str) else local_files
+        local_files = local_files if isinstance(local_files, list) else []
+
+        suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
+        suppress_override = suppress_override if isinstance(suppress_override, list) else []
+        suppress_list = self.suppress_out if len(suppress_override) == 0 else suppress_override
+
+        directory_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
+        return select_files(directory_list, local_files, suppress_list, 'upload', local_dir.replace(os.sep, posixpath.sep))
+
+    @METRICS.timed('sftp.upload')
     def upload(
             self,
             remote_dir: str = None,
             local_dir: str = None,
             local_files: list | str = None,
             suppress_override: list | str = None,
-            write_log: bool = False
+            write_log: bool = False,
+            bulk: bool = False,
+            bundle: str = None,
+            verify: bool = False,
+            hash_manifest: str = None,
+            concurrency: int | str = 1
     ) -> list:
         """Upload files to an SFTP
 
@@ -407,6 +1446,26 @@ class sftp:
             Specific files or wildcard names to suppress from upload. Will use all 'self.suppress_out' if not provided
         write_log : bool, optional (default False)
             Indicator if files uploaded should be written to a log file
+        bulk : bool, optional (default False)
+            Indicator if the selected files should be transferred as a single tar stream over an SSH exec channel,
+            which is much faster for many small files. Only used if 'self.allow_exec' is True, files the stream fails
+            to deliver are uploaded individually
+        bundle : str, optional (default None)
+            Name of a single compressed bundle to pack the selected files into, written to 'remote_dir' as it is built.
+            The extension determines the format: .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz. Takes precedence over
+            'bulk'. No file is reported as uploaded if the bundle fails
+        verify : bool, optional (default False)
+            Indicator if uploaded files should be checked against a SHA-256 computed by the server, where it supports
+            the check-file extension. Remote copies failing the check are removed and the local file is not archived.
+            Remote sizes are always confirmed. Ignored if 'bundle' is provided
+        hash_manifest : str, optional (default None)
+            Name of a SHA-256 manifest (sha256sum format) to write to 'remote_dir' after the files, keeping the entries
+            of files uploaded earlier. Local hashes are computed in a thread pool while transfers continue. Ignored if
+            'bundle' is provided
+        concurrency : int or str, optional (default 1)
+            Number of SFTP channels uploading files at the same time, or "auto" to ramp the number up and down with
+            the measured throughput, per-file latency and error rate, starting from the level remembered for the
+            profile. Not used for files sent with 'bulk' or 'bundle'
 
         Returns
         -------
@@ -416,84 +1475,346 @@ class sftp:
         ------
         FileNotFoundError
             If 'local_dir' does not exist
+        ValueError
+            If the extension of 'bundle' is not a supported bundle format
+            If 'concurrency' is neither a positive integer nor "auto"
 
         """
         remote_dir = self.remote_out if remote_dir is None else remote_dir
         local_dir = self.local_out if local_dir is None else local_dir
         write_log = write_log if write_log in BOOLEANS else False
+        bulk = self._use_bulk(bulk)
+        verify = verify if verify in BOOLEANS else False
+        if bundle is not None:
+            check_bundle_format(bundle)
+        tuner = concurrency_tuner(sftp_constants.MODULE_NAME, self.name, concurrency, self.config_file)
+
+        upload_files = self.pending_uploads(local_dir, local_files, suppress_override)
+        success_list = []
+        if len(upload_files) > 0:
+            archive_dir_name = get_config('archiveDirName', self.config_file)
+            local_dir_archive = os.path.join(local_dir, archive_dir_name)
+            check_files = (verify or hash_manifest is not None) and bundle is None
+            progress = progress_tracker(progress_callback(self.track_progress))
+            progress.expect(upload_files, {f: os.path.getsize(os.path.join(local_dir, f)) for f in upload_files})
+            recorder = result_recorder(self.on_result, defer=check_files, progress=progress, metric='sftp.upload', profile=self.name)
+
+            def finish(f: str):
+                if write_log:
+                    self._writelog('PUT', remote_dir, local_dir, f)
+
+                if os.path.isdir(local_dir_archive):
+                    archive_name = os.path.join(local_dir_archive, f)
+                    os.rename(os.path.join(local_dir, f), archive_name)
+
+            def remote_name(f: str) -> str:
+                # ensure a trailing path separator exists
+                return remote_dir + posixpath.sep + f if remote_dir[-1] != posixpath.sep else remote_dir + f
+
+            with (
+                self.ssh.open_sftp() as ftp,
+                concurrent.futures.ThreadPoolExecutor(max_workers=transfer_constants.HASH_WORKERS) as hash_pool,
+                progress.watch(self)
+            ):
+                ftp.chdir(remote_dir)
+                hash_futures = {}
+                if check_files:
+                    # hashing runs alongside the transfers below
+                    hash_futures = {f: hash_pool.submit(sha256_file, os.path.join(local_dir, f)) for f in upload_files}
+                bulk_list = set()
+                started = time.monotonic()
+                if bundle is not None:
+                    if not self._upload_bundle(ftp, remote_dir, local_dir, bundle, upload_files):
+                        for f in upload_files:
+                            recorder.record(f, remote_name(bundle), 0, started, 'failed', f"bundle '{bundle}' failed")
+                        return success_list
+                    bulk_list = set(upload_files)
+                elif bulk:
+                    bulk_list = set(self._upload_bulk(ftp, remote_dir, local_dir, upload_files))
+                for f in upload_files:
+                    if f in bulk_list:
+                        remote_file = remote_name(f) if bundle is None else remote_name(bundle)
+                        recorder.record(f, remote_file, os.path.getsize(os.path.join(local_dir, f)), started, 'success')
+
+                if tuner.autotune or tuner.level > 1:
+                    def transfer(session: paramiko.SFTPClient, f: str) -> bool:
+                        started = time.monotonic()
+                        try:
+                            attr = self._put(session, os.path.join(local_dir, f), remote_name(f))
+                        except Exception as e:
+                            recorder.record(f, remote_name(f), 0, started, 'failed', e)
+                            raise
+                        recorder.record(f, remote_name(f), attr.st_size or 0, started, 'success')
+                        return True
+
+                    parallel_list = set(parallel_transfer(
+                        [f for f in upload_files if f not in bulk_list], self.ssh.open_sftp, transfer,
+                        lambda f: os.path.getsize(os.path.join(local_dir, f)), tuner
+                    ))
+                    success_list = [f for f in upload_files if f in bulk_list or f in parallel_list]
+                    if not check_files:
+                        for f in success_list:
+                            finish(f)
+                else:
+                    for f in upload_files:
+                        success = True
+                        started = time.monotonic()
+                        try:
+                            if f not in bulk_list:
+                                attr = self._put(ftp, os.path.join(local_dir, f), remote_name(f))
+                                recorder.record(f, remote_name(f), attr.st_size or 0, started, 'success')
+                        except Exception as e:
+                            success = False
+                            logging.error(f"unable to upload '{f} to '{remote_dir}'|{e}")
+                            recorder.record(f, remote_name(f), 0, started, 'failed', e)
+
+                        if success:
+                            success_list.append(f)
+                            if not check_files:
+                                finish(f)
+
+                if check_files:
+                    if verify:
+                        # sizes are already confirmed by the transfer itself
+                        verified_list = verify_files(local_dir, success_list, hash_futures, {}, {}, self._remote_hash_function(ftp, ftp.getcwd()))
+                        for f in success_list:
+                            if f not in verified_list:
+                                self._remove(ftp, posixpath.join(ftp.getcwd(), f))
+                        success_list = verified_list
+                    recorder.release(success_list)
+                    if hash_manifest is not None and len(success_list) > 0:
+                        self._write_hash_manifest(ftp, ftp.getcwd(), hash_manifest, {f: hash_futures[f].result() for f in success_list})
+                    concurrent.futures.wait(hash_futures.values())
+                    for f in success_list:
+                        finish(f)
+
+        return success_list
+
+    @METRICS.timed('sftp.sync')
+    def sync(
+            self,
+            remote_dir: str = None,
+            local_dir: str = None,
+            direction: str = 'down',
+            sync_files: list | str = None,
+            suppress_override: list | str = None,
+            propagate_deletes: bool = False,
+            write_log: bool = False
+    ) -> list:
+        """Incrementally mirror a directory between the SFTP and the local file system
+
+        Files are compared against a manifest persisted at the end of the previous sync, so only new or changed files
+        are transferred. Unlike 'download' and 'upload', source files are never deleted or archived.
+
+        Parameters
+        ----------
+        remote_dir : str, optional (default None)
+            Remote directory to sync. Will use 'self.remote_in' for "down" and 'self.remote_out' for "up" if not provided
+        local_dir : str, optional (default None)
+            Local directory to sync. Will use 'self.local_in' for "down" and 'self.local_out' for "up" if not provided
+        direction : str, optional (default "down")
+            Direction to sync; "down" mirrors the SFTP into 'local_dir', "up" mirrors 'local_dir' onto the SFTP
+        sync_files : list or str, optional (default None)
+            Specific files or wildcard names to sync. Will use all files in the source directory if not provided
+        suppress_override : list or str, optional (default None)
+            Specific files or wildcard names to suppress from the sync. Will use the default suppress list for 'direction' if not provided
+        propagate_deletes : bool, optional (default False)
+            Indicator if files removed from the source since the last sync should also be removed from the destination
+        write_log : bool, optional (default False)
+            Indicator if files transferred or deleted should be written to a log file
+
+        Returns
+        -------
+        list : the basename of the files transferred
+
+        Raises
+        ------
+        ValueError
+            If 'direction' is not "down" or "up"
+        FileNotFoundError
+            If 'local_dir' does not exist
+
+        """
+        if direction not in transfer_constants.SYNC_DIRECTIONS:
+            err_msg = f"invalid sync direction '{direction}', expecting one of {transfer_constants.SYNC_DIRECTIONS}"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+        if direction == 'down':
+            remote_dir = self.remote_in if remote_dir is None else remote_dir
+            local_dir = self.local_in if local_dir is None else local_dir
+        else:
+            remote_dir = self.remote_out if remote_dir is None else remote_dir
+            local_dir = self.local_out if local_dir is None else local_dir
+        propagate_deletes = propagate_deletes if propagate_deletes in BOOLEANS else False
+        write_log = write_log if write_log in BOOLEANS else False
 
         if not os.path.isdir(local_dir):
             err_msg = f"local directory '{local_dir} does not exist"
             logging.critical(err_msg)
             raise FileNotFoundError(err_msg)
 
-        # validate variables and make sure they the proper data type
-        local_files = [local_files] if isinstance(local_files, str) else local_files
-        local_files = local_files if isinstance(local_files, list) else []
+        sync_files = [sync_files] if isinstance(sync_files, str) else sync_files
+        sync_files = sync_files if isinstance(sync_files, list) else []
 
         suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
         suppress_override = suppress_override if isinstance(suppress_override, list) else []
-        suppress_list = self.suppress_out if len(suppress_override) == 0 else suppress_override
+        default_suppress = self.suppress_in if direction == 'down' else self.suppress_out
+        suppress_list = default_suppress if len(suppress_override) == 0 else suppress_override
 
-        directory_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
-        suppress_items = []
-        if len(local_files) == 0:
-            # no specific files passed, figure it out within the script
-            # do not need separate handling of suppress_list because it's just a list iterable
-            for f in directory_list:
-                for item in suppress_list:
-                    if fnmatch.fnmatch(f, item):
-                        suppress_items.append(f)
-            upload_files = [x for x in directory_list if x not in suppress_items]
-        else:
-            # specific files/wildcards provided, bypass config parameters
-            upload_list = []
-            for include_file in local_files:
-                match_found = False
-                for f in directory_list:
-                    if fnmatch.fnmatch(f, include_file):
-                        upload_list.append(f)
-                        match_found = True
-                if not match_found:
-                    logging.info(f"unable to upload '{include_file}', file or pattern does not exist in '{local_dir.replace(os.sep, posixpath.sep)}'")
-
-            # pull out the files to suppress
-            if len(suppress_list) != 0:
-                for f in upload_list:
-                    for item in suppress_list:
-                        if fnmatch.fnmatch(f, item):
-                            suppress_items.append(f)
-            upload_files = [x for x in upload_list if x not in suppress_items]
+        mf = manifest(sftp_constants.MODULE_NAME, self.name, self.config_file)
+        key = mf.key(direction, remote_dir, local_dir)
+        recorded = list(mf.entries(key))
+
+        progress = progress_tracker(progress_callback(self.track_progress))
+        recorder = result_recorder(self.on_result, progress=progress, metric='sftp.sync', profile=self.name)
 
         success_list = []
-        tot_ct = len(upload_files)
-        if tot_ct > 0:
-            archive_dir_name = get_config('archiveDirName', self.config_file)
-            local_dir_archive = os.path.join(local_dir, archive_dir_name)
-            with self.ssh.open_sftp() as ftp:
-                ftp.chdir(remote_dir)
-                for ctr, f in enumerate(upload_files):
-                    success = True
-                    lf = os.path.join(local_dir, f)
-                    uf = remote_dir + posixpath.sep + f if remote_dir[-1] != posixpath.sep else remote_dir + f  # ensure a trailing path separator exists
+        with self.ssh.open_sftp() as ftp, progress.watch(self):
+            remote_attrs = {f.filename: f for f in self._listdir_attr(ftp, remote_dir)}
+            local_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
+            if direction == 'down':
+                source_list = select_files(list(remote_attrs), sync_files, suppress_list, 'sync', remote_dir)
+            else:
+                source_list = select_files(local_list, sync_files, suppress_list, 'sync', local_dir.replace(os.sep, posixpath.sep))
+            if direction == 'down':
+                progress.expect(source_list, {f: remote_attrs[f].st_size for f in source_list})
+            else:
+                progress.expect(source_list, {f: os.path.getsize(os.path.join(local_dir, f)) for f in source_list})
+
+            for f in source_list:
+                started = time.monotonic()
+                remote_file = posixpath.join(remote_dir, f)
+                local_file = os.path.join(local_dir, f)
+                remote_sig = remote_signature(remote_attrs.get(f))
+                local_sig = local_signature(local_file)
+                target = local_file if direction == 'down' else remote_file
+                if mf.is_unchanged(key, f, remote_sig, local_sig):
+                    recorder.record(f, target, 0, started, 'skipped')
+                else:
                     try:
-                        ftp.put(lf, uf)
+                        if direction == 'down':
+                            ftp.get(remote_file, f'{local_file}.part', callback=paramiko_callback(self.throttle))
+                            os.replace(f'{local_file}.part', local_file)
+                            local_sig = local_signature(local_file)
+                        else:
+                            remote_sig = remote_signature(self._put(ftp, local_file, remote_file))
                     except Exception as e:
-                        success = False
-                        logging.error(f"unable to upload '{f} to '{remote_dir}'|{e}")
-
-                    if self.track_progress:
-                        if (ctr + 1) % 100 == 0:
-                            logging.info(f'{ctr + 1} files processed out of {tot_ct}')
-
-                    if success:
+                        logging.error(f"unable to sync '{f}' between '{remote_dir}' and '{local_dir}'|{e}")
+                        if os.path.isfile(f'{local_file}.part'):
+                            os.remove(f'{local_file}.part')
+                        recorder.record(f, target, 0, started, 'failed', e)
+                    else:
+                        mf.update(key, f, remote_sig, local_sig)
                         success_list.append(f)
-
                         if write_log:
-                            self._writelog('PUT', remote_dir, local_dir, f)
+                            self._writelog('GET' if direction == 'down' else 'PUT', remote_dir, local_dir, f)
+                        recorder.record(f, target, os.path.getsize(local_file), started, 'success')
+
+            # anything recorded at the last sync that is no longer at the source has been deleted since
+            source_names = remote_attrs if direction == 'down' else local_list
+            for f in [x for x in recorded if x not in source_names]:
+                if propagate_deletes:
+                    try:
+                        if direction == 'down':
+                            if os.path.isfile(os.path.join(local_dir, f)):
+                                os.remove(os.path.join(local_dir, f))
+                        else:
+                            self._remove(ftp, posixpath.join(remote_dir, f))
+                    except FileNotFoundError:
+                        pass  # already gone from the destination
+                    except Exception as e:
+                        logging.error(f"unable to propagate delete of '{f}'|{e}")
+                        continue
+                    if write_log:
+                        self._writelog('DELETE', remote_dir, local_dir, f)
+                mf.discard(key, f)
 
-                        if os.path.isdir(local_dir_archive):
-                            archive_name = os.path.join(local_dir_archive, f)
-                            os.rename(lf, archive_name)
+        mf.save()
 
         return success_list
+
+    def iter_download(self, *args, **kwargs):
+        """Iterator counterpart of 'download', taking the same arguments and yielding a transfer.file_result per file
+
+        The download runs on a background thread and each result is yielded as soon as its file is final, so the caller
+        can start on a file (i.e. decrypt it) while the rest of the batch is still downloading. Skipped and failed
+        files are yielded too, see 'status'. With 'verify' or 'hash_manifest' successful files are only yielded once
+        every check has run. Leaving the loop early stops the download at its next chunk
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, in completion order
+
+        """
+        return iterate_results(self, 'download', *args, **kwargs)
+
+    def iter_upload(self, *args, **kwargs):
+        """Iterator counterpart of 'upload', taking the same arguments and yielding a transfer.file_result per file
+
+        The upload runs on a background thread and each result is yielded as soon as its file is on the server. Failed
+        files are yielded too, see 'status'. With 'verify' or 'hash_manifest' successful files are only yielded once
+        every check has run. Leaving the loop early stops the upload at its next chunk
+
+        Yields
+        ------
+        transfer.file_result : the outcome of each file, in completion order
+
+        """
+        return iterate_results(self, 'upload', *args, **kwargs)
+
+    async def download_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'download', taking the same arguments and returning the same list
+
+        Runs on the shared transfer thread pool (transfer.ASYNC_RUNNER), which limits how many transfers run at once
+        and runs calls on this object one after the other. Cancelling the awaiting task stops the transfer at its next
+        chunk and removes the partially downloaded file
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the download may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the download did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'download', *args, timeout=timeout, **kwargs)
+
+    async def upload_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'upload', taking the same arguments and returning the same list
+
+        Runs on the shared transfer thread pool (transfer.ASYNC_RUNNER), which limits how many transfers run at once
+        and runs calls on this object one after the other. Cancelling the awaiting task stops the transfer at its next
+        chunk, a partially written remote file may be left behind and is overwritten by the next upload
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the upload may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the upload did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'upload', *args, timeout=timeout, **kwargs)
+
+    async def sync_async(self, *args, timeout: float = None, **kwargs) -> list:
+        """Asyncio counterpart of 'sync', taking the same arguments and returning the same list
+
+        Parameters
+        ----------
+        timeout : float, optional (default None)
+            Most seconds the sync may take once it has started, no limit if not provided
+
+        Raises
+        ------
+        TimeoutError
+            If the sync did not finish within 'timeout'
+
+        """
+        return await ASYNC_RUNNER.run(self, 'sync', *args, timeout=timeout, **kwargs)
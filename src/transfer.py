@@ -0,0 +1,1481 @@
+import asyncio
+import calendar
+import collections
+import concurrent.futures
+import contextlib
+import datetime as dt
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import queue
+import re
+import shutil
+import stat
+import tarfile
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+
+from . import BOOLEANS
+from .metrics import METRICS
+from .misc import get_config
+
+
+class transfer_constants:
+    """A class for constants necessary for the transfer module"""
+    MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+    MANIFEST_EXTENSION = '.manifest.json'
+    SYNC_DIRECTIONS = ['down', 'up']
+    STREAM_QUEUE_SIZE = 256  # most file names held between listing and transfer when streaming
+    STREAM_READ_AHEADS = 50  # outstanding directory read requests when streaming a listing
+    WALK_WORKERS = 4  # default number of channels listing subdirectories concurrently
+    BUNDLE_FORMATS = {'.tar': 'tar', '.tar.bz2': 'bz2', '.tar.gz': 'gz', '.tar.xz': 'xz', '.tgz': 'gz', '.zip': 'zip'}
+    BUNDLE_SPOOL_SIZE = 64 * 1024 * 1024  # zip bundles read from a non-seekable stream are held in memory up to this size
+    COPY_BUFSIZE = 1024 * 1024
+    FANOUT_QUEUE_SIZE = 16  # most chunks read ahead of the slowest destination in a fan-out upload
+    HASH_WORKERS = 4  # threads hashing local files while transfers continue, hashlib releases the GIL on large buffers
+    CONCURRENCY_EXTENSION = '.concurrency.json'
+    MAX_CONCURRENCY = 8  # most parallel channels or connections an autotuned transfer ramps up to
+    TUNING_SAMPLE_FILES = 4  # fewest files measured before the concurrency level is reconsidered
+    TUNING_GAIN = 0.05  # relative throughput change treated as a real improvement or loss rather than noise
+    TUNING_ERROR_RATE = 0.1  # share of failed files in a sample above which the concurrency level is halved
+    TUNING_LATENCY_FACTOR = 2.0  # growth of the mean per-file duration treated as a sign of server side throttling
+    ASYNC_TRANSFERS = 8  # transfers run at the same time for asyncio callers, further calls wait their turn
+    RESULT_STATUSES = ['success', 'skipped', 'failed']
+    RESULT_QUEUE_SIZE = 1024  # most file results held for a slow consumer before the transfers wait
+    PROGRESS_INTERVAL = 1.0  # fewest seconds between two byte count updates sent to a progress callback
+    PROGRESS_LOG_FILES = 100  # files processed between two progress log lines
+    PROGRESS_LOG_INTERVAL = 60.0  # most seconds between two progress log lines while bytes keep moving
+
+
+class remote_file:
+    """Minimal set of attributes for a remote file, mirroring the names used by paramiko.SFTPAttributes
+
+    Attributes
+    ----------
+    filename : str
+        Name of the file, relative to the directory it was listed from
+    st_size : int
+        Size of the file in bytes, None if unknown
+    st_mtime : int
+        Last modification time of the file as seconds since the epoch, None if unknown
+    st_mode : int
+        File mode bits, used to distinguish directories from regular files
+
+    """
+    __slots__ = ('filename', 'st_size', 'st_mtime', 'st_mode')
+
+    def __init__(self, filename: str, st_size: int = None, st_mtime: int = None, is_dir: bool = False):
+        self.filename = filename
+        self.st_size = st_size
+        self.st_mtime = st_mtime
+        self.st_mode = stat.S_IFDIR if is_dir else stat.S_IFREG
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.filename!r}, {self.st_size}, {self.st_mtime})'
+
+
+class file_result:
+    """Outcome of a single file in a batch, yielded by the iterator variants of the transfer and pgp methods
+
+    Attributes
+    ----------
+    name : str
+        Name of the file as selected, relative to the source directory
+    path : str
+        Location of the file produced; the local file for downloads and pgp, the remote file for uploads
+    bytes : int
+        Number of bytes moved or written, 0 if nothing was
+    duration : float
+        Seconds spent on the file
+    status : str
+        "success", "skipped" if there was nothing to do (i.e. the file already exists locally) or "failed"
+    error : str
+        Reason the file failed, None otherwise
+
+    """
+    __slots__ = ('name', 'path', 'bytes', 'duration', 'status', 'error')
+
+    def __init__(self, name: str, path: str, nbytes: int, duration: float, status: str, error: str = None):
+        self.name = name
+        self.path = path
+        self.bytes = nbytes
+        self.duration = duration
+        self.status = status
+        self.error = error
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r}, {self.status!r}, {self.bytes}, {self.duration:.3f})'
+
+
+class transfer_progress:
+    """Snapshot of a running batch, handed to the progress callback of sftp, ftp and pgp methods
+
+    Attributes
+    ----------
+    kind : str
+        "bytes" for a periodic update while data moves, "file" when a file is done and "done" once at the end
+    files_done : int
+        Number of files processed so far, including skipped and failed files
+    files_total : int
+        Number of files selected, None if not known up front (i.e. a streamed listing)
+    bytes_done : int
+        Number of bytes moved so far, including files still in progress
+    bytes_total : int
+        Number of bytes expected to move, None if the sizes are not known up front
+    errors : int
+        Number of files that failed
+    elapsed : float
+        Seconds since the batch started
+    result : file_result
+        The file just done for "file" events, None otherwise
+
+    """
+    __slots__ = ('kind', 'files_done', 'files_total', 'bytes_done', 'bytes_total', 'errors', 'elapsed', 'result')
+
+    def __init__(
+        self, kind: str, files_done: int, files_total: int, bytes_done: int, bytes_total: int, errors: int, elapsed: float,
+        result: file_result = None
+    ):
+        self.kind = kind
+        self.files_done = files_done
+        self.files_total = files_total
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.errors = errors
+        self.elapsed = elapsed
+        self.result = result
+
+    @property
+    def mb_per_second(self) -> float:
+        """Average throughput of the batch so far in MB (10^6 bytes) per second"""
+        return self.bytes_done / self.elapsed / 1e6 if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds until the batch is done, from the remaining bytes if known or else the remaining files"""
+        if self.bytes_total is not None and self.bytes_done > 0:
+            return max(self.bytes_total - self.bytes_done, 0) * self.elapsed / self.bytes_done
+        if self.files_total is not None and self.files_done > 0:
+            return max(self.files_total - self.files_done, 0) * self.elapsed / self.files_done
+        return None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.kind!r}, {self.files_done}/{self.files_total}, {self.bytes_done}/{self.bytes_total})'
+
+
+class progress_logger:
+    """Default progress callback, logging a line every PROGRESS_LOG_FILES files or PROGRESS_LOG_INTERVAL seconds"""
+    def __init__(self):
+        self._logged = time.monotonic()
+
+    def __call__(self, progress: transfer_progress):
+        now = time.monotonic()
+        if progress.kind == 'file' and progress.files_done % transfer_constants.PROGRESS_LOG_FILES != 0:
+            return
+        if progress.kind == 'bytes' and now - self._logged < transfer_constants.PROGRESS_LOG_INTERVAL:
+            return
+        if progress.kind == 'done' and progress.files_done == 0:
+            return
+        self._logged = now
+
+        total = '' if progress.files_total is None else f' out of {progress.files_total}'
+        eta = progress.eta
+        eta = '' if eta is None or progress.kind == 'done' else f', ETA {eta:.0f} s'
+        logging.info(
+            f'{progress.files_done} files processed{total}, {progress.bytes_done / 1e6:.1f} MB at {progress.mb_per_second:.2f} MB/s, '
+            f'{progress.errors} errors{eta}'
+        )
+
+
+def progress_callback(track_progress):
+    """Return the progress callback for a 'track_progress' setting; a new progress_logger for True, None for False"""
+    if callable(track_progress):
+        return track_progress
+    return progress_logger() if track_progress is True else None
+
+
+class progress_tracker:
+    """Keeps the running totals of a batch and hands transfer_progress snapshots to a callback, thread-safe
+
+    Bytes are counted per chunk through the client's 'throttle' hook while 'watch' is active, and settled against the
+    size of each file once it is done, so files written without chunks (i.e. bulk transfers) are counted as well.
+    Byte updates are sent at most every 'interval' seconds, file events for every file. Without a callback every call
+    returns immediately and no hook is installed
+
+    """
+    def __init__(self, callback, interval: float = transfer_constants.PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.files_total = None
+        self.bytes_total = None
+        self.files_done = 0
+        self.bytes_done = 0
+        self.errors = 0
+        self._sizes = {}
+        self._in_flight = {}  # bytes counted per thread for the file it is working on
+        self._started = time.monotonic()
+        self._updated = self._started
+        self._lock = threading.Lock()
+
+    def expect(self, file_list: list, sizes: dict = None):
+        """Set the files selected for the batch, with their sizes in bytes if known"""
+        if self.callback is None:
+            return
+        with self._lock:
+            self.files_total = len(file_list)
+            if sizes is not None:
+                self._sizes = {f: sizes.get(f) or 0 for f in file_list}
+                self.bytes_total = sum(self._sizes.values())
+
+    def _snapshot(self, kind: str, result: file_result = None) -> transfer_progress:
+        return transfer_progress(
+            kind, self.files_done, self.files_total, self.bytes_done, self.bytes_total, self.errors,
+            time.monotonic() - self._started, result
+        )
+
+    def add(self, nbytes: int):
+        """Count bytes moved for the file the calling thread is working on"""
+        now = time.monotonic()
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.bytes_done += nbytes
+            self._in_flight[thread_id] = self._in_flight.get(thread_id, 0) + nbytes
+            if now - self._updated < self.interval:
+                return
+            self._updated = now
+            progress = self._snapshot('bytes')
+        self.callback(progress)
+
+    def file_done(self, result: file_result):
+        """Count a file as processed, settling the bytes counted for it against its size"""
+        if self.callback is None:
+            return
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += result.bytes - self._in_flight.pop(threading.get_ident(), 0)
+            if result.status != 'success' and self.bytes_total is not None:
+                self.bytes_total -= self._sizes.get(result.name, 0) - result.bytes  # no longer expected to move
+            if result.status == 'failed':
+                self.errors += 1
+            progress = self._snapshot('file', result)
+        self.callback(progress)
+
+    def file_failed(self, name: str):
+        """Count a file reported as done as failed after all, i.e. when a later verification rejects it"""
+        if self.callback is None:
+            return
+        with self._lock:
+            self.errors += 1
+
+    @contextlib.contextmanager
+    def watch(self, client):
+        """Count the bytes moved by 'client' while active, sending the final "done" event on exit"""
+        if self.callback is None:
+            yield self
+            return
+        previous = client.throttle
+
+        def counter(nbytes: int):
+            self.add(nbytes)
+            if previous is not None:
+                previous(nbytes)
+
+        client.throttle = counter
+        try:
+            yield self
+        finally:
+            client.throttle = previous
+            with self._lock:
+                progress = self._snapshot('done')
+            self.callback(progress)
+
+
+class result_recorder:
+    """Hands the result of each file in a batch to a callback, a progress_tracker and the run metrics, thread-safe
+
+    With 'defer', successful files are held back from the callback until 'release' is called with the files that
+    passed verification, so a consumer never sees a file as done before it is final. The tracker counts every file as
+    soon as it is processed. Without a callback, tracker or metrics every call returns immediately
+
+    """
+    def __init__(self, callback, defer: bool = False, progress: progress_tracker = None, metric: str = None, profile: str = None):
+        self.callback = callback
+        self.defer = defer
+        self.progress = progress if progress is not None and progress.callback is not None else None
+        self.metric = metric if METRICS.enabled else None
+        self.profile = profile
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def _meter(self, result: file_result):
+        if self.metric is not None:
+            METRICS.record_file(self.metric, result.status, result.bytes, result.duration, profile=self.profile)
+
+    def record(self, name: str, path: str, nbytes: int, started: float, status: str, error=None):
+        """Record the outcome of a file, 'started' being the time.monotonic() value taken before it was processed"""
+        if self.callback is None and self.progress is None and self.metric is None:
+            return
+        result = file_result(name, path, nbytes, time.monotonic() - started, status, None if error is None else str(error))
+        if self.progress is not None:
+            self.progress.file_done(result)
+        if self.defer and status == 'success':
+            with self._lock:
+                self._held[name] = result
+        else:
+            self._meter(result)
+            if self.callback is not None:
+                self.callback(result)
+
+    def release(self, verified: list):
+        """Hand over the results held back, files missing from 'verified' are reported as failed"""
+        if self.callback is None and self.progress is None and self.metric is None:
+            return
+        verified = set(verified)
+        with self._lock:
+            held, self._held = self._held, {}
+        for name, result in held.items():
+            if name not in verified:
+                result.status, result.error = 'failed', 'verification failed'
+                if self.progress is not None:
+                    self.progress.file_failed(name)
+            self._meter(result)
+            if self.callback is not None:
+                self.callback(result)
+
+
+class listing_cache:
+    """Thread-safe cache of remote directory listings, shared by every instance in the process
+
+    Listings are keyed by module, profile and remote directory, so separate connections to the same profile share
+    entries. Each lookup supplies its own time-to-live, entries older than that are treated as missing.
+
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(remote_dir: str) -> str:
+        return remote_dir.rstrip(posixpath.sep) or posixpath.sep
+
+    def get(self, module_name: str, profile_name: str, remote_dir: str, kind: str, ttl: float) -> list:
+        """Return a copy of a cached listing, or None if it is missing or older than 'ttl' seconds"""
+        if not ttl:
+            return None
+        key = (module_name, profile_name, self._normalize(remote_dir), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > ttl:
+                del self._entries[key]
+                return None
+            return list(entry[1])
+
+    def put(self, module_name: str, profile_name: str, remote_dir: str, kind: str, listing: list):
+        """Store a listing"""
+        key = (module_name, profile_name, self._normalize(remote_dir), kind)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(listing))
+
+    def invalidate(self, module_name: str, profile_name: str, remote_dir: str = None):
+        """Drop every cached listing of a remote directory, or of the whole profile if 'remote_dir' is not provided"""
+        remote_dir = None if remote_dir is None else self._normalize(remote_dir)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == module_name and k[1] == profile_name]:
+                if remote_dir is None or key[2] == remote_dir:
+                    del self._entries[key]
+
+
+LISTING_CACHE = listing_cache()
+
+
+def parse_mlsd_time(value: str) -> int:
+    """Convert an MLSD 'modify' fact (YYYYMMDDHHMMSS[.sss], always UTC) into seconds since the epoch"""
+    if not value:
+        return None
+    try:
+        return calendar.timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]), int(value[8:10]), int(value[10:12]), int(value[12:14])))
+    except ValueError:
+        return None
+
+
+def select_files(file_list: list, include_files: list, suppress_list: list, action: str, location: str) -> list:
+    """Apply the standard include/suppress wildcard rules to a list of file names
+
+    Parameters
+    ----------
+    file_list : list
+        All candidate file names
+    include_files : list
+        Specific files or wildcard names to keep. All files in 'file_list' are candidates if empty
+    suppress_list : list
+        Specific files or wildcard names to exclude
+    action : str
+        Verb used in the log message when an item of 'include_files' matches nothing (i.e. "download")
+    location : str
+        Location used in the log message when an item of 'include_files' matches nothing
+
+    Returns
+    -------
+    list : the file names selected, in the same order the original upload/download logic produced them
+
+    """
+    suppress_items = []
+    if len(include_files) == 0:
+        # no specific files passed, figure it out within the script
+        # do not need separate handling of suppress_list because it's just a list iterable
+        for f in file_list:
+            for item in suppress_list:
+                if fnmatch.fnmatch(f, item):
+                    suppress_items.append(f)
+        return [x for x in file_list if x not in suppress_items]
+
+    # specific files/wildcards provided, bypass config parameters
+    selected_list = []
+    for include_file in include_files:
+        match_found = False
+        for f in file_list:
+            if fnmatch.fnmatch(f, include_file):
+                selected_list.append(f)
+                match_found = True
+        if not match_found:
+            logging.info(f"unable to {action} '{include_file}', file or pattern does not exist in '{location}'")
+
+    # pull out the files to suppress
+    if len(suppress_list) != 0:
+        for f in selected_list:
+            for item in suppress_list:
+                if fnmatch.fnmatch(f, item):
+                    suppress_items.append(f)
+    return [x for x in selected_list if x not in suppress_items]
+
+
+def is_selected(filename: str, include_files: list, suppress_list: list, matched: set = None) -> bool:
+    """Apply the standard include/suppress wildcard rules to a single file name
+
+    Streaming counterpart of 'select_files', for when the full list of candidates is never held at once
+
+    Parameters
+    ----------
+    filename : str
+        File name to test
+    include_files : list
+        Specific files or wildcard names to keep. Every file is a candidate if empty
+    suppress_list : list
+        Specific files or wildcard names to exclude
+    matched : set, optional (default None)
+        Items of 'include_files' that have matched a file so far, updated in place
+
+    Returns
+    -------
+    bool : Whether or not the file is selected
+
+    """
+    if len(include_files) > 0:
+        hits = [item for item in include_files if fnmatch.fnmatch(filename, item)]
+        if len(hits) == 0:
+            return False
+        if matched is not None:
+            matched.update(hits)
+
+    return not any(fnmatch.fnmatch(filename, item) for item in suppress_list)
+
+
+def log_unmatched(include_files: list, matched: set, action: str, location: str):
+    """Log the items of 'include_files' that never matched a file, using the same message as 'select_files'"""
+    for include_file in include_files:
+        if include_file not in matched:
+            logging.info(f"unable to {action} '{include_file}', file or pattern does not exist in '{location}'")
+
+
+def attribute_filter(
+        min_age: float | dt.timedelta = None,
+        max_age: float | dt.timedelta = None,
+        min_size: int = None,
+        newer_than: float | dt.datetime = None
+):
+    """Build a predicate selecting remote files by the attributes returned with a directory listing
+
+    Parameters
+    ----------
+    min_age : float or datetime.timedelta, optional (default None)
+        Only accept files last modified at least this many seconds ago, i.e. to skip files still being written
+    max_age : float or datetime.timedelta, optional (default None)
+        Only accept files last modified at most this many seconds ago
+    min_size : int, optional (default None)
+        Only accept files of at least this many bytes
+    newer_than : float or datetime.datetime, optional (default None)
+        Only accept files last modified after this point in time, given as a datetime or seconds since the epoch
+
+    Returns
+    -------
+    function : takes a listing entry (paramiko.SFTPAttributes or remote_file) and returns whether it qualifies,
+        or None if no filter was requested. Entries missing an attribute a filter needs never qualify
+
+    Raises
+    ------
+    TypeError
+        If any filter is not of an accepted type
+
+    """
+    def seconds(value, name):
+        if value is None:
+            return None
+        if isinstance(value, dt.timedelta):
+            return value.total_seconds()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        raise TypeError(f"invalid filter '{name}': {value}")
+
+    min_age = seconds(min_age, 'min_age')
+    max_age = seconds(max_age, 'max_age')
+    if isinstance(newer_than, dt.datetime):
+        newer_than = newer_than.timestamp()
+    else:
+        newer_than = seconds(newer_than, 'newer_than')
+    if min_size is not None and (not isinstance(min_size, int) or isinstance(min_size, bool)):
+        raise TypeError(f"invalid filter 'min_size': {min_size}")
+
+    if min_age is None and max_age is None and min_size is None and newer_than is None:
+        return None
+
+    def qualifies(attr) -> bool:
+        if min_size is not None and (attr.st_size is None or attr.st_size < min_size):
+            return False
+        if min_age is None and max_age is None and newer_than is None:
+            return True
+        if attr.st_mtime is None:
+            return False
+        age = time.time() - attr.st_mtime
+        if min_age is not None and age < min_age:
+            return False
+        if max_age is not None and age > max_age:
+            return False
+        if newer_than is not None and attr.st_mtime <= newer_than:
+            return False
+        return True
+
+    return qualifies
+
+
+def bundle_format(filename: str) -> str:
+    """Return the bundle format of a file name based on its extension ("zip", "tar", "gz", "bz2" or "xz"), or None"""
+    lower_name = filename.lower()
+    for extension, fmt in transfer_constants.BUNDLE_FORMATS.items():
+        if lower_name.endswith(extension):
+            return fmt
+    return None
+
+
+def check_bundle_format(bundle_name: str) -> str:
+    """Return the bundle format of a file name, raising ValueError if its extension is not a supported bundle format"""
+    fmt = bundle_format(bundle_name)
+    if fmt is None:
+        err_msg = f"unsupported bundle format '{bundle_name}', expected one of {', '.join(transfer_constants.BUNDLE_FORMATS)}"
+        logging.critical(err_msg)
+        raise ValueError(err_msg)
+    return fmt
+
+
+def write_bundle(fileobj, bundle_name: str, local_dir: str, file_list: list):
+    """Write local files into a compressed bundle, streaming into a writable file object
+
+    Each file is read and compressed in chunks straight into 'fileobj', no copy of the files or of the bundle is staged
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Writable binary stream the bundle is written to, does not need to be seekable (i.e. an open remote file or socket)
+    bundle_name : str
+        Name of the bundle, its extension determines the format
+    local_dir : str
+        Local directory the names in 'file_list' are relative to
+    file_list : list
+        Files to add, stored under the same names in the bundle
+
+    Raises
+    ------
+    ValueError
+        If the extension of 'bundle_name' is not a supported bundle format
+
+    """
+    fmt = check_bundle_format(bundle_name)
+
+    if fmt == 'zip':
+        with zipfile.ZipFile(fileobj, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for f in file_list:
+                zf.write(os.path.join(local_dir, f), arcname=f)
+    else:
+        with tarfile.open(fileobj=fileobj, mode=f"w|{'' if fmt == 'tar' else fmt}", format=tarfile.PAX_FORMAT) as tf:
+            for f in file_list:
+                tf.add(os.path.join(local_dir, f), arcname=f, recursive=False)
+
+
+def extract_bundle(fileobj, bundle_name: str, local_dir: str) -> list:
+    """Extract the regular files of a bundle into a local directory, streaming from a readable file object
+
+    Tar bundles are read strictly sequentially. Zip bundles keep their index at the end, so a non-seekable 'fileobj' is
+    first spooled to a temporary file (in memory up to 'BUNDLE_SPOOL_SIZE'). Members with absolute paths or parent
+    directory references are never written, members that already exist locally are skipped
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Readable binary stream of the bundle (i.e. an open remote file or socket)
+    bundle_name : str
+        Name of the bundle, its extension determines the format
+    local_dir : str
+        Local directory to extract into, subdirectories in the bundle are kept
+
+    Returns
+    -------
+    list : the bundle members extracted, as "/" separated paths
+
+    Raises
+    ------
+    ValueError
+        If the extension of 'bundle_name' is not a supported bundle format
+
+    """
+    fmt = check_bundle_format(bundle_name)
+
+    def extract_member(name: str, src) -> bool:
+        member_name = posixpath.normpath(name.replace('\\', posixpath.sep))
+        if posixpath.isabs(member_name) or member_name.split(posixpath.sep)[0] == '..' or re.match(r'^[a-zA-Z]:', member_name):
+            logging.error(f"skipping unsafe member '{name}' of bundle '{bundle_name}'")
+            return False
+        local_file = os.path.join(local_dir, member_name.replace(posixpath.sep, os.sep))
+        if os.path.isfile(local_file):
+            logging.info(f"skipping member '{name}' of bundle '{bundle_name}', file already exists in '{local_dir}'")
+            return False
+        if not os.path.isdir(os.path.dirname(local_file)):
+            os.makedirs(os.path.dirname(local_file))
+        try:
+            with open(local_file, 'wb') as lf:
+                shutil.copyfileobj(src, lf)
+        except BaseException:
+            if os.path.isfile(local_file):
+                os.remove(local_file)
+            raise
+        return True
+
+    def extract_zip(zip_file) -> list:
+        extract_list = []
+        with zipfile.ZipFile(zip_file, mode='r') as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info) as src:
+                    if extract_member(info.filename, src):
+                        extract_list.append(posixpath.normpath(info.filename.replace('\\', posixpath.sep)))
+        return extract_list
+
+    if fmt == 'zip':
+        if getattr(fileobj, 'seekable', lambda: False)():
+            return extract_zip(fileobj)
+        with tempfile.SpooledTemporaryFile(max_size=transfer_constants.BUNDLE_SPOOL_SIZE) as spool:
+            shutil.copyfileobj(fileobj, spool)
+            spool.seek(0)
+            return extract_zip(spool)
+
+    extract_list = []
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tf:
+        for member in tf:
+            if not member.isfile():
+                continue
+            with tf.extractfile(member) as src:
+                if extract_member(member.name, src):
+                    extract_list.append(posixpath.normpath(member.name))
+
+    return extract_list
+
+
+def fanout_upload(
+        destinations: list,
+        local_dir: str,
+        local_files: list | str = None,
+        suppress_override: list | str = None,
+        remote_dir: str = None,
+        write_log: bool = False
+) -> dict:
+    """Upload the same local files to several SFTP and FTP profiles at once, reading each file only once
+
+    Every file is read in chunks that are shared by all destinations; each destination writes them on its own thread
+    through a bounded queue, so memory use is limited and the slowest destination sets the pace. A file is moved to the
+    local archive directory (if it exists) only after every destination that selected it has received it successfully
+
+    Parameters
+    ----------
+    destinations : list
+        Connected sftp.sftp and/or ftp.ftp objects, one per profile
+    local_dir : str
+        Local directory to upload files from
+    local_files : list or str, optional (default None)
+        Specific files or wildcard names to upload. Will use all files in 'local_dir' if not provided
+    suppress_override : list or str, optional (default None)
+        Specific files or wildcard names to suppress from upload. Each destination uses its own 'suppress_out' if not provided
+    remote_dir : str, optional (default None)
+        Remote directory to upload files to on every destination. Each destination uses its own 'remote_out' if not provided
+    write_log : bool, optional (default False)
+        Indicator if files uploaded should be written to the log file of each destination
+
+    Returns
+    -------
+    dict : the basename of the files successfully uploaded, keyed by profile name
+
+    Raises
+    ------
+    FileNotFoundError
+        If 'local_dir' does not exist
+
+    """
+    write_log = write_log if write_log in BOOLEANS else False
+    if not os.path.isdir(local_dir):
+        err_msg = f"local directory '{local_dir} does not exist"
+        logging.critical(err_msg)
+        raise FileNotFoundError(err_msg)
+
+    local_files = [local_files] if isinstance(local_files, str) else local_files
+    local_files = local_files if isinstance(local_files, list) else []
+    suppress_override = [suppress_override] if isinstance(suppress_override, str) else suppress_override
+    suppress_override = suppress_override if isinstance(suppress_override, list) else []
+
+    directory_list = [f for f in os.listdir(local_dir) if os.path.isfile(os.path.join(local_dir, f))]
+    candidate_files = select_files(directory_list, local_files, suppress_override, 'upload', local_dir.replace(os.sep, posixpath.sep))
+    targets = {}
+    for dest in destinations:
+        suppress_list = dest.suppress_out if len(suppress_override) == 0 else suppress_override
+        targets[dest.name] = [f for f in candidate_files if is_selected(f, [], suppress_list)]
+
+    file_queues = {dest.name: queue.Queue(maxsize=transfer_constants.FANOUT_QUEUE_SIZE) for dest in destinations}
+    results = {dest.name: {} for dest in destinations}
+
+    def worker(dest):
+        # messages are (file name, None) to start a file, bytes for content, (file name, True/False) to end it,
+        # and None once every file has been sent
+        dest_remote_dir = dest.remote_out if remote_dir is None else remote_dir
+        file_queue = file_queues[dest.name]
+        message = ''
+        try:
+            with dest._session(dest_remote_dir) as session:
+                while True:
+                    message = file_queue.get()
+                    if message is None:
+                        break
+                    filename = message[0]
+                    try:
+                        with dest._stream_put(session, dest_remote_dir, filename) as rf:
+                            message = file_queue.get()
+                            while isinstance(message, bytes):
+                                rf.write(message)
+                                message = file_queue.get()
+                            if not message[1]:
+                                raise IOError('local file could not be read')
+                        results[dest.name][filename] = True
+                        if write_log:
+                            dest._writelog('PUT', dest_remote_dir, local_dir, filename)
+                    except Exception as e:
+                        logging.error(f"unable to upload '{filename} to '{dest_remote_dir}' on '{dest.name}'|{e}")
+                        results[dest.name][filename] = False
+                        while isinstance(message, bytes) or (isinstance(message, tuple) and message[1] is None):
+                            message = file_queue.get()  # skip the rest of the failed file
+        except Exception as e:
+            logging.error(f"fan-out upload to '{dest.name}' failed|{e}")
+        finally:
+            while message is not None:
+                message = file_queue.get()  # drain so the reader is never left blocked on a full queue
+
+    threads = [threading.Thread(target=worker, args=(dest,), name=f'{transfer_constants.MODULE_NAME}-fanout', daemon=True) for dest in destinations]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for f in candidate_files:
+            dest_names = [name for name, file_list in targets.items() if f in file_list]
+            if len(dest_names) == 0:
+                continue
+            for name in dest_names:
+                file_queues[name].put((f, None))
+            read_ok = True
+            try:
+                with open(os.path.join(local_dir, f), 'rb') as lf:
+                    chunk = lf.read(transfer_constants.COPY_BUFSIZE)
+                    while chunk:
+                        for name in dest_names:
+                            file_queues[name].put(chunk)
+                        chunk = lf.read(transfer_constants.COPY_BUFSIZE)
+            except OSError as e:
+                logging.error(f"unable to read '{f}' for upload|{e}")
+                read_ok = False
+            for name in dest_names:
+                file_queues[name].put((f, read_ok))
+    finally:
+        for name in file_queues:
+            file_queues[name].put(None)
+        for thread in threads:
+            thread.join()
+
+    archive_dir = os.path.join(local_dir, get_config('archiveDirName', destinations[0].config_file)) if len(destinations) > 0 else None
+    for f in candidate_files:
+        dest_names = [name for name, file_list in targets.items() if f in file_list]
+        if len(dest_names) > 0 and all(results[name].get(f) for name in dest_names):
+            if archive_dir is not None and os.path.isdir(archive_dir):
+                os.rename(os.path.join(local_dir, f), os.path.join(archive_dir, f))
+
+    return {name: [f for f in targets[name] if results[name].get(f)] for name in targets}
+
+
+def paramiko_callback(throttle):
+    """Return a paramiko progress callback handing 'throttle' the bytes moved since its previous call, None without a throttle"""
+    if throttle is None:
+        return None
+    last = [0]
+
+    def callback(transferred: int, total: int):
+        throttle(transferred - last[0])
+        last[0] = transferred
+
+    return callback
+
+
+def block_callback(throttle, write=None):
+    """Return an ftplib block callback handing 'throttle' the size of each block before passing it on to 'write'
+
+    Returns 'write' itself without a throttle, so untuned transfers are not slowed down by the extra call
+
+    """
+    if throttle is None:
+        return write
+
+    def callback(block: bytes):
+        throttle(len(block))
+        if write is not None:
+            write(block)
+
+    return callback
+
+
+def sha256_file(filename: str) -> str:
+    """Return the hexadecimal SHA-256 digest of a local file, read in chunks"""
+    file_hash = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        chunk = f.read(transfer_constants.COPY_BUFSIZE)
+        while chunk:
+            file_hash.update(chunk)
+            chunk = f.read(transfer_constants.COPY_BUFSIZE)
+    return file_hash.hexdigest()
+
+
+def parse_hash_manifest(text: str) -> dict:
+    """Parse a manifest in the format written by sha256sum ("<digest>  <name>" per line) into {name: digest}"""
+    hashes = {}
+    for line in text.splitlines():
+        parts = line.strip().split(maxsplit=1)
+        if len(parts) == 2 and re.fullmatch(r'[0-9a-fA-F]{64}', parts[0]):
+            hashes[parts[1].lstrip('*')] = parts[0].lower()
+    return hashes
+
+
+def format_hash_manifest(hashes: dict) -> str:
+    """Format {name: digest} as a manifest readable by sha256sum and 'parse_hash_manifest'"""
+    return ''.join(f'{hashes[name]}  {name}\n' for name in sorted(hashes))
+
+
+def verify_files(
+        local_dir: str,
+        file_list: list,
+        hash_futures: dict,
+        expected_sizes: dict,
+        expected_hashes: dict,
+        remote_hash=None
+) -> list:
+    """Check downloaded or uploaded files against every source of truth available for them
+
+    A file fails if its local size differs from 'expected_sizes', or if its SHA-256 differs from 'expected_hashes' or,
+    when the manifest has no entry for it, from 'remote_hash'. Checks without data for a file are skipped, as are files
+    no longer present locally
+
+    Parameters
+    ----------
+    local_dir : str
+        Local directory the names in 'file_list' are relative to
+    file_list : list
+        Files to check
+    hash_futures : dict
+        {name: concurrent.futures.Future} resolving to the local SHA-256 of each file, started while transfers ran
+    expected_sizes : dict
+        {name: size} of the remote files
+    expected_hashes : dict
+        {name: digest} from a hash manifest
+    remote_hash : function, optional (default None)
+        Takes a name and returns the SHA-256 computed by the server, or None if unavailable
+
+    Returns
+    -------
+    list : the files that passed, in the same order as 'file_list'
+
+    """
+    verified_list = []
+    for f in file_list:
+        local_file = os.path.join(local_dir, f.replace(posixpath.sep, os.sep))
+        if not os.path.isfile(local_file):
+            verified_list.append(f)  # nothing left to check, i.e. a bundle that was extracted
+            continue
+        expected_size = expected_sizes.get(f)
+        if expected_size is not None and os.path.getsize(local_file) != expected_size:
+            logging.error(f"verification failed for '{f}', size {os.path.getsize(local_file)} does not match {expected_size}")
+            continue
+
+        expected_hash = expected_hashes.get(f)
+        if expected_hash is None and remote_hash is not None:
+            expected_hash = remote_hash(f)
+        if expected_hash is not None and f in hash_futures:
+            local_hash = hash_futures[f].result()
+            if local_hash != expected_hash:
+                logging.error(f"verification failed for '{f}', SHA-256 {local_hash} does not match {expected_hash}")
+                continue
+
+        verified_list.append(f)
+
+    return verified_list
+
+
+class concurrency_tuner:
+    """Chooses the number of parallel transfer workers from measured throughput, per-file latency and error rate
+
+    The level is adjusted by hill climbing: after every sample of completed files the aggregate throughput is compared
+    to the previous sample, the level keeps moving in the same direction while throughput improves and turns around
+    when it drops or the per-file latency jumps. A sample with too many failures halves the level at once. The level
+    reached is saved per module and profile next to the sync manifests and used as the starting point of the next run
+
+    Attributes
+    ----------
+    filename : str
+        Full path of the file the level is saved to, None if it is not saved
+    level : int
+        Current number of workers allowed to transfer
+    max_level : int
+        Highest level the tuner ramps up to
+    autotune : bool
+        Whether the level is adjusted, a fixed level is used as given otherwise
+
+    """
+    def __init__(
+        self,
+        module_name: str,
+        profile_name: str,
+        concurrency: int | str = 1,
+        config_file: str = None,
+        max_level: int = transfer_constants.MAX_CONCURRENCY
+    ):
+        """Inits concurrency_tuner class
+
+        Parameters
+        ----------
+        module_name : str
+            Name of the module the profile belongs to (i.e. "sftp")
+        profile_name : str
+            Name of the profile transferring
+        concurrency : int or str, optional (default 1)
+            Fixed number of workers, or "auto" to start from the level saved for the profile and adjust it
+        config_file : str, optional (default None)
+            Full path location of library configuration file
+        max_level : int, optional (default 8)
+            Highest level the tuner ramps up to
+
+        Raises
+        ------
+        ValueError
+            If 'concurrency' is neither a positive integer nor "auto"
+
+        """
+        self.autotune = isinstance(concurrency, str) and concurrency.strip().lower() == 'auto'
+        if not self.autotune and (not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1):
+            err_msg = f"invalid concurrency '{concurrency}', expected a positive integer or 'auto'"
+            logging.critical(err_msg)
+            raise ValueError(err_msg)
+
+        self.max_level = max(1, max_level)
+        self.filename = None
+        self.level = 1 if self.autotune else concurrency
+        if self.autotune:
+            tuning_root = get_config('manifestRoot', config_file)
+            if not tuning_root:
+                tuning_root = get_config('logRoot', config_file)
+            self.filename = os.path.join(
+                tuning_root, module_name, f"{re.sub(r'[^a-zA-Z0-9]', '', profile_name)}{transfer_constants.CONCURRENCY_EXTENSION}"
+            )
+            if os.path.isfile(self.filename):
+                try:
+                    with open(self.filename, mode='r', encoding='utf-8') as tf:
+                        self.level = int(json.load(tf).get('level', 1))
+                except (ValueError, TypeError, AttributeError, OSError) as e:
+                    logging.warning(f"ignoring unreadable concurrency file '{self.filename}'|{e}")
+            self.level = min(max(1, self.level), self.max_level)
+
+        self._lock = threading.Lock()
+        self._direction = 1
+        self._previous = None  # (throughput, latency) of the previous sample
+        self._sample = []
+        self._sample_start = time.monotonic()
+
+    def record(self, nbytes: int, seconds: float, ok: bool) -> int:
+        """Record one completed file and return the level to use from now on
+
+        Parameters
+        ----------
+        nbytes : int
+            Number of bytes transferred
+        seconds : float
+            Time the transfer of the file took
+        ok : bool
+            Whether the transfer succeeded
+
+        Returns
+        -------
+        int : the concurrency level
+
+        """
+        if not self.autotune:
+            return self.level
+        with self._lock:
+            self._sample.append((nbytes if ok else 0, seconds, ok))
+            if len(self._sample) >= max(transfer_constants.TUNING_SAMPLE_FILES, 2 * self.level):
+                self._adjust()
+            return self.level
+
+    def _adjust(self):
+        """Move the level based on the current sample and start a new one, called with the lock held"""
+        now = time.monotonic()
+        elapsed = max(now - self._sample_start, 1e-6)
+        throughput = sum(x[0] for x in self._sample) / elapsed
+        durations = [x[1] for x in self._sample if x[2]]
+        latency = sum(durations) / len(durations) if durations else None
+        error_rate = sum(1 for x in self._sample if not x[2]) / len(self._sample)
+
+        old_level = self.level
+        if error_rate > transfer_constants.TUNING_ERROR_RATE:
+            self.level = max(1, self.level // 2)
+            self._direction = 1
+            self._previous = None  # the next sample at the lower level becomes the new baseline
+        elif self._previous is None:
+            self.level += self._direction
+        else:
+            previous_throughput, previous_latency = self._previous
+            throttled = (
+                latency is not None and previous_latency is not None and
+                latency > previous_latency * transfer_constants.TUNING_LATENCY_FACTOR
+            )
+            if throughput > previous_throughput * (1 + transfer_constants.TUNING_GAIN) and not throttled:
+                self.level += self._direction
+            elif throughput < previous_throughput * (1 - transfer_constants.TUNING_GAIN) or throttled:
+                self._direction = -self._direction
+                self.level += self._direction
+        self.level = min(max(1, self.level), self.max_level)
+        if error_rate <= transfer_constants.TUNING_ERROR_RATE:
+            self._previous = (throughput, latency)
+        if self.level != old_level:
+            logging.info(
+                f'concurrency {old_level} -> {self.level}, {throughput / 1048576:.2f} MB/s, '
+                f'{error_rate:.0%} errors{"" if latency is None else f", {latency:.2f}s per file"}'
+            )
+
+        self._sample = []
+        self._sample_start = now
+
+    def save(self):
+        """Write the level reached to disk for the next run, replacing the previous copy atomically"""
+        if self.filename is None:
+            return
+        if not os.path.isdir(os.path.dirname(self.filename)):
+            os.makedirs(os.path.dirname(self.filename))
+        fd, temp_name = tempfile.mkstemp(dir=os.path.dirname(self.filename), suffix='.tmp')
+        with os.fdopen(fd, mode='w', encoding='utf-8') as tf:
+            json.dump({'level': self.level, 'updated': dt.datetime.now().isoformat(timespec='seconds')}, tf, indent=4)
+        os.replace(temp_name, self.filename)
+
+
+def parallel_transfer(file_list: list, open_session, transfer, size_of, tuner: concurrency_tuner) -> list:
+    """Transfer files on several sessions at once, with the number of busy sessions set by a concurrency_tuner
+
+    One thread per possible level is started, each opening its own session the first time it is allowed to work.
+    Threads above the current level wait, so the level can go up and down while the transfer runs. A session that
+    cannot be opened (i.e. the server refuses more connections) counts as an error and its file is handed back
+
+    Parameters
+    ----------
+    file_list : list
+        Files to transfer
+    open_session : callable
+        Called without arguments to open a new session, the result is used as a context manager
+    transfer : callable
+        Called as transfer(session, filename), returns whether the file was transferred. A file that did not need a
+        transfer must be left out of 'file_list', otherwise it is counted as an error
+    size_of : callable
+        Called with a transferred file name to return its size in bytes
+    tuner : concurrency_tuner
+        Decides how many sessions transfer at the same time, the level reached is saved at the end
+
+    Returns
+    -------
+    list : the files transferred, in the order of 'file_list'
+
+    Raises
+    ------
+    RuntimeError
+        If no session could be opened at all
+    BaseException
+        Anything that is not an Exception raised by a transfer (i.e. a cancellation), after every worker stopped
+
+    """
+    pending = collections.deque(file_list)
+    transferred = set()
+    condition = threading.Condition()
+    alive = list(range(tuner.max_level if tuner.autotune else tuner.level))  # a worker may transfer while its rank is below the level
+    state = {'sessions': 0}
+    session_errors = []
+    abort_errors = []
+
+    def next_file(index: int) -> str:
+        with condition:
+            while len(pending) > 0 and alive.index(index) >= tuner.level:
+                condition.wait()
+            f = pending.popleft() if len(pending) > 0 else None
+            condition.notify_all()
+            return f
+
+    def worker(index: int):
+        f = next_file(index)
+        if f is None:
+            return
+        try:
+            session = open_session()
+        except Exception as e:
+            logging.error(f'unable to open transfer session {index + 1}|{e}')
+            with condition:
+                session_errors.append(e)
+                pending.appendleft(f)
+                alive.remove(index)  # the next waiting worker moves up a rank and tries instead
+                tuner.record(0, 0, False)
+                condition.notify_all()
+            return
+        with condition:
+            state['sessions'] += 1
+        with session as s:
+            while f is not None:
+                start = time.monotonic()
+                try:
+                    ok = transfer(s, f)
+                    nbytes = size_of(f) if ok else 0
+                except Exception as e:
+                    logging.error(f"unable to transfer '{f}'|{e}")
+                    ok, nbytes = False, 0
+                except BaseException as e:
+                    with condition:
+                        abort_errors.append(e)
+                        pending.clear()  # the other workers stop after their current file
+                        condition.notify_all()
+                    return
+                seconds = time.monotonic() - start
+                with condition:
+                    if ok:
+                        transferred.add(f)
+                    tuner.record(nbytes, seconds, ok)
+                    condition.notify_all()
+                f = next_file(index)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), name=f'{transfer_constants.MODULE_NAME}-parallel-{i + 1}', daemon=True)
+        for i in list(alive)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tuner.save()
+
+    if len(abort_errors) > 0:
+        raise abort_errors[0]
+    if state['sessions'] == 0 and len(session_errors) > 0:
+        err_msg = f'unable to open any transfer session|{session_errors[0]}'
+        logging.critical(err_msg)
+        raise RuntimeError(err_msg) from session_errors[0]
+
+    return [f for f in file_list if f in transferred]
+
+
+@contextlib.contextmanager
+def cancel_guard(client, action: str, cancelled: threading.Event):
+    """Wrap the 'throttle' of a client so its transfer stops at the next chunk once 'cancelled' is set
+
+    The transfer is stopped by raising asyncio.CancelledError from inside the transfer. Being a BaseException it is not
+    swallowed by the per-file error handling, so the whole call unwinds. The original throttle is restored on exit
+
+    """
+    previous = client.throttle
+
+    def guard(nbytes: int):
+        if cancelled.is_set():
+            raise asyncio.CancelledError(f"{action} on profile '{client.name}' was cancelled")
+        if previous is not None:
+            previous(nbytes)
+
+    client.throttle = guard
+    try:
+        yield
+    finally:
+        client.throttle = previous
+
+
+class async_runner:
+    """Runs the blocking sftp and ftp transfer methods for asyncio callers, shared by every instance in the process
+
+    Transfers run on a thread pool of their own, so they neither block the event loop nor use up its default executor.
+    At most 'max_transfers' run at once per event loop, further calls wait without holding a thread, and calls on the
+    same client object run one after the other, as a client's connection is not shared between threads.
+
+    Cancelling the awaiting task or reaching its timeout stops the transfer at its next chunk, through the client's
+    'throttle' hook; the call only returns once the transfer thread has let go of the client. A file interrupted this
+    way is removed locally when downloading, a partial remote copy may be left when uploading
+
+    Attributes
+    ----------
+    max_transfers : int
+        Most transfers running at the same time per event loop
+
+    """
+    def __init__(self, max_transfers: int = transfer_constants.ASYNC_TRANSFERS):
+        self.max_transfers = max_transfers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._loops = weakref.WeakKeyDictionary()  # event loop: (semaphore, {id(client): lock})
+
+    def _loop_state(self, loop: asyncio.AbstractEventLoop) -> tuple:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_transfers, thread_name_prefix=f'{transfer_constants.MODULE_NAME}-async'
+                )
+            if loop not in self._loops:
+                self._loops[loop] = (asyncio.Semaphore(self.max_transfers), weakref.WeakValueDictionary())
+            return self._loops[loop]
+
+    async def run(self, client, action: str, *args, timeout: float = None, **kwargs):
+        """Run a method of a client in the thread pool and return its result
+
+        Parameters
+        ----------
+        client : sftp.sftp or ftp.ftp
+            Connected client to transfer with
+        action : str
+            Name of the method to run, i.e. "download"
+        *args, **kwargs
+            Arguments passed on to the method
+        timeout : float, optional (default None)
+            Most seconds the transfer may take once it has started, no limit if not provided
+
+        Returns
+        -------
+        The return value of the method
+
+        Raises
+        ------
+        TimeoutError
+            If the transfer did not finish within 'timeout'
+        asyncio.CancelledError
+            If the awaiting task was cancelled
+
+        """
+        loop = asyncio.get_running_loop()
+        semaphore, client_locks = self._loop_state(loop)
+        client_lock = client_locks.get(id(client))
+        if client_lock is None:
+            client_lock = asyncio.Lock()
+            client_locks[id(client)] = client_lock
+
+        async with semaphore, client_lock:
+            cancelled = threading.Event()
+
+            def call():
+                with cancel_guard(client, action, cancelled):
+                    return getattr(client, action)(*args, **kwargs)
+
+            future = loop.run_in_executor(self._executor, call)
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                cancelled.set()
+                await asyncio.wait([future])  # the client stays locked until its thread has stopped
+                if not future.cancelled():
+                    future.exception()  # retrieved, the interruption itself is expected
+                if isinstance(e, asyncio.TimeoutError):
+                    err_msg = f"{action} on profile '{client.name}' did not finish within {timeout} seconds"
+                    logging.error(err_msg)
+                    raise TimeoutError(err_msg) from e
+                raise
+
+
+ASYNC_RUNNER = async_runner()
+
+
+def iterate_results(client, action: str, *args, **kwargs):
+    """Run a batch method of a client on a background thread, yielding a file_result for each file as it completes
+
+    The batch keeps running while the caller works on the files already yielded; if the caller falls more than
+    RESULT_QUEUE_SIZE results behind, the batch waits. Closing the generator early (i.e. breaking out of the loop)
+    stops the batch at its next chunk through the client's 'throttle' hook, as cancelling an asyncio call does.
+    Results arrive in completion order, which is not the order of selection when transferring concurrently
+
+    Parameters
+    ----------
+    client : sftp.sftp or ftp.ftp
+        Connected client to transfer with, not to be used by anything else until the generator is exhausted
+    action : str
+        Name of the method to run, i.e. "download"
+    *args, **kwargs
+        Arguments passed on to the method
+
+    Yields
+    ------
+    file_result : the outcome of each file, including those skipped or failed
+
+    Raises
+    ------
+    Exception
+        Anything the method raised, once the results before it have been yielded
+
+    """
+    results = queue.Queue(maxsize=transfer_constants.RESULT_QUEUE_SIZE)
+    cancelled = threading.Event()
+    outcome = []
+    finished = object()
+
+    def put(result: file_result):
+        while not cancelled.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        previous = client.on_result
+        client.on_result = put
+        try:
+            with cancel_guard(client, action, cancelled):
+                getattr(client, action)(*args, **kwargs)
+        except BaseException as e:
+            outcome.append(e)
+        finally:
+            client.on_result = previous
+            put(finished)
+
+    runner = threading.Thread(target=run, name=f'{transfer_constants.MODULE_NAME}-{action}', daemon=True)
+    runner.start()
+    try:
+        while True:
+            result = results.get()
+            if result is finished:
+                break
+            yield result
+    finally:
+        cancelled.set()
+        runner.join()
+
+    if len(outcome) > 0:
+        raise outcome[0]
+
+
+def local_signature(filename: str) -> dict:
+    """Return the size and modification time of a local file, or None if it does not exist"""
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return {'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def remote_signature(attr) -> dict:
+    """Return the size and modification time of a remote file from its listing attributes"""
+    if attr is None:
+        return None
+    return {'size': attr.st_size, 'mtime': None if attr.st_mtime is None else int(attr.st_mtime)}
+
+
+class manifest:
+    """Persisted record of the remote and local file attributes seen at the end of each sync
+
+    A manifest is a single JSON file per module and profile. Entries are grouped by a key made from the sync
+    direction and the remote and local directories, so several directory pairs can share one profile.
+
+    Attributes
+    ----------
+    filename : str
+        Full path of the manifest file
+    data : dict
+        Manifest content, {key: {file name: {'remote': {...}, 'local': {...}}}}
+
+    """
+    def __init__(self, module_name: str, profile_name: str, config_file: str = None):
+        """Inits manifest class
+
+        Parameters
+        ----------
+        module_name : str
+            Name of the module the profile belongs to (i.e. "sftp")
+        profile_name : str
+            Name of the profile being synced
+        config_file : str, optional (default None)
+            Full path location of library configuration file
+
+        """
+        manifest_root = get_config('manifestRoot', config_file)
+        if not manifest_root:
+            manifest_root = get_config('logRoot', config_file)
+        manifest_path = os.path.join(manifest_root, module_name)
+        if not os.path.isdir(manifest_path):
+            os.makedirs(manifest_path)
+
+        self.filename = os.path.join(manifest_path, f"{re.sub(r'[^a-zA-Z0-9]', '', profile_name)}{transfer_constants.MANIFEST_EXTENSION}")
+        self.data = {}
+        if os.path.isfile(self.filename):
+            with open(self.filename, mode='r', encoding='utf-8') as mf:
+                self.data = json.load(mf)
+
+    @staticmethod
+    def key(direction: str, remote_dir: str, local_dir: str) -> str:
+        """Build the key a directory pair is recorded under"""
+        return f"{direction}|{remote_dir.rstrip(posixpath.sep) or posixpath.sep}|{os.path.normpath(local_dir).replace(os.sep, posixpath.sep)}"
+
+    def entries(self, key: str) -> dict:
+        """Return the recorded files for a directory pair, creating an empty group if needed"""
+        return self.data.setdefault(key, {})
+
+    def is_unchanged(self, key: str, name: str, remote_sig: dict, local_sig: dict) -> bool:
+        """Determine if both sides of a file still match what was recorded at the last sync"""
+        record = self.data.get(key, {}).get(name)
+        if record is None or remote_sig is None or local_sig is None:
+            return False
+        return record.get('remote') == remote_sig and record.get('local') == local_sig
+
+    def update(self, key: str, name: str, remote_sig: dict, local_sig: dict):
+        """Record the current attributes of a file"""
+        self.entries(key)[name] = {'remote': remote_sig, 'local': local_sig}
+
+    def discard(self, key: str, name: str):
+        """Remove a file from the manifest"""
+        self.data.get(key, {}).pop(name, None)
+
+    def save(self):
+        """Write the manifest to disk, replacing the previous copy atomically"""
+        fd, temp_name = tempfile.mkstemp(dir=os.path.dirname(self.filename), suffix='.tmp')
+        with os.fdopen(fd, mode='w', encoding='utf-8') as tf:
+            json.dump(self.data, tf, indent=4)
+        os.replace(temp_name, self.filename)
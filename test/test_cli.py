@@ -0,0 +1,129 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import src.cli as cli
+import src.pgp as pgp
+from src.transfer import file_result
+
+FILE_DIR = os.path.join(os.path.dirname(__file__), 'files')
+
+
+class FakePgp:
+    """Minimal pgp stand-in "encrypting" a file by recording which thread handled it"""
+    def __init__(self, profile: str, config_file: str = None):
+        self.encrypt_path = None
+        self.suppress_encrypt = []
+
+    def iter_encrypt(self, path_override: str = None, file_override: list = None, **kwargs):
+        for f in file_override:
+            yield file_result(f, os.path.join(path_override, f), 0, 0.0, 'success')
+
+
+def run(argv: list) -> tuple:
+    """Run the command and return the exit code and the output parsed as JSON"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+        code = cli.main(argv)
+    return code, json.loads(output.getvalue()) if output.getvalue().startswith('{') else output.getvalue()
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_arguments(self):
+        self.assertEqual(cli._extra_arg('delete_ftp=false'), ('delete_ftp', False))
+        self.assertEqual(cli._extra_arg('new_delim=|'), ('new_delim', '|'))
+        self.assertEqual(cli._concurrency('auto'), 'auto')
+        for value in ('0', 'many'):
+            with self.subTest(value=value):
+                self.assertRaises(Exception, cli._concurrency, value)
+        self.assertEqual(run(['jsonstuff', 'reformat', self.tmp.name, '--concurrency', '0'])[0], cli.cli_constants.EXIT_USAGE)
+        self.assertEqual(run(['transfer'])[0], cli.cli_constants.EXIT_USAGE)
+        self.assertEqual(run(['office', 'convert', 'run_vba', 'book.xlsm'])[0], cli.cli_constants.EXIT_USAGE)
+        self.assertEqual(run(['fileproc', 'monitor', self.tmp.name, '--dry-run'])[0], cli.cli_constants.EXIT_USAGE)
+        self.assertEqual(run(['sftp', 'sync', '--profile', 'Partner', '--dry-run'])[0], cli.cli_constants.EXIT_USAGE)
+
+    def test_jsonstuff(self):
+        for f in ('jsonstuff_test1.json', 'jsonstuff_test2.json', 'jsonstuff_test2_reformat.json'):
+            shutil.copy2(os.path.join(FILE_DIR, 'jsonstuff', f), self.tmp.name)
+
+        code, report = run(['jsonstuff', 'reformat', self.tmp.name, '--dry-run'])
+        self.assertEqual(code, cli.cli_constants.EXIT_SUCCESS)
+        self.assertTrue(report['dry_run'])
+        self.assertEqual([(r['name'], r['status']) for r in report['results']], [('jsonstuff_test1.json', 'pending'), ('jsonstuff_test2.json', 'skipped')])
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp.name, 'jsonstuff_test1_reformat.json')))
+
+        code, report = run(['jsonstuff', 'reformat', self.tmp.name])
+        self.assertEqual((code, report['command'], report['status']), (0, 'jsonstuff reformat', 'success'))
+        self.assertEqual([r['name'] for r in report['results']], ['jsonstuff_test1_reformat.json'])
+
+        code, report = run(['jsonstuff', 'reformat', os.path.join(self.tmp.name, 'missing')])
+        self.assertEqual((code, report['status']), (cli.cli_constants.EXIT_FAILED, 'failed'))
+        self.assertIn('FileNotFoundError', report['error'])
+
+    def test_office_convert(self):
+        for i in (1, 2):
+            with open(os.path.join(self.tmp.name, f'report{i}.csv'), 'w') as f:
+                f.write('a,b\n1,2\n')
+        pattern = os.path.join(self.tmp.name, 'report*.csv')
+
+        code, report = run(['office', 'convert', 'change_delimiter', pattern, '--dry-run'])
+        self.assertEqual([r['status'] for r in report['results']], ['pending', 'pending'])
+
+        code, report = run(['office', 'convert', 'change_delimiter', pattern, '--arg', 'new_delim=|', '--concurrency', '2', '--format', 'text'])
+        self.assertEqual(code, cli.cli_constants.EXIT_SUCCESS)
+        self.assertTrue(report.splitlines()[-1].startswith('office convert: success, 2 files'))
+        for i in (1, 2):
+            with open(os.path.join(self.tmp.name, f'report{i}_delimiter.csv')) as f:
+                self.assertEqual(f.read().splitlines(), ['a|b', '1|2'])
+
+    def test_fileproc_copy(self):
+        dest_dir = os.path.join(self.tmp.name, 'dest')
+        os.mkdir(dest_dir)
+        for f in ('a.txt', 'b.csv'):
+            open(os.path.join(self.tmp.name, f), 'w').close()
+
+        code, report = run(['fileproc', 'copy', self.tmp.name, dest_dir, '*.txt', '--dry-run'])
+        self.assertEqual([r['name'] for r in report['results']], ['a.txt'])
+        self.assertEqual(os.listdir(dest_dir), [])
+
+        code, report = run(['fileproc', 'copy', self.tmp.name, dest_dir, '*.txt'])
+        self.assertEqual(report['results'][0]['path'], os.path.join(dest_dir, 'a.txt'))
+        self.assertEqual(os.listdir(dest_dir), ['a.txt'])
+
+    @patch.object(pgp, 'pgp', FakePgp)
+    def test_pgp_auto_concurrency(self):
+        for i in range(3):
+            open(os.path.join(self.tmp.name, f'file{i}.txt'), 'w').close()
+        code, report = run(['pgp', 'encrypt', '*.txt', '--profile', 'Partner', '--path', self.tmp.name, '--concurrency', 'auto'])
+        self.assertEqual(code, cli.cli_constants.EXIT_SUCCESS, report['error'])
+        self.assertEqual([(r['name'], r['status']) for r in report['results']], [(f'file{i}.txt', 'success') for i in range(3)])
+
+    def test_lazy_imports(self):
+        code = (
+            "import sys, contextlib, io\n"
+            "import src.cli as cli\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            f"    cli.main(['jsonstuff', 'reformat', {self.tmp.name!r}, '--dry-run'])\n"
+            "print(','.join(m for m in ('pandas', 'paramiko', 'pgpy', 'pykeepass', 'pyodbc', 'win32com') if m in sys.modules))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
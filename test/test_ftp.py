@@ -0,0 +1,40 @@
+import ftplib
+import unittest
+from unittest.mock import MagicMock
+
+import src.ftp as ftp
+
+
+def bare_client(**attributes) -> ftp.ftp:
+    """ftp client built without reading a profile, for exercising helpers directly"""
+    client = ftp.ftp.__new__(ftp.ftp)
+    client.name = 'Test'
+    client._ftp = None
+    for k, v in attributes.items():
+        setattr(client, k, v)
+    return client
+
+
+class TestArchive(unittest.TestCase):
+    def test_archived(self):
+        session = MagicMock()
+        archived = bare_client(_ftp=session)._archive('/in', '/in/archive', ['a.csv', 'b.csv'])
+        self.assertEqual(archived, ['a.csv', 'b.csv'])
+        self.assertEqual([c.args for c in session.rename.call_args_list], [('/in/a.csv', '/in/archive/a.csv'), ('/in/b.csv', '/in/archive/b.csv')])
+
+    def test_failed_rename(self):
+        def rename(old_file: str, new_file: str):
+            if old_file == '/in/b.csv':
+                raise ftplib.error_perm('550 permission denied')
+
+        session = MagicMock()
+        session.rename.side_effect = rename
+        with self.assertLogs(level='ERROR') as logs:
+            archived = bare_client(_ftp=session)._archive('/in', '/in/archive', ['a.csv', 'b.csv', 'c.csv'])
+        self.assertEqual(archived, ['a.csv', 'c.csv'])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("unable to archive '/in/b.csv' to '/in/archive/b.csv'|550 permission denied", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
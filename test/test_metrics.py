@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import src.metrics as metrics
+import src.transfer as transfer
+
+
+class Profile:
+    name = 'Partner'
+
+    @metrics.METRICS.timed('test.method')
+    def method(self, fail: bool = False) -> str:
+        if fail:
+            raise ValueError('failed')
+        return 'done'
+
+
+class TestRegistry(unittest.TestCase):
+    def test_disabled(self):
+        registry = metrics.metrics_registry()
+        self.assertIs(registry.span('test.span'), registry.span('other.span'))
+        with registry.span('test.span'):
+            pass
+        registry.count('test.counter', 5)
+        registry.record_file('test.copy', 'success', 10, 0.1)
+        summary = registry.summary()
+        self.assertEqual(summary['spans'], [])
+        self.assertEqual(summary['counters'], [])
+
+    def test_spans_and_counters(self):
+        registry = metrics.metrics_registry()
+        registry.enable()
+        for _ in range(3):
+            with registry.span('test.span', profile='A'):
+                time.sleep(0.01)
+        with self.assertRaises(KeyError):
+            with registry.span('test.span', profile='A'):
+                raise KeyError('x')
+        registry.record_file('test.copy', 'success', 100, 0.5, profile='A')
+        registry.record_file('test.copy', 'failed', 0, 0.2, profile='A')
+        summary = registry.summary()
+
+        span = summary['spans'][1]
+        self.assertEqual((span['name'], span['labels'], span['count'], span['errors']), ('test.span', {'profile': 'A'}, 4, 1))
+        self.assertGreaterEqual(span['total_seconds'], 0.03)
+        self.assertEqual(summary['spans'][0]['name'], 'test.copy.file')
+        counters = {(c['name'], tuple(c['labels'].items())): c['value'] for c in summary['counters']}
+        self.assertEqual(counters[('test.copy.bytes', (('profile', 'A'),))], 100)
+        self.assertEqual(counters[('test.copy.files', (('profile', 'A'), ('status', 'failed')))], 1)
+
+    def test_export(self):
+        registry = metrics.metrics_registry()
+        registry.enable()
+        with registry.span('sftp.connect', profile='Say "hi"'):
+            pass
+        registry.count('sftp.download.bytes', 2048, profile='Say "hi"')
+        text = registry.prometheus_text()
+        self.assertIn('automation_span_seconds_count{span="sftp.connect",profile="Say \\"hi\\""} 1', text)
+        self.assertIn('# TYPE automation_sftp_download_bytes_total counter', text)
+        self.assertIn('automation_sftp_download_bytes_total{profile="Say \\"hi\\""} 2048', text)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            registry.export_files = [os.path.join(tmp, 'run.json'), os.path.join(tmp, 'run.prom')]
+            registry.export()
+            with open(os.path.join(tmp, 'run.json')) as f:
+                self.assertEqual(json.load(f)['counters'][0]['value'], 2048)
+            with open(os.path.join(tmp, 'run.prom')) as f:
+                self.assertIn('automation_last_export_timestamp_seconds', f.read())
+            self.assertEqual(sorted(os.listdir(tmp)), ['run.json', 'run.prom'])
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        metrics.METRICS.reset()
+        metrics.METRICS.enable()
+
+    def tearDown(self):
+        metrics.METRICS.disable()
+        metrics.METRICS.reset()
+
+    def test_timed(self):
+        profile = Profile()
+        self.assertEqual(profile.method(), 'done')
+        self.assertRaises(ValueError, profile.method, True)
+        span = metrics.METRICS.summary()['spans'][0]
+        self.assertEqual((span['name'], span['labels'], span['count'], span['errors']), ('test.method', {'profile': 'Partner'}, 2, 1))
+
+    def test_result_recorder(self):
+        recorder = transfer.result_recorder(None, defer=True, metric='sftp.upload', profile='Partner')
+        started = time.monotonic()
+        recorder.record('a.csv', '/out/a.csv', 10, started, 'success')
+        recorder.record('b.csv', '/out/b.csv', 20, started, 'success')
+        recorder.record('c.csv', '/out/c.csv', 0, started, 'failed', 'timeout')
+        recorder.release(['a.csv'])
+        counters = {(c['name'], c['labels'].get('status')): c['value'] for c in metrics.METRICS.summary()['counters']}
+        self.assertEqual(counters, {('sftp.upload.bytes', None): 10, ('sftp.upload.files', 'failed'): 2, ('sftp.upload.files', 'success'): 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
+import json
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import src.misc as misc
@@ -18,6 +22,16 @@ class TestMisc(unittest.TestCase):
         test_val = misc.get_config('Key', os.path.join(FILE_DIR, 'test_config.json'))
         self.assertEqual(test_val, 'Value')
 
+    def test_get_config_reloads_changed_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config_file = os.path.join(tmp, 'config.json')
+            with open(config_file, 'w') as cf:
+                json.dump({'Key': 'Value'}, cf)
+            self.assertEqual(misc.get_config('Key', config_file), 'Value')
+            with open(config_file, 'w') as cf:
+                json.dump({'Key': 'Changed value'}, cf)
+            self.assertEqual(misc.get_config('Key', config_file), 'Changed value')
+
     def test_csv_to_json(self):
         csvfile = os.path.join(FILE_DIR, 'csvjsonconvert.csv')
         csv_dict = {'value1': {'column2': 'value2', 'column3': 'value3'}}
@@ -31,6 +45,23 @@ class TestMisc(unittest.TestCase):
         csvfile = os.path.join(FILE_DIR, 'csvjsonconvert.csv')
         self.assertRaises(NotImplementedError, misc.csv_to_json, csvfile, 'a')
 
+    def test_lazy_module(self):
+        module = misc.lazy_module('json')
+        self.assertIn('not loaded', repr(module))
+        self.assertIs(module.dumps, json.dumps)
+        self.assertIn("'json' (loaded)", repr(module))
+        self.assertRaises(ModuleNotFoundError, getattr, misc.lazy_module('does_not_exist'), 'anything')
+
+    def test_heavy_imports_deferred(self):
+        code = (
+            'import sys; import src.db, src.office, src.pgp, src.sftp, src.ftp; '
+            "print(','.join(m for m in ('pandas', 'paramiko', 'pgpy', 'pykeepass', 'pyodbc', 'win32com') if m in sys.modules))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip(), '')
+
 
 if __name__ == '__main__':
     unittest.main()
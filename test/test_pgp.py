@@ -49,6 +49,12 @@ class TestPgp(unittest.TestCase):
         self.file_list = self.proc.encrypt(FILE_DIR, None, False)
         self.assertEqual(len(self.file_list), 6)
 
+    def test_iter_encrypt(self):
+        results = list(self.proc.iter_encrypt(FILE_DIR, 'encryption_test*.txt', False))
+        self.file_list = [r.path for r in results]
+        self.assertEqual([r.status for r in results], ['success'] * 3)
+        self.assertTrue(all(r.bytes > 0 for r in results))
+
     # decryption
     def test_decrypt_invalid_path(self):
         bad_path = '/this/path/is/bad'
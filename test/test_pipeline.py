@@ -0,0 +1,124 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import src.pipeline as pipeline
+
+
+class FakeUploader:
+    """Minimal sftp stand-in that, like upload, moves each sent file into the archive directory of its folder"""
+    def __init__(self, config_file: str):
+        self.config_file = config_file
+        self.sent = []
+
+    def upload(self, remote_dir: str = None, local_dir: str = None, local_files: list = None, **kwargs) -> list:
+        for f in local_files:
+            self.sent.append(f)
+            os.rename(os.path.join(local_dir, f), os.path.join(local_dir, 'Archive', f))
+        return local_files
+
+    def close(self):
+        pass
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.inbound = os.path.join(self.tmp.name, 'inbound')
+        os.makedirs(self.inbound)
+        for i in range(4):
+            with open(os.path.join(self.inbound, f'file{i}.csv'), 'w') as f:
+                f.write(f'a,b\n{i},x\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_invalid_definition(self):
+        self.assertRaises(ValueError, pipeline.pipeline, {'stages': []})
+        self.assertRaises(ValueError, pipeline.pipeline, {'stages': [{'type': 'archive', 'directory': 'x'}]})
+        self.assertRaises(ValueError, pipeline.pipeline, {'stages': [{'type': 'files', 'directory': 'x'}, {'type': 'convert', 'method': 'format_c'}]})
+        self.assertRaises(ValueError, pipeline.pipeline, {'stages': [{'type': 'files', 'directory': 'x'}, {'type': 'convert', 'method': 'run_vba'}]})
+        self.assertRaises(ValueError, pipeline.pipeline, {'stages': [{'type': 'files', 'directory': 'x'}, {'type': 'files', 'directory': 'y'}]})
+        self.assertRaises(FileNotFoundError, pipeline.pipeline.from_yaml, os.path.join(self.tmp.name, 'DNE.yaml'))
+
+    def test_convert_and_archive(self):
+        archive = os.path.join(self.tmp.name, 'archive')
+        definition = os.path.join(self.tmp.name, 'inbound.yaml')
+        with open(definition, 'w') as f:
+            f.write(
+                f'stages:\n'
+                f'  - {{type: files, directory: "{self.inbound}", pattern: "*.csv"}}\n'
+                f'  - {{type: convert, method: change_delimiter, concurrency: 2, args: {{new_delim: "|"}}}}\n'
+                f'  - {{type: archive, directory: "{archive}"}}\n'
+            )
+        report = pipeline.run_pipeline(definition)
+        self.assertEqual(report['pipeline']['name'], 'inbound')
+        results = sorted(report['results'], key=lambda r: r['name'])
+        self.assertEqual([(r['name'], r['status'], r['stage']) for r in results], [(f'file{i}.csv', 'success', 'archive') for i in range(4)])
+        with open(results[2]['path']) as f:
+            self.assertEqual(f.read().splitlines(), ['a|b', '2|x'])
+        self.assertEqual(os.path.dirname(results[2]['path']), archive)
+
+        dry_run = pipeline.run_pipeline(definition, dry_run=True)
+        self.assertNotIn('results', dry_run)
+        self.assertEqual([s['type'] for s in dry_run['pipeline']['stages']], ['files', 'convert', 'archive'])
+
+    def test_upload_and_archive(self):
+        config_file = os.path.join(self.tmp.name, 'config.json')
+        with open(config_file, 'w') as f:
+            f.write('{"archiveDirName": "Archive"}')
+        os.makedirs(os.path.join(self.inbound, 'Archive'))
+        archive = os.path.join(self.tmp.name, 'archive')
+        uploader = FakeUploader(config_file)
+        p = pipeline.pipeline({
+            'stages': [
+                {'type': 'files', 'directory': self.inbound},
+                {'type': 'upload', 'protocol': 'sftp', 'profile': 'Partner', 'remote_dir': '/in'},
+                {'type': 'archive', 'directory': archive}
+            ]
+        }, config_file)
+        with patch.object(pipeline.stage, 'open', lambda stage, config_file: uploader if stage.type == 'upload' else None):
+            results = sorted(p.run(), key=lambda r: r['name'])
+
+        self.assertEqual([(r['name'], r['status']) for r in results], [(f'file{i}.csv', 'success') for i in range(4)])
+        self.assertEqual(sorted(uploader.sent), [f'file{i}.csv' for i in range(4)])
+        self.assertEqual(sorted(os.listdir(archive)), [f'file{i}.csv' for i in range(4)])
+        self.assertEqual(results[0]['path'], os.path.join(archive, 'file0.csv'))
+
+    def test_stages_overlap(self):
+        log = []
+        lock = threading.Lock()
+
+        def process(self, client, item):
+            with lock:
+                log.append(('start', self.name, item.name, time.monotonic()))
+            time.sleep(0.05)
+            if self.name == 'second' and item.name == 'file1.csv':
+                raise OSError('disk full')
+            with lock:
+                log.append(('end', self.name, item.name, time.monotonic()))
+
+        p = pipeline.pipeline({
+            'queue_size': 1,
+            'stages': [
+                {'type': 'files', 'directory': self.inbound},
+                {'type': 'archive', 'name': 'first', 'directory': self.tmp.name},
+                {'type': 'archive', 'name': 'second', 'directory': self.tmp.name}
+            ]
+        })
+        with patch.object(pipeline.stage, 'process', process):
+            results = {r['name']: r for r in p.run()}
+
+        self.assertEqual((results['file1.csv']['status'], results['file1.csv']['stage']), ('failed', 'second'))
+        self.assertIn('disk full', results['file1.csv']['error'])
+        self.assertEqual(len([r for r in results.values() if r['status'] == 'success']), 3)
+        second_started = min(t for kind, name, _, t in log if kind == 'start' and name == 'second')
+        first_finished = max(t for kind, name, _, t in log if kind == 'end' and name == 'first')
+        self.assertLess(second_started, first_finished)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+
+import src.scheduler as scheduler
+
+
+class FakeClient:
+    """Minimal sftp/ftp stand-in recording the order its transfers ran in"""
+    def __init__(self, name: str, host: str, log: list, release: threading.Event = None, chunks: int = 0, chunk_size: int = 0):
+        self.name = name
+        self.host = host
+        self.throttle = None
+        self.log = log
+        self.release = release
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+
+    def download(self, remote_dir: str = None, **kwargs) -> list:
+        self.log.append(('start', self.name, remote_dir))
+        if self.release is not None:
+            self.release.wait(5)
+        for _ in range(self.chunks):
+            if self.throttle is not None:
+                self.throttle(self.chunk_size)
+        self.log.append(('end', self.name, remote_dir))
+        return [remote_dir]
+
+    def upload(self, **kwargs) -> list:
+        raise ConnectionResetError('dropped')
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_invalid_rate(self):
+        for rate in (0, -5, 'fast', None, True):
+            self.assertRaises(ValueError, scheduler.token_bucket, rate)
+
+    def test_rate_limited(self):
+        bucket = scheduler.token_bucket(100000)
+        start = time.monotonic()
+        for _ in range(30):
+            bucket.consume(10000)
+        self.assertGreater(time.monotonic() - start, 1.5)  # 300000 bytes, the first 100000 are already in the bucket
+
+
+class TestScheduler(unittest.TestCase):
+    def test_priority_order(self):
+        log = []
+        release = threading.Event()
+        blocker = FakeClient('Blocker', 'a', log, release)
+        clients = [FakeClient(f'P{i}', 'b', log) for i in range(3)]
+        with scheduler.scheduler(max_workers=1) as sched:
+            sched.submit(blocker, 'download', remote_dir='/block')
+            time.sleep(0.1)
+            sched.submit(clients[0], 'download', priority=0, remote_dir='/low')
+            sched.submit(clients[1], 'download', priority=5, remote_dir='/urgent')
+            sched.submit(clients[2], 'download', priority=5, remote_dir='/urgent2')
+            release.set()
+            results = sched.wait()
+        self.assertEqual(results, [['/block'], ['/urgent'], ['/urgent2'], ['/low']])
+
+    def test_finished_jobs_not_kept(self):
+        with scheduler.scheduler(keep_results=False) as sched:
+            futures = [sched.submit(FakeClient(f'C{i}', 'a', []), 'download', remote_dir=f'/{i}') for i in range(3)]
+            self.assertEqual(sched.wait(futures), [['/0'], ['/1'], ['/2']])
+        self.assertEqual(sched._started, {})  # the workers have exited, so every done callback has run
+
+    def test_small_priorities(self):
+        log = []
+        release = threading.Event()
+        blocker = FakeClient('Blocker', 'a', log, release)
+        clients = [FakeClient(f'P{i}', 'b', log) for i in range(3)]
+        with scheduler.scheduler(max_workers=1) as sched:
+            futures = [sched.submit(blocker, 'download', remote_dir='/block')]
+            time.sleep(0.1)
+            futures += [sched.submit(c, 'download', priority=i, remote_dir=f'/p{i}') for i, c in enumerate(clients)]
+            release.set()
+            sched.wait(futures)
+        self.assertEqual([x[2] for x in log if x[0] == 'start'], ['/block', '/p2', '/p1', '/p0'])
+
+    def test_host_and_client_limits(self):
+        log = []
+        release = threading.Event()
+        same_host = [FakeClient(f'H{i}', 'host', log, release) for i in range(3)]
+        with scheduler.scheduler(max_workers=4, max_per_host=2) as sched:
+            futures = [sched.submit(c, 'download', remote_dir=c.name) for c in same_host]
+            futures.append(sched.submit(same_host[0], 'download', remote_dir='again'))
+            time.sleep(0.2)
+            self.assertEqual(len([x for x in log if x[0] == 'start']), 2)
+            release.set()
+            self.assertEqual(sched.wait(futures), [['H0'], ['H1'], ['H2'], ['again']])
+
+    def test_failed_job(self):
+        with scheduler.scheduler() as sched:
+            future = sched.submit(FakeClient('A', 'a', []), 'upload')
+            self.assertRaises(ConnectionResetError, sched.wait, [future])
+            self.assertRaises(ValueError, sched.submit, FakeClient('A', 'a', []), 'delete')
+        self.assertRaises(RuntimeError, sched.submit, FakeClient('A', 'a', []), 'download')
+
+    def test_bandwidth_cap(self):
+        log = []
+        client = FakeClient('Capped', 'a', log, chunks=20, chunk_size=10000)
+        start = time.monotonic()
+        with scheduler.scheduler(profile_rates={'Capped': 100000}) as sched:
+            sched.wait([sched.submit(client, 'download', remote_dir='/')])
+        self.assertGreater(time.monotonic() - start, 0.9)  # 200000 bytes at 100000 per second after a full bucket
+        self.assertIsNone(client.throttle)
+
+
+if __name__ == '__main__':
+    unittest.main()
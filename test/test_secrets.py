@@ -1,6 +1,10 @@
+import concurrent.futures
 import os
+import tempfile
 import unittest
 
+from pykeepass import create_database
+
 from src.misc import get_config
 import src.secrets as secrets
 
@@ -54,5 +58,54 @@ class TestKeepass(unittest.TestCase):
         self.assertEqual(test_val, 'Test')
 
 
+class TestDatabaseCache(unittest.TestCase):
+    def tearDown(self):
+        secrets.DATABASE_CACHE.disable()
+
+    def test_reuse_until_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'cache.kdbx')
+            kp = create_database(filename, password='secret')
+            group = kp.add_group(kp.root_group, 'sftp')
+            kp.add_entry(group, 'Partner', 'user', 'pass')
+            kp.save()
+
+            cache = secrets.database_cache()
+            self.assertIsNot(cache.open(filename, 'secret'), cache.open(filename, 'secret'))
+            cache.enable()
+            first = cache.open(filename, 'secret')
+            self.assertIs(cache.open(filename, 'secret'), first)
+
+            secrets.DATABASE_CACHE.enable()
+            entry = secrets.keepass(filename, 'secret', 'sftp', 'Partner')
+            entry.writecustomproperty('Port', '2222', create_property=True)
+            self.assertEqual(secrets.keepass(filename, 'secret', 'sftp', 'Partner').getcustomproperties('Port'), '2222')
+
+            os.utime(filename, ns=(0, 0))
+            self.assertIsNot(cache.open(filename, 'secret'), first)
+
+    def test_shared_database_lock(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'cache.kdbx')
+            kp = create_database(filename, password='secret')
+            kp.add_entry(kp.add_group(kp.root_group, 'sftp'), 'Partner', 'user', 'pass')
+            kp.save()
+
+            secrets.DATABASE_CACHE.enable()
+            entries = [secrets.keepass(filename, 'secret', 'sftp', 'Partner') for _ in range(4)]
+            self.assertIs(entries[0].kp, entries[1].kp)
+            self.assertIs(entries[0]._lock, entries[1]._lock)
+
+            def use(entry, port: str):
+                for _ in range(2):
+                    entry.writecustomproperty('Port', port, create_property=True)
+                    entry.getcustomproperties('Port')
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+                for f in [pool.submit(use, e, str(i)) for i, e in enumerate(entries)]:
+                    f.result()
+            self.assertIn(secrets.keepass(filename, 'secret', 'sftp', 'Partner').getcustomproperties('Port'), ['0', '1', '2', '3'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import src.service as service
+
+
+class FakeClient:
+    """Minimal sftp stand-in counting the connections it was used on"""
+    def __init__(self, name: str):
+        self.name = name
+        self.host = 'localhost'
+        self.throttle = None
+        self.closed = False
+        self.dropped = False
+
+    def alive(self) -> bool:
+        return not self.dropped
+
+    def download(self, remote_dir: str = None, **kwargs) -> list:
+        if remote_dir == '/broken':
+            raise ConnectionResetError('dropped')
+        if remote_dir == '/slow':
+            RELEASE.wait(5)
+        return [f'{remote_dir}/a.csv']
+
+    def close(self):
+        self.closed = True
+
+
+RELEASE = threading.Event()
+BUILT = []
+
+
+def fake_build(pool, kind: str, profile: str) -> FakeClient:
+    BUILT.append(profile)
+    return FakeClient(profile)
+
+
+class TestClientPool(unittest.TestCase):
+    @patch.object(service.client_pool, '_build', fake_build)
+    def test_reuse_and_discard(self):
+        pool = service.client_pool(max_idle=1)
+        with pool.client('sftp', 'Partner') as first:
+            pass
+        with pool.client('sftp', 'Partner') as second:
+            self.assertIs(second, first)
+            third = pool.checkout('sftp', 'Partner')
+            self.assertIsNot(third, first)
+        pool.checkin('sftp', 'Partner', third)
+        self.assertEqual(pool.idle_count(), 1)
+        self.assertTrue(first.closed)  # surplus beyond max_idle
+
+        with self.assertRaises(ConnectionResetError):
+            with pool.client('sftp', 'Partner') as client:
+                client.download('/broken')
+        self.assertTrue(client.closed)
+        self.assertEqual(pool.idle_count(), 0)
+
+    @patch.object(service.client_pool, '_build', fake_build)
+    def test_dead_connection_rebuilt(self):
+        pool = service.client_pool()
+        dead, live = pool.checkout('sftp', 'Partner'), pool.checkout('sftp', 'Partner')
+        pool.checkin('sftp', 'Partner', live)
+        pool.checkin('sftp', 'Partner', dead)
+        dead.dropped = live.dropped = True  # i.e. the server closed the idle connections
+        client = pool.checkout('sftp', 'Partner')
+        self.assertNotIn(client, (dead, live))
+        self.assertTrue(dead.closed and live.closed)
+        self.assertEqual(pool.idle_count(), 0)
+
+        pool.checkin('sftp', 'Partner', client)
+        self.assertIs(pool.checkout('sftp', 'Partner'), client)
+
+
+@patch.object(service.client_pool, '_build', fake_build)
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.svc = service.service(port=0, spool_dir=self.tmp.name, token='s3cret', poll_interval=0.05)
+        self.svc.start()
+        self.host, self.port = self.svc.address
+
+    def tearDown(self):
+        self.svc.stop()
+        self.tmp.cleanup()
+
+    def test_socket(self):
+        response = service.send_job({'action': 'ping'}, self.host, self.port, token='s3cret', timeout=5)
+        self.assertEqual(response['status'], 'success')
+        self.assertIn('uptime_seconds', response['result'])
+
+        response = service.send_job({'action': 'ping'}, self.host, self.port, token='wrong', timeout=5)
+        self.assertEqual((response['status'], response['error']), ('failed', 'invalid token'))
+
+        job = {'id': 7, 'action': 'download', 'protocol': 'sftp', 'profile': 'Partner', 'args': {'remote_dir': '/out'}}
+        response = service.send_job(job, self.host, self.port, token='s3cret', timeout=5)
+        self.assertEqual((response['id'], response['status'], response['result']), (7, 'success', ['/out/a.csv']))
+        self.assertEqual(self.svc.pool.idle_count(), 1)
+
+        response = service.send_job({'action': 'delete'}, self.host, self.port, token='s3cret', timeout=5)
+        self.assertEqual(response['status'], 'failed')
+        self.assertIn('invalid action', response['error'])
+
+        response = service.send_job({'action': 'convert', 'method': 'run_vba'}, self.host, self.port, token='s3cret', timeout=5)
+        self.assertIn('invalid method', response['error'])  # an office.excel method, not office.convert
+
+    def test_spool(self):
+        source = os.path.join(self.tmp.name, 'report.csv')
+        with open(source, 'w') as f:
+            f.write('a,b\n1,2\n')
+        jobs = {
+            'convert.json': {'action': 'convert', 'method': 'change_delimiter', 'args': {'filename': source, 'new_delim': '|'}},
+            'broken.json': {'action': 'download', 'profile': 'Partner', 'args': {'remote_dir': '/broken'}}
+        }
+        for name, job in jobs.items():
+            with open(os.path.join(self.tmp.name, f'{name}.tmp'), 'w') as f:
+                json.dump(job, f)
+            os.replace(os.path.join(self.tmp.name, f'{name}.tmp'), os.path.join(self.tmp.name, name))
+
+        done = os.path.join(self.tmp.name, 'done', 'convert.json')
+        failed = os.path.join(self.tmp.name, 'failed', 'broken.json')
+        deadline = time.monotonic() + 10
+        while not (os.path.isfile(done) and os.path.isfile(failed)) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with open(done) as f:
+            result = json.load(f)
+        with open(result['result']) as f:
+            self.assertEqual(f.read().splitlines(), ['a|b', '1|2'])
+        with open(failed) as f:
+            self.assertIn('ConnectionResetError', json.load(f)['error'])
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'working')), [])
+
+
+@patch.object(service.client_pool, '_build', fake_build)
+class TestServiceQueue(unittest.TestCase):
+    def test_token_required_beyond_loopback(self):
+        tmp = tempfile.TemporaryDirectory()
+        with patch.object(service, 'get_config', return_value=None):
+            self.assertRaises(ValueError, service.service, host='0.0.0.0', port=0, spool_dir=tmp.name)
+            service.service(host='0.0.0.0', port=0, spool_dir=tmp.name, token='s3cret').stop()
+            service.service(host='localhost', port=0, spool_dir=tmp.name).stop()
+        tmp.cleanup()
+
+    def test_queued_jobs_hold_no_client(self):
+        BUILT.clear()
+        RELEASE.clear()
+        tmp = tempfile.TemporaryDirectory()
+        svc = service.service(port=0, spool_dir=tmp.name, token='s3cret', max_transfers=1)
+        try:
+            futures = [svc.submit({'action': 'download', 'profile': 'Partner', 'args': {'remote_dir': '/slow'}}) for _ in range(3)]
+            time.sleep(0.2)
+            self.assertEqual(BUILT, ['Partner'])  # the two queued jobs have not taken a client
+            RELEASE.set()
+            self.assertEqual([f.result(5) for f in futures], [['/slow/a.csv']] * 3)
+            self.assertEqual((BUILT, svc.pool.idle_count()), (['Partner'], 1))
+        finally:
+            RELEASE.set()
+            svc.stop()
+            tmp.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,29 @@
+import errno
+import hashlib
+import io
 import os
+import posixpath
+import stat
+import tarfile
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 
+import paramiko
+
 import src.sftp as sftp
 
 FILE_DIR = os.path.join(os.path.dirname(__file__), 'files', 'sftp')
 
+
+def make_attr(filename: str, is_dir: bool = False, size: int = 0, mtime: int = 0) -> paramiko.SFTPAttributes:
+    attr = paramiko.SFTPAttributes()
+    attr.filename = filename
+    attr.st_mode = stat.S_IFDIR if is_dir else stat.S_IFREG
+    attr.st_size = size
+    attr.st_mtime = mtime
+    return attr
+
 # I had ChatGPT write much of this for me, I have no idea what the F most of it is doing.
 
 
@@ -56,6 +74,20 @@ class TestSftp(unittest.TestCase):
     #     ssh_client.open_sftp.return_value = sftp_client
     #     sftp_conn._connectssh()
 
+    @patch('paramiko.SSHClient')
+    def test_listsftpdir_recursive(self, mock_sshclient):
+        sftp_conn = sftp.sftp('Test Normal')
+        ssh_client = mock_sshclient.return_value
+        sftp_client = MagicMock()
+        ssh_client.open_sftp.return_value = sftp_client
+        listings = {
+            '/in': [make_attr('a.csv'), make_attr('sub', True)],
+            '/in/sub': [make_attr('b.csv'), make_attr('deeper', True)],
+            '/in/sub/deeper': [make_attr('c.csv')]
+        }
+        sftp_client.listdir_attr.side_effect = lambda d: listings[d]
+        self.assertEqual(sftp_conn.listsftpdir('/in', recursive=True), ['a.csv', 'sub/b.csv', 'sub/deeper/c.csv'])
+
     @patch('paramiko.SSHClient')
     def test_upload_invalid_path(self, mock_sshclient):
         bad_path = '/this/path/is/bad'
@@ -65,6 +97,18 @@ class TestSftp(unittest.TestCase):
         ssh_client.open_sftp.return_value = sftp_client
         self.assertRaises(FileNotFoundError, sftp_conn.upload, None, bad_path, None, False)
 
+    @patch('paramiko.SSHClient')
+    def test_lazy_connection(self, mock_sshclient):
+        sftp_conn = sftp.sftp('Test Normal', lazy=True)
+        ssh_client = mock_sshclient.return_value
+        ssh_client.open_sftp.return_value.listdir_attr.return_value = [make_attr('a.csv')]
+        self.assertEqual(sftp_conn.upload(None, os.path.dirname(__file__), 'does_not_exist_*.csv'), [])
+        self.assertFalse(sftp_conn.connected)
+        ssh_client.connect.assert_not_called()
+        self.assertEqual(sftp_conn.listsftpdir('/in'), ['a.csv'])
+        self.assertTrue(sftp_conn.connected)
+        ssh_client.connect.assert_called_once()
+
     # TODO: Figure this mess out. It's beyond my understanding right now
     # @patch('paramiko.SSHClient')
     # def test_upload(self, mock_sshclient):
@@ -75,5 +119,377 @@ class TestSftp(unittest.TestCase):
     #     sftp_conn._connectssh()
 
 
+def bare_client(**attributes) -> sftp.sftp:
+    """An sftp instance built without a Keepass profile, for methods that only need the attributes given"""
+    client = sftp.sftp.__new__(sftp.sftp)
+    client.name = 'Test'
+    client._ssh = None
+    client.throttle = None
+    for name, value in attributes.items():
+        setattr(client, name, value)
+    return client
+
+
+class TestAlive(unittest.TestCase):
+    def test_alive(self):
+        self.assertTrue(bare_client().alive())  # not connected yet, connects on first use
+        ssh = MagicMock()
+        client = bare_client(_ssh=ssh)
+        ssh.get_transport.return_value.is_active.return_value = True
+        self.assertTrue(client.alive())
+        ssh.get_transport.return_value.is_active.return_value = False
+        self.assertFalse(client.alive())
+        ssh.get_transport.return_value = None
+        self.assertFalse(client.alive())
+
+
+class FakeRemote:
+    """Remote directory of name: (size, mtime) served through a fake SFTP session and SSH exec channels"""
+    def __init__(self, files: dict = None):
+        self.files = dict(files or {})
+        self.put = []
+        self.session = MagicMock()
+        self.session.listdir_attr.side_effect = lambda d: [make_attr(n, size=sz, mtime=mt) for n, (sz, mt) in self.files.items()]
+        self.session.put.side_effect = self._put
+
+    def _put(self, local_file: str, remote_file: str, callback=None) -> paramiko.SFTPAttributes:
+        name = os.path.basename(remote_file)
+        self.put.append(name)
+        self.files[name] = (os.path.getsize(local_file), int(os.path.getmtime(local_file)))
+        return make_attr(name, size=self.files[name][0])
+
+    def ssh(self, channel) -> MagicMock:
+        ssh = MagicMock()
+        ssh.get_transport.return_value.open_session.return_value = channel
+        ssh.open_sftp.return_value.__enter__.return_value = self.session
+        return ssh
+
+
+class FakeChannel:
+    """SSH exec channel running a remote "tar -x", which can exit with an error or break while streaming"""
+    def __init__(self, remote: FakeRemote, exit_status: int = 0, extract: bool = True, fail_write: bool = False):
+        self.remote = remote
+        self.exit_status = exit_status
+        self.extract = extract
+        self.fail_write = fail_write
+        self.stream = io.BytesIO()
+        self.command = None
+        self.closed = False
+
+    def exec_command(self, command: str):
+        self.command = command
+
+    def makefile(self, mode: str):
+        channel = self
+
+        class writer(io.RawIOBase):
+            def writable(self):
+                return True
+
+            def write(self, data):
+                if channel.fail_write:
+                    raise OSError('channel closed')
+                return channel.stream.write(data)
+
+        return writer()
+
+    def makefile_stderr(self, mode: str):
+        return io.BytesIO(b'tar: write error')
+
+    def shutdown_write(self):
+        if self.extract:
+            self.stream.seek(0)
+            with tarfile.open(fileobj=self.stream, mode='r|') as tf:
+                for member in tf:
+                    self.remote.files[member.name] = (member.size, int(member.mtime))
+
+    def recv_exit_status(self) -> int:
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+
+def bulk_client(remote: FakeRemote, channel: FakeChannel, config_file: str) -> sftp.sftp:
+    return bare_client(
+        _ssh=remote.ssh(channel), allow_exec=True, remote_out='/out', local_out=None, suppress_out=[], config_file=config_file,
+        track_progress=False, on_result=None, listing_ttl=0
+    )
+
+
+class TestBulkUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.local_dir = os.path.join(self.tmp.name, 'out')
+        os.makedirs(self.local_dir)
+        for name, data in (('a.txt', b'aaaa'), ('b.txt', b'bbbbbb')):
+            with open(os.path.join(self.local_dir, name), 'wb') as f:
+                f.write(data)
+            os.utime(os.path.join(self.local_dir, name), (1700000000, 1700000000))
+        self.config_file = os.path.join(self.tmp.name, 'config.json')
+        with open(self.config_file, 'w') as f:
+            f.write('{"archiveDirName": "Archive"}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stream_confirmed(self):
+        remote = FakeRemote()
+        channel = FakeChannel(remote)
+        client = bulk_client(remote, channel, self.config_file)
+        self.assertEqual(sorted(client.upload(local_dir=self.local_dir, bulk=True)), ['a.txt', 'b.txt'])
+        self.assertEqual(remote.put, [])  # nothing sent again individually
+        self.assertTrue(channel.command.startswith('tar -xf - -C'))
+        self.assertTrue(channel.closed)
+
+    def test_stale_copy_not_confirmed(self):
+        # a same-size copy from an earlier day is on the server and the stream skipped b.txt
+        remote = FakeRemote({'b.txt': (6, 1600000000)})
+        client = bulk_client(remote, FakeChannel(remote, extract=False), self.config_file)
+        self.assertEqual(client._upload_bulk(remote.session, '/out', self.local_dir, ['a.txt', 'b.txt']), [])
+
+        remote = FakeRemote({'b.txt': (6, 1600000000)})
+        channel = FakeChannel(remote)
+        client = bulk_client(remote, channel, self.config_file)
+        self.assertEqual(sorted(client.upload(local_dir=self.local_dir, bulk=True)), ['a.txt', 'b.txt'])
+        self.assertEqual(remote.put, [])
+
+    def test_failed_stream_falls_back(self):
+        for channel_options in ({'exit_status': 2}, {'fail_write': True}):
+            with self.subTest(**channel_options):
+                # the server already holds identical looking copies, which must not count as uploaded
+                remote = FakeRemote({'a.txt': (4, 1700000000), 'b.txt': (6, 1700000000)})
+                channel = FakeChannel(remote, **channel_options)
+                client = bulk_client(remote, channel, self.config_file)
+                self.assertEqual(client._upload_bulk(remote.session, '/out', self.local_dir, ['a.txt', 'b.txt']), [])
+                self.assertEqual(sorted(client.upload(local_dir=self.local_dir, bulk=True)), ['a.txt', 'b.txt'])
+                self.assertEqual(sorted(remote.put), ['a.txt', 'b.txt'])
+                self.assertTrue(channel.closed)
+
+    def test_not_allowed(self):
+        remote = FakeRemote()
+        channel = FakeChannel(remote)
+        client = bulk_client(remote, channel, self.config_file)
+        client.allow_exec = False
+        self.assertEqual(sorted(client.upload(local_dir=self.local_dir, bulk=True)), ['a.txt', 'b.txt'])
+        self.assertIsNone(channel.command)
+        self.assertEqual(sorted(remote.put), ['a.txt', 'b.txt'])
+
+
+class LocalSftp:
+    """SFTP session serving remote paths from a local directory, with or without the check-file extension"""
+    def __init__(self, root: str, check_file: bool = True, fail_read: bool = False):
+        self.root = root
+        self.check_file = check_file
+        self.fail_read = fail_read
+        self.gets = []
+        self.opened = []
+
+    def path(self, remote_file: str) -> str:
+        return os.path.join(self.root, remote_file.lstrip('/'))
+
+    def stat(self, remote_file: str) -> paramiko.SFTPAttributes:
+        return make_attr(os.path.basename(remote_file), size=os.path.getsize(self.path(remote_file)))
+
+    def get(self, remote_file: str, local_file: str, callback=None):
+        self.gets.append(remote_file)
+        with open(self.path(remote_file), 'rb') as rf, open(local_file, 'wb') as lf:
+            lf.write(rf.read())
+
+    def open(self, remote_file: str, mode: str = 'rb'):
+        self.opened.append(remote_file)
+        session = self
+
+        class remote(io.FileIO):
+            def prefetch(self, file_size: int = None):
+                pass
+
+            def read(self, size: int = -1) -> bytes:
+                if session.fail_read and self.tell() > 2 * 1024 * 1024:
+                    raise IOError('connection lost')  # after the first chunks were appended
+                return super().read(size)
+
+            def check(self, hash_algorithm: str, offset: int = 0, length: int = 0) -> bytes:
+                if not session.check_file:
+                    raise IOError('check-file not supported')
+                self.seek(offset)
+                return hashlib.sha256(super().read(length)).digest()
+
+        return remote(self.path(remote_file), 'rb')
+
+
+class TestAppend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.local_file = os.path.join(self.tmp.name, 'local.dat')
+        self.remote_file = '/remote.dat'
+        self.original = bytes(range(256)) * 400  # larger than the 64KB compared without check-file
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def files(self, local: bytes, remote: bytes):
+        with open(self.local_file, 'wb') as f:
+            f.write(local)
+        with open(os.path.join(self.tmp.name, 'remote.dat'), 'wb') as f:
+            f.write(remote)
+
+    def local(self) -> bytes:
+        with open(self.local_file, 'rb') as f:
+            return f.read()
+
+    def test_grown(self):
+        for check_file in (True, False):
+            with self.subTest(check_file=check_file):
+                self.files(self.original, self.original + b'new rows')
+                session = LocalSftp(self.tmp.name, check_file)
+                self.assertTrue(bare_client()._append_file(session, self.remote_file, self.local_file, True))
+                self.assertEqual(self.local(), self.original + b'new rows')
+                self.assertEqual(session.gets, [])  # only the tail was read
+
+    def test_unchanged(self):
+        self.files(self.original, self.original)
+        session = LocalSftp(self.tmp.name)
+        self.assertFalse(bare_client()._append_file(session, self.remote_file, self.local_file, True))
+        self.assertEqual((self.local(), session.opened, session.gets), (self.original, [], []))
+
+    def test_shrunk(self):
+        self.files(self.original, b'rewritten')
+        session = LocalSftp(self.tmp.name)
+        self.assertTrue(bare_client()._append_file(session, self.remote_file, self.local_file, False))
+        self.assertEqual((self.local(), session.gets), (b'rewritten', [self.remote_file]))
+        self.assertFalse(os.path.isfile(f'{self.local_file}.part'))
+
+    def test_rewritten_prefix(self):
+        # the end of the downloaded part changed, found by check-file and by the comparison of the last 64KB
+        rewritten = self.original[:-10] + b'X' * 10 + b'new rows'
+        for check_file in (True, False):
+            with self.subTest(check_file=check_file):
+                self.files(self.original, rewritten)
+                session = LocalSftp(self.tmp.name, check_file)
+                self.assertTrue(bare_client()._append_file(session, self.remote_file, self.local_file, True))
+                self.assertEqual((self.local(), session.gets), (rewritten, [self.remote_file]))
+
+        # a change at the start is outside the last 64KB, only check-file hashes the whole prefix
+        rewritten = b'X' + self.original[1:] + b'new rows'
+        self.files(self.original, rewritten)
+        self.assertFalse(bare_client()._prefix_matches(LocalSftp(self.tmp.name), self.remote_file, self.local_file, len(self.original)))
+        self.assertTrue(bare_client()._prefix_matches(LocalSftp(self.tmp.name, False), self.remote_file, self.local_file, len(self.original)))
+
+    def test_failed_append_restored(self):
+        self.files(self.original, self.original + b'x' * 4 * 1024 * 1024)
+        session = LocalSftp(self.tmp.name, fail_read=True)
+        self.assertFalse(bare_client()._append_file(session, self.remote_file, self.local_file, False))
+        self.assertEqual(self.local(), self.original)
+
+
+class RenameSftp:
+    """SFTP session answering pipelined posix-rename requests from an in-memory set of paths"""
+    def __init__(self, files: list, posix_rename: bool = True, refuse: list = None):
+        self.files = set(files)
+        self.dirs = {'/in', '/in/archive'}
+        self.posix_rename = posix_rename
+        self.refuse = set(refuse or [])
+        self.renamed = []
+        self.queue = []
+        self.most_outstanding = 0
+        self.request_number = 0
+
+    def _move(self, old_file: str, new_file: str):
+        if old_file in self.refuse or old_file not in self.files or posixpath.dirname(new_file) not in self.dirs:
+            raise IOError(errno.EACCES, 'permission denied')
+        self.files.remove(old_file)
+        self.files.add(new_file)
+
+    def _async_request(self, batch, t, *args) -> int:
+        code, text = paramiko.sftp.SFTP_OK, 'ok'
+        if t != paramiko.sftp.CMD_EXTENDED or args[0] != sftp.sftp_constants.POSIX_RENAME or not self.posix_rename:
+            code, text = paramiko.sftp.SFTP_OP_UNSUPPORTED, 'unsupported'
+        else:
+            try:
+                self._move(args[1], args[2])
+            except IOError as e:
+                code, text = paramiko.sftp.SFTP_PERMISSION_DENIED, str(e)
+        msg = paramiko.Message()
+        msg.add_int(code)
+        msg.add_string(text)
+        self.request_number += 1
+        self.queue.append((batch, self.request_number, paramiko.Message(msg.asbytes())))
+        self.most_outstanding = max(self.most_outstanding, len(self.queue))
+        return self.request_number
+
+    def _read_response(self):
+        batch, num, msg = self.queue.pop(0)
+        batch._async_response(paramiko.sftp.CMD_STATUS, msg, num)
+
+    _convert_status = paramiko.SFTPClient._convert_status
+
+    def rename(self, old_file: str, new_file: str):
+        self._move(old_file, new_file)
+        self.renamed.append(old_file)
+
+    def stat(self, remote_dir: str) -> paramiko.SFTPAttributes:
+        if remote_dir not in self.dirs:
+            raise FileNotFoundError(remote_dir)
+        return make_attr(posixpath.basename(remote_dir), is_dir=True)
+
+    def mkdir(self, remote_dir: str):
+        self.dirs.add(remote_dir)
+
+
+class TestArchive(unittest.TestCase):
+    def test_pipelined(self):
+        names = [f'file{i}.csv' for i in range(100)] + ['sub/deeper/a.csv']
+        session = RenameSftp([f'/in/{f}' for f in names])
+        archived = bare_client()._archive(session, '/in', '/in/archive', names)
+        self.assertEqual(sorted(archived), sorted(names))
+        self.assertEqual(session.files, {f'/in/archive/{f}' for f in names})  # structure kept under the archive
+        self.assertIn('/in/archive/sub/deeper', session.dirs)
+        self.assertLessEqual(session.most_outstanding, sftp.sftp_constants.PIPELINE_DEPTH)
+        self.assertGreater(session.most_outstanding, 1)
+        self.assertEqual(session.renamed, [])
+
+    def test_fallback(self):
+        names = ['a.csv', 'b.csv']
+        session = RenameSftp([f'/in/{f}' for f in names], posix_rename=False)
+        self.assertEqual(bare_client()._archive(session, '/in', '/in/archive', names), names)
+        self.assertEqual(session.renamed, ['/in/a.csv', '/in/b.csv'])
+        self.assertEqual(session.files, {'/in/archive/a.csv', '/in/archive/b.csv'})
+
+    def test_failed_rename(self):
+        names = ['a.csv', 'b.csv', 'c.csv']
+        for posix_rename in (True, False):
+            with self.subTest(posix_rename=posix_rename):
+                session = RenameSftp([f'/in/{f}' for f in names], posix_rename=posix_rename, refuse=['/in/b.csv'])
+                with self.assertLogs(level='ERROR') as logs:
+                    archived = bare_client()._archive(session, '/in', '/in/archive', names)
+                self.assertEqual(sorted(archived), ['a.csv', 'c.csv'])
+                self.assertIn('/in/b.csv', session.files)  # left in place
+                self.assertEqual(len(logs.records), 1)
+                self.assertIn("unable to archive '/in/b.csv'", logs.output[0])
+
+
+class TestTransportOptions(unittest.TestCase):
+    def test_untuned(self):
+        self.assertEqual(sftp.transport_options(), {})
+
+    def test_compression_only(self):
+        self.assertEqual(sftp.transport_options(compression=True), {'compress': True})
+
+    def test_transport_factory(self):
+        options = sftp.transport_options(window_size=16 * 1024 * 1024, max_packet_size=65536, ciphers=['aes256-ctr', 'bogus'])
+        sock = MagicMock()
+        transport = options['transport_factory'](sock)
+        try:
+            self.assertEqual(transport.default_window_size, 16 * 1024 * 1024)
+            self.assertEqual(transport.default_max_packet_size, 65536)
+            ciphers = transport.get_security_options().ciphers
+            self.assertEqual(ciphers[0], 'aes256-ctr')
+            self.assertNotIn('bogus', ciphers)
+            self.assertIn('aes128-ctr', ciphers)
+        finally:
+            transport.close()
+
+
 if __name__ == '__main__':
     unittest.main()
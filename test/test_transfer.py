@@ -0,0 +1,515 @@
+import asyncio
+import datetime as dt
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import concurrent.futures
+import contextlib
+import unittest
+
+import src.transfer as transfer
+
+
+class FakeDestination:
+    """Minimal destination for fanout_upload, writing into a local directory"""
+    def __init__(self, name: str, remote_root: str, config_file: str, fail_files: list = None):
+        self.name = name
+        self.remote_root = remote_root
+        self.remote_out = '/'
+        self.suppress_out = ['']
+        self.config_file = config_file
+        self.fail_files = [] if fail_files is None else fail_files
+
+    def _session(self, remote_dir):
+        return contextlib.nullcontext(self)
+
+    @contextlib.contextmanager
+    def _stream_put(self, session, remote_dir, filename):
+        if filename in self.fail_files:
+            raise IOError('refused')
+        with open(os.path.join(self.remote_root, filename), 'wb') as rf:
+            yield rf
+
+
+class TestSelectFiles(unittest.TestCase):
+    def setUp(self):
+        self.file_list = ['a.csv', 'b.csv', 'c.txt']
+
+    def test_select_files_all(self):
+        self.assertEqual(transfer.select_files(self.file_list, [], [''], 'download', '/'), self.file_list)
+
+    def test_select_files_suppress(self):
+        self.assertEqual(transfer.select_files(self.file_list, [], ['*.txt'], 'download', '/'), ['a.csv', 'b.csv'])
+
+    def test_select_files_include(self):
+        self.assertEqual(transfer.select_files(self.file_list, ['*.csv'], ['b*'], 'download', '/'), ['a.csv'])
+
+    def test_select_files_include_missing(self):
+        with self.assertLogs(level='INFO') as log:
+            self.assertEqual(transfer.select_files(self.file_list, ['*.xlsx'], [], 'download', '/in'), [])
+            self.assertIn("unable to download '*.xlsx'", log.output[0])
+
+
+class TestIsSelected(unittest.TestCase):
+    def test_is_selected_suppress(self):
+        self.assertTrue(transfer.is_selected('a.csv', [], ['']))
+        self.assertFalse(transfer.is_selected('a.txt', [], ['*.txt']))
+
+    def test_is_selected_include(self):
+        matched = set()
+        self.assertTrue(transfer.is_selected('a.csv', ['*.csv', '*.xlsx'], [], matched))
+        self.assertFalse(transfer.is_selected('a.txt', ['*.csv', '*.xlsx'], [], matched))
+        self.assertEqual(matched, {'*.csv'})
+
+    def test_log_unmatched(self):
+        with self.assertLogs(level='INFO') as log:
+            transfer.log_unmatched(['*.csv', '*.xlsx'], {'*.csv'}, 'download', '/in')
+            self.assertEqual(len(log.output), 1)
+            self.assertIn("unable to download '*.xlsx'", log.output[0])
+
+
+class TestAttributeFilter(unittest.TestCase):
+    def test_attribute_filter_none(self):
+        self.assertIsNone(transfer.attribute_filter())
+
+    def test_attribute_filter_min_size(self):
+        qualifies = transfer.attribute_filter(min_size=10)
+        self.assertTrue(qualifies(transfer.remote_file('a.csv', 10, 0)))
+        self.assertFalse(qualifies(transfer.remote_file('b.csv', 9, 0)))
+        self.assertFalse(qualifies(transfer.remote_file('c.csv')))
+
+    def test_attribute_filter_age(self):
+        now = time.time()
+        qualifies = transfer.attribute_filter(min_age=dt.timedelta(minutes=1), max_age=3600)
+        self.assertTrue(qualifies(transfer.remote_file('a.csv', 0, now - 600)))
+        self.assertFalse(qualifies(transfer.remote_file('b.csv', 0, now)))
+        self.assertFalse(qualifies(transfer.remote_file('c.csv', 0, now - 7200)))
+        self.assertFalse(qualifies(transfer.remote_file('d.csv', 0)))
+
+    def test_attribute_filter_newer_than(self):
+        cutoff = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+        qualifies = transfer.attribute_filter(newer_than=cutoff)
+        self.assertTrue(qualifies(transfer.remote_file('a.csv', 0, cutoff.timestamp() + 1)))
+        self.assertFalse(qualifies(transfer.remote_file('b.csv', 0, cutoff.timestamp())))
+
+    def test_attribute_filter_invalid(self):
+        with self.assertRaises(TypeError):
+            transfer.attribute_filter(min_age='1h')
+        with self.assertRaises(TypeError):
+            transfer.attribute_filter(min_size=1.5)
+
+
+class TestListingCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = transfer.listing_cache()
+
+    def test_listing_cache_disabled(self):
+        self.cache.put('sftp', 'Test', '/in', 'attr', ['a.csv'])
+        self.assertIsNone(self.cache.get('sftp', 'Test', '/in', 'attr', 0))
+
+    def test_listing_cache_hit(self):
+        self.cache.put('sftp', 'Test', '/in/', 'attr', ['a.csv'])
+        self.assertEqual(self.cache.get('sftp', 'Test', '/in', 'attr', 60), ['a.csv'])
+        self.assertIsNone(self.cache.get('sftp', 'Other', '/in', 'attr', 60))
+
+    def test_listing_cache_expired(self):
+        self.cache.put('sftp', 'Test', '/in', 'attr', ['a.csv'])
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('sftp', 'Test', '/in', 'attr', 0.01))
+
+    def test_listing_cache_invalidate(self):
+        self.cache.put('ftp', 'Test', '/in', 'attr', ['a.csv'])
+        self.cache.put('ftp', 'Test', '/in', 'nlst', ['a.csv'])
+        self.cache.put('ftp', 'Test', '/out', 'nlst', ['b.csv'])
+        self.cache.invalidate('ftp', 'Test', '/in')
+        self.assertIsNone(self.cache.get('ftp', 'Test', '/in', 'attr', 60))
+        self.assertIsNone(self.cache.get('ftp', 'Test', '/in', 'nlst', 60))
+        self.assertEqual(self.cache.get('ftp', 'Test', '/out', 'nlst', 60), ['b.csv'])
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.target_dir = tempfile.mkdtemp()
+        for i in range(3):
+            with open(os.path.join(self.source_dir, f'file{i}.csv'), 'w') as f:
+                f.write('a,b\n' * i)
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.target_dir)
+
+    def test_bundle_format(self):
+        self.assertEqual(transfer.bundle_format('batch.ZIP'), 'zip')
+        self.assertEqual(transfer.bundle_format('batch.tar.gz'), 'gz')
+        self.assertIsNone(transfer.bundle_format('batch.csv'))
+        with self.assertRaises(ValueError):
+            transfer.check_bundle_format('batch.rar')
+
+    def test_bundle_roundtrip(self):
+        file_list = sorted(os.listdir(self.source_dir))
+        for bundle_name in ['batch.zip', 'batch.tar.gz', 'batch.tar']:
+            with self.subTest(bundle_name=bundle_name):
+                stream = io.BytesIO()
+                transfer.write_bundle(stream, bundle_name, self.source_dir, file_list)
+                stream.seek(0)
+                self.assertEqual(transfer.extract_bundle(stream, bundle_name, self.target_dir), file_list)
+                with open(os.path.join(self.target_dir, 'file2.csv')) as f:
+                    self.assertEqual(f.read(), 'a,b\n' * 2)
+                for f in file_list:
+                    os.remove(os.path.join(self.target_dir, f))
+
+    def test_extract_bundle_unsafe(self):
+        stream = io.BytesIO()
+        with tarfile.open(fileobj=stream, mode='w') as tf:
+            tf.add(os.path.join(self.source_dir, 'file1.csv'), arcname='../escape.csv')
+            tf.add(os.path.join(self.source_dir, 'file1.csv'), arcname='sub/file1.csv')
+        stream.seek(0)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(transfer.extract_bundle(stream, 'batch.tar', self.target_dir), ['sub/file1.csv'])
+        self.assertTrue(os.path.isfile(os.path.join(self.target_dir, 'sub', 'file1.csv')))
+
+
+class TestHashManifest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ['a.csv', 'b.csv']:
+            with open(os.path.join(self.temp_dir, name), 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_hash_manifest_roundtrip(self):
+        hashes = {'b.csv': 'B' * 64, 'a.csv': 'a' * 64}
+        text = transfer.format_hash_manifest(hashes)
+        self.assertEqual(text.splitlines()[0], f"{'a' * 64}  a.csv")
+        self.assertEqual(transfer.parse_hash_manifest(text + 'not a hash line\n'), {'a.csv': 'a' * 64, 'b.csv': 'b' * 64})
+
+    def test_verify_files(self):
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            hash_futures = {f: pool.submit(transfer.sha256_file, os.path.join(self.temp_dir, f)) for f in ['a.csv', 'b.csv']}
+            good_hash = hash_futures['a.csv'].result()
+            with self.assertLogs(level='ERROR') as log:
+                result = transfer.verify_files(
+                    self.temp_dir, ['a.csv', 'b.csv'], hash_futures, {'a.csv': 5}, {'a.csv': good_hash}, lambda f: '0' * 64
+                )
+        self.assertEqual(result, ['a.csv'])
+        self.assertIn("verification failed for 'b.csv'", log.output[0])
+
+    def test_verify_files_size(self):
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(transfer.verify_files(self.temp_dir, ['a.csv'], {}, {'a.csv': 4}, {}), [])
+
+
+class TestFanoutUpload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.temp_dir, 'config.json')
+        with open(self.config_file, 'w') as cf:
+            json.dump({'archiveDirName': 'Archive'}, cf)
+        self.local_dir = os.path.join(self.temp_dir, 'local')
+        os.makedirs(os.path.join(self.local_dir, 'Archive'))
+        for name in ['a.csv', 'b.csv']:
+            with open(os.path.join(self.local_dir, name), 'w') as f:
+                f.write(name * 1000)
+        self.remote_dirs = [os.path.join(self.temp_dir, x) for x in ['one', 'two']]
+        for remote_dir in self.remote_dirs:
+            os.makedirs(remote_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_fanout_upload(self):
+        destinations = [
+            FakeDestination('One', self.remote_dirs[0], self.config_file),
+            FakeDestination('Two', self.remote_dirs[1], self.config_file, fail_files=['b.csv'])
+        ]
+        with self.assertLogs(level='ERROR'):
+            result = transfer.fanout_upload(destinations, self.local_dir)
+        self.assertEqual(sorted(result['One']), ['a.csv', 'b.csv'])
+        self.assertEqual(result['Two'], ['a.csv'])
+        with open(os.path.join(self.remote_dirs[1], 'a.csv')) as f:
+            self.assertEqual(f.read(), 'a.csv' * 1000)
+        self.assertTrue(os.path.isfile(os.path.join(self.local_dir, 'Archive', 'a.csv')))
+        self.assertTrue(os.path.isfile(os.path.join(self.local_dir, 'b.csv')))
+
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.temp_dir, 'config.json')
+        with open(self.config_file, 'w') as cf:
+            json.dump({'logRoot': self.temp_dir}, cf)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_fixed_level(self):
+        tuner = transfer.concurrency_tuner('sftp', 'Test Profile', 3, self.config_file)
+        self.assertFalse(tuner.autotune)
+        for _ in range(20):
+            self.assertEqual(tuner.record(100, 0.1, False), 3)
+        tuner.save()
+        self.assertIsNone(tuner.filename)
+
+    def test_invalid_level(self):
+        for concurrency in (0, -1, 'fast', True, 2.5):
+            self.assertRaises(ValueError, transfer.concurrency_tuner, 'sftp', 'Test Profile', concurrency, self.config_file)
+
+    def test_errors_halve_level(self):
+        tuner = transfer.concurrency_tuner('sftp', 'Test Profile', 'auto', self.config_file)
+        tuner.level = 8
+        for _ in range(16):
+            tuner.record(0, 0.1, False)
+        self.assertEqual(tuner.level, 4)
+
+    def test_ramps_up_and_remembers(self):
+        tuner = transfer.concurrency_tuner('ftp', 'Test Profile', 'auto', self.config_file)
+        self.assertEqual(tuner.level, 1)
+        for _ in range(transfer.transfer_constants.TUNING_SAMPLE_FILES):
+            tuner.record(1024 * 1024, 0.01, True)
+        self.assertEqual(tuner.level, 2)
+        tuner.save()
+
+        tuner = transfer.concurrency_tuner('ftp', 'Test Profile', 'auto', self.config_file)
+        self.assertEqual(tuner.level, 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.temp_dir, 'ftp', f'TestProfile{transfer.transfer_constants.CONCURRENCY_EXTENSION}')))
+
+    def test_parallel_transfer(self):
+        files = [f'{i}.csv' for i in range(30)]
+        sessions = []
+
+        def open_session():
+            sessions.append(object())
+            return contextlib.nullcontext(sessions[-1])
+
+        tuner = transfer.concurrency_tuner('sftp', 'Test Profile', 3, self.config_file)
+        success_list = transfer.parallel_transfer(files, open_session, lambda s, f: f != '7.csv', lambda f: 10, tuner)
+        self.assertEqual(success_list, [f for f in files if f != '7.csv'])
+        self.assertLessEqual(len(sessions), 3)
+
+    def test_parallel_transfer_refused_sessions(self):
+        files = [f'{i}.csv' for i in range(10)]
+        opened = []
+
+        def open_session():
+            if len(opened) >= 1:
+                raise ConnectionRefusedError('too many connections')
+            opened.append(1)
+            return contextlib.nullcontext()
+
+        tuner = transfer.concurrency_tuner('sftp', 'Test Profile', 4, self.config_file)
+        self.assertEqual(transfer.parallel_transfer(files, open_session, lambda s, f: True, lambda f: 10, tuner), files)
+
+        def refuse_session():
+            raise ConnectionRefusedError('too many connections')
+
+        self.assertRaises(RuntimeError, transfer.parallel_transfer, files, refuse_session, lambda s, f: True, lambda f: 10, tuner)
+
+
+class SlowClient:
+    """Minimal client for async_runner, moving 'chunks' chunks through its throttle"""
+    def __init__(self, name: str, chunks: int = 10, delay: float = 0.01):
+        self.name = name
+        self.throttle = None
+        self.chunks = chunks
+        self.delay = delay
+        self.running = 0
+        self.most_running = 0
+        self.stopped = False
+
+    def download(self, remote_dir: str = None) -> list:
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            for _ in range(self.chunks):
+                time.sleep(self.delay)
+                if self.throttle is not None:
+                    self.throttle(1024)
+        except BaseException:
+            self.stopped = True
+            raise
+        finally:
+            self.running -= 1
+        return [remote_dir]
+
+
+class TestAsyncRunner(unittest.TestCase):
+    def test_results_and_client_serialized(self):
+        runner = transfer.async_runner(max_transfers=4)
+        clients = [SlowClient('A'), SlowClient('B')]
+
+        async def main():
+            calls = [runner.run(c, 'download', f'{c.name}{i}') for c in clients for i in range(3)]
+            return await asyncio.gather(*calls)
+
+        self.assertEqual(asyncio.run(main()), [['A0'], ['A1'], ['A2'], ['B0'], ['B1'], ['B2']])
+        self.assertEqual([c.most_running for c in clients], [1, 1])
+
+    def test_timeout_stops_transfer(self):
+        runner = transfer.async_runner(max_transfers=2)
+        client = SlowClient('A', chunks=1000)
+
+        async def main():
+            await runner.run(client, 'download', '/', timeout=0.1)
+
+        start = time.monotonic()
+        self.assertRaises(TimeoutError, asyncio.run, main())
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(client.stopped)
+        self.assertIsNone(client.throttle)
+
+    def test_cancel(self):
+        runner = transfer.async_runner(max_transfers=2)
+        client = SlowClient('A', chunks=1000)
+
+        async def main():
+            task = asyncio.create_task(runner.run(client, 'download', '/'))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            client.chunks = 1
+            return await runner.run(client, 'download', 'again')
+
+        result = asyncio.run(main())
+        self.assertTrue(client.stopped)
+        self.assertEqual(result, ['again'])
+
+
+class ResultClient:
+    """Minimal client for iterate_results, reporting one result per file through on_result"""
+    def __init__(self, name: str, fail_after: int = None):
+        self.name = name
+        self.throttle = None
+        self.on_result = None
+        self.fail_after = fail_after
+        self.finished = []
+
+    def download(self, files: list) -> list:
+        for i, f in enumerate(files):
+            if self.fail_after is not None and i == self.fail_after:
+                raise ConnectionResetError('dropped')
+            if self.throttle is not None:
+                self.throttle(1024)
+            recorder = transfer.result_recorder(self.on_result)
+            recorder.record(f, f'/local/{f}', 1024, time.monotonic(), 'success')
+            self.finished.append(f)
+        return files
+
+
+class TestFileResults(unittest.TestCase):
+    def test_recorder_defers_until_verified(self):
+        results = []
+        recorder = transfer.result_recorder(results.append, defer=True)
+        recorder.record('a.txt', '/local/a.txt', 10, time.monotonic(), 'success')
+        recorder.record('b.txt', '/local/b.txt', 10, time.monotonic(), 'success')
+        recorder.record('c.txt', '/local/c.txt', 0, time.monotonic(), 'failed', OSError('gone'))
+        self.assertEqual([(r.name, r.status, r.error) for r in results], [('c.txt', 'failed', 'gone')])
+        recorder.release(['a.txt'])
+        self.assertEqual(sorted((r.name, r.status) for r in results), [('a.txt', 'success'), ('b.txt', 'failed'), ('c.txt', 'failed')])
+
+    def test_iterate_results(self):
+        client = ResultClient('A')
+        results = list(transfer.iterate_results(client, 'download', ['a.txt', 'b.txt', 'c.txt']))
+        self.assertEqual([r.name for r in results], ['a.txt', 'b.txt', 'c.txt'])
+        self.assertEqual({r.bytes for r in results}, {1024})
+        self.assertIsNone(client.on_result)
+
+    def test_iterate_results_error(self):
+        client = ResultClient('A', fail_after=2)
+        names = []
+        with self.assertRaises(ConnectionResetError):
+            for r in transfer.iterate_results(client, 'download', ['a.txt', 'b.txt', 'c.txt']):
+                names.append(r.name)
+        self.assertEqual(names, ['a.txt', 'b.txt'])
+
+    def test_iterate_results_closed_early(self):
+        client = ResultClient('A')
+        files = [f'{i}.txt' for i in range(5000)]
+        for r in transfer.iterate_results(client, 'download', files):
+            break
+        self.assertLess(len(client.finished), len(files))
+        self.assertIsNone(client.throttle)
+
+
+class TestProgress(unittest.TestCase):
+    def test_tracker_totals(self):
+        events = []
+        client = ResultClient('A')
+        progress = transfer.progress_tracker(events.append, interval=0)
+        progress.expect(['a.txt', 'b.txt', 'c.txt'], {'a.txt': 1000, 'b.txt': 1000, 'c.txt': 2000})
+        with progress.watch(client):
+            client.throttle(600)
+            self.assertEqual((events[-1].kind, events[-1].bytes_done), ('bytes', 600))
+            recorder = transfer.result_recorder(None, progress=progress)
+            recorder.record('a.txt', '/local/a.txt', 1000, time.monotonic(), 'success')
+            recorder.record('b.txt', '/local/b.txt', 0, time.monotonic(), 'skipped')
+            client.throttle(500)
+            recorder.record('c.txt', '/local/c.txt', 0, time.monotonic(), 'failed', OSError('dropped'))
+        self.assertIsNone(client.throttle)
+        last = events[-1]
+        self.assertEqual([e.kind for e in events].count('file'), 3)
+        self.assertEqual((last.kind, last.files_done, last.bytes_done, last.bytes_total, last.errors), ('done', 3, 1000, 1000, 1))
+        self.assertEqual(last.eta, 0)
+
+    def test_disabled(self):
+        client = ResultClient('A')
+        progress = transfer.progress_tracker(transfer.progress_callback(False))
+        with progress.watch(client):
+            self.assertIsNone(client.throttle)
+
+    def test_progress_logger(self):
+        progress = transfer.progress_tracker(transfer.progress_callback(True))
+        progress.expect([f'{i}.txt' for i in range(150)])
+        recorder = transfer.result_recorder(None, progress=progress)
+        with self.assertLogs(level='INFO') as log:
+            with progress.watch(ResultClient('A')):
+                for i in range(150):
+                    recorder.record(f'{i}.txt', f'/local/{i}.txt', 10, time.monotonic(), 'success')
+        self.assertEqual(len(log.output), 2)
+        self.assertIn('100 files processed out of 150, 0.0 MB at', log.output[0])
+        self.assertIn('150 files processed out of 150', log.output[1])
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.temp_dir, 'config.json')
+        with open(self.config_file, 'w') as cf:
+            json.dump({'logRoot': self.temp_dir}, cf)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_parse_mlsd_time(self):
+        self.assertEqual(transfer.parse_mlsd_time('19700101000130'), 90)
+        self.assertEqual(transfer.parse_mlsd_time('19700101000130.250'), 90)
+        self.assertIsNone(transfer.parse_mlsd_time('garbage'))
+
+    def test_manifest_roundtrip(self):
+        mf = transfer.manifest('sftp', 'Test Profile', self.config_file)
+        key = mf.key('down', '/in/', self.temp_dir)
+        mf.update(key, 'a.csv', {'size': 1, 'mtime': 2}, {'size': 1, 'mtime': 3})
+        mf.save()
+
+        mf = transfer.manifest('sftp', 'Test Profile', self.config_file)
+        self.assertTrue(mf.is_unchanged(key, 'a.csv', {'size': 1, 'mtime': 2}, {'size': 1, 'mtime': 3}))
+        self.assertFalse(mf.is_unchanged(key, 'a.csv', {'size': 5, 'mtime': 2}, {'size': 1, 'mtime': 3}))
+        self.assertFalse(mf.is_unchanged(key, 'a.csv', {'size': 1, 'mtime': 2}, None))
+
+    def test_manifest_discard(self):
+        mf = transfer.manifest('ftp', 'Test Profile', self.config_file)
+        key = mf.key('up', '/out', self.temp_dir)
+        mf.update(key, 'a.csv', None, None)
+        mf.discard(key, 'a.csv')
+        self.assertEqual(mf.entries(key), {})
+
+
+if __name__ == '__main__':
+    unittest.main()